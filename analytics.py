@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+回测绩效分析
+
+回测过程中只记录每根bar的总资产、现金（权益曲线）和每笔成交，结束后在整列数组上一次计算全部指标，
+取代 cerebro 中挂载的 SharpeRatio / DrawDown / Returns / TradeAnalyzer 分析器:
+分析器在 cerebro.run() 中每根bar都要更新，这里不增加回测的开销，新增指标也不需要重新运行回测。
+
+与 backtrader 分析器口径相同（默认参数下结果一致）:
+- sharpe_ratio: SharpeRatio（按自然年收益率，无风险利率 1%，不年化）
+- annual_return: Returns 的 rnorm100（对数总收益按bar数平均后按 252 天年化，百分比）
+- max_drawdown: DrawDown 的 max.drawdown（百分比）
+- total_trades / winning_trades / losing_trades: TradeAnalyzer 的 total.total / won.total /
+  lost.total（开仓即计入总数，平仓后 pnlcomm >= 0 计为盈利）
+
+其他指标（按日收益率，252 天年化，不扣无风险利率，与 returns_metrics 一致）:
+- sortino_ratio、calmar_ratio（年化收益 / 最大回撤）、rolling_sharpe（滚动窗口夏普）
+- turnover: 年化换手率（成交金额 / 平均总资产 / 年数）
+- exposure: 平均持仓市值占总资产的比例（需要记录现金）
+- by_symbol: 按股票统计的交易次数、胜率和盈亏
+
+成交明细每行一笔成交: date、symbol、size（买入为正、卖出为负）、price、commission、pnl
+（本笔成交平仓部分的盈亏，不含手续费）。同一只股票持仓回到 0 时一笔交易结束，
+不支持一笔成交直接反手（项目中的策略都只做多）。
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+RISKFREE_RATE = 0.01
+ROLLING_WINDOW = 63
+
+FILL_COLUMNS = ['date', 'symbol', 'size', 'price', 'commission', 'pnl']
+
+
+# ----------------------------------------------------------------------
+# 权益曲线
+# ----------------------------------------------------------------------
+
+def daily_returns(values, initial_cash):
+    """每根bar的收益率（TimeReturn 口径，第一根bar相对初始资金）"""
+    values = np.asarray(values, dtype='f8')
+    prev = np.concatenate(([float(initial_cash)], values[:-1]))
+    return values / prev - 1.0
+
+
+def sharpe_ratio(dates, values, initial_cash, riskfree=RISKFREE_RATE):
+    """
+    与 bt.analyzers.SharpeRatio 默认参数相同的夏普比率
+
+    每个自然年的收益率（年末总资产 / 上一年末总资产 - 1，第一年相对初始资金）减去无风险利率，
+    均值除以总体标准差；不足两年（标准差为 0）时返回 None
+    """
+    values = np.asarray(values, dtype='f8')
+    if len(values) == 0:
+        return None
+    years = pd.DatetimeIndex(dates).year.to_numpy()
+    year_end = np.append(years[1:] != years[:-1], True)
+    ends = values[year_end]
+    starts = np.concatenate(([float(initial_cash)], ends[:-1]))
+
+    rate = pow(1.0 + riskfree, 1.0 / 1) - 1.0
+    excess = [r - rate for r in (ends / starts - 1.0).tolist()]
+    avg = math.fsum(excess) / len(excess)
+    dev = math.sqrt(math.fsum([pow(x - avg, 2.0) for x in excess]) / len(excess))
+    try:
+        return avg / dev
+    except ZeroDivisionError:
+        return None
+
+
+def annual_return(values, initial_cash, periods=TRADING_DAYS_PER_YEAR):
+    """与 bt.analyzers.Returns 的 rnorm100 相同的年化收益率（百分比）"""
+    if len(values) == 0:
+        return 0.0
+    ratio = float(values[-1]) / float(initial_cash)
+    if ratio <= 0:
+        return float('-inf')
+    return math.expm1(math.log(ratio) / len(values) * periods) * 100.0
+
+
+def drawdown(values):
+    """每根bar相对此前最高总资产的回撤（百分比）"""
+    values = np.asarray(values, dtype='f8')
+    peak = np.maximum.accumulate(values)
+    return 100.0 * (peak - values) / peak
+
+
+def max_drawdown(values):
+    """与 bt.analyzers.DrawDown 的 max.drawdown 相同的最大回撤（百分比）"""
+    if len(values) == 0:
+        return 0.0
+    return float(drawdown(values).max())
+
+
+def sortino_ratio(returns, periods=TRADING_DAYS_PER_YEAR):
+    """年化索提诺比率：平均收益 / 下行标准差（只计负收益），没有下行波动时返回 None"""
+    returns = np.asarray(returns, dtype='f8')
+    if len(returns) == 0:
+        return None
+    downside = math.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+    if downside == 0:
+        return None
+    return float(returns.mean() / downside * math.sqrt(periods))
+
+
+def calmar_ratio(annual, max_dd):
+    """卡玛比率：年化收益率 / 最大回撤（都为百分比），没有回撤时返回 None"""
+    if not max_dd or annual is None or not math.isfinite(annual):
+        return None
+    return annual / max_dd
+
+
+def rolling_sharpe(returns, window=ROLLING_WINDOW, periods=TRADING_DAYS_PER_YEAR):
+    """滚动窗口的年化夏普比率（前 window - 1 根bar为 NaN）"""
+    returns = pd.Series(returns, dtype='f8')
+    rolling = returns.rolling(window)
+    std = rolling.std()
+    return rolling.mean() / std.where(std > 0) * math.sqrt(periods)
+
+
+# ----------------------------------------------------------------------
+# 成交和交易
+# ----------------------------------------------------------------------
+
+def fills_frame(fills):
+    """成交明细（字典列表或 DataFrame）-> 按 FILL_COLUMNS 排列的 DataFrame"""
+    if fills is None or len(fills) == 0:
+        return pd.DataFrame(columns=FILL_COLUMNS)
+    frame = pd.DataFrame(fills)
+    for col in ('commission', 'pnl'):
+        if col not in frame.columns:
+            frame[col] = 0.0
+    return frame[FILL_COLUMNS].reset_index(drop=True)
+
+
+def trades_from_fills(fills):
+    """
+    按股票把成交合并成交易（TradeAnalyzer 口径）
+
+    同一只股票按成交顺序累计持仓，持仓回到 0 时该笔交易结束，下一笔成交开始新的交易。
+
+    Returns:
+        DataFrame: symbol、opened、closed（未平仓为 NaT）、size（最大持仓）、pnl、commission、
+        pnlcomm、isclosed，按开仓顺序排列
+    """
+    fills = fills_frame(fills)
+    if len(fills) == 0:
+        return pd.DataFrame(columns=['symbol', 'opened', 'closed', 'size', 'pnl',
+                                     'commission', 'pnlcomm', 'isclosed'])
+
+    by_symbol = fills.groupby('symbol', sort=False)
+    position = by_symbol['size'].cumsum()
+    flat = np.isclose(position, 0.0)
+    # 本笔成交之前已经结束的交易数 -> 交易序号
+    ended = pd.Series(flat, index=fills.index).groupby(fills['symbol'], sort=False)
+    number = ended.cumsum() - flat.astype(int)
+
+    grouped = fills.assign(number=number, position=position.abs(), flat=flat,
+                           row=fills.index).groupby(['symbol', 'number'], sort=False)
+    trades = grouped.agg(opened=('date', 'first'), last=('date', 'last'), size=('position', 'max'),
+                         pnl=('pnl', 'sum'), commission=('commission', 'sum'),
+                         isclosed=('flat', 'last'), row=('row', 'first'))
+    trades['closed'] = trades['last'].where(trades['isclosed'])
+    trades['pnlcomm'] = trades['pnl'] - trades['commission']
+    trades = trades.reset_index().sort_values('row', kind='stable')
+    return trades[['symbol', 'opened', 'closed', 'size', 'pnl', 'commission', 'pnlcomm',
+                   'isclosed']].reset_index(drop=True)
+
+
+def trade_stats(trades):
+    """交易次数和胜率：总数包括未平仓的交易，盈亏只统计已平仓的交易"""
+    closed = trades[trades['isclosed'].astype(bool)]
+    won = int((closed['pnlcomm'] >= 0).sum())
+    return {
+        'total_trades': int(len(trades)),
+        'open_trades': int(len(trades) - len(closed)),
+        'closed_trades': int(len(closed)),
+        'winning_trades': won,
+        'losing_trades': int(len(closed) - won),
+        'win_rate': won / len(closed) * 100 if len(closed) else None,
+    }
+
+
+def by_symbol(trades):
+    """按股票统计已平仓交易的次数、盈利次数、胜率（百分比）和扣除手续费后的盈亏"""
+    closed = trades[trades['isclosed'].astype(bool)]
+    stats = closed.assign(won=closed['pnlcomm'] >= 0).groupby('symbol', sort=False).agg(
+        trades=('won', 'size'), won=('won', 'sum'), pnlcomm=('pnlcomm', 'sum'))
+    stats['won'] = stats['won'].astype(int)
+    stats['win_rate'] = stats['won'] / stats['trades'] * 100
+    return stats.sort_values('pnlcomm', ascending=False)
+
+
+# ----------------------------------------------------------------------
+# 汇总
+# ----------------------------------------------------------------------
+
+def analyze(dates, values, initial_cash, fills=None, cash=None,
+            periods=TRADING_DAYS_PER_YEAR, window=ROLLING_WINDOW):
+    """
+    由权益曲线和成交明细计算全部绩效指标
+
+    Args:
+        dates: 每根bar的日期
+        values: 每根bar的总资产（broker.getvalue()）
+        initial_cash: 初始资金
+        fills: 成交明细（字典列表或 DataFrame，见模块说明），None 时不计算交易相关指标
+        cash: 每根bar的现金，None 时不计算 exposure
+        periods: 年化使用的每年bar数
+        window: rolling_sharpe 的窗口长度
+
+    Returns:
+        dict: 标量指标，以及 rolling_sharpe（Series）、trades（交易表）、by_symbol（DataFrame）
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    values = np.asarray(values, dtype='f8')
+    n = len(values)
+    final_value = float(values[-1]) if n else float(initial_cash)
+    returns = daily_returns(values, initial_cash)
+
+    annual = annual_return(values, initial_cash, periods)
+    max_dd = max_drawdown(values)
+    metrics = {
+        'bars': n,
+        'final_value': final_value,
+        'total_return': (final_value - initial_cash) / initial_cash * 100,
+        'annual_return': annual,
+        'sharpe_ratio': sharpe_ratio(dates, values, initial_cash),
+        'max_drawdown': max_dd,
+        'sortino_ratio': sortino_ratio(returns, periods),
+        'calmar_ratio': calmar_ratio(annual, max_dd),
+        'volatility': float(returns.std() * math.sqrt(periods) * 100) if n else 0.0,
+        'rolling_sharpe': pd.Series(rolling_sharpe(returns, window, periods).to_numpy(),
+                                    index=dates),
+        'exposure': None,
+    }
+    if cash is not None and n:
+        cash = np.asarray(cash, dtype='f8')
+        metrics['exposure'] = float(np.mean((values - cash) / values) * 100)
+
+    fills = fills_frame(fills) if fills is not None else None
+    trades = trades_from_fills(fills)
+    metrics.update(trade_stats(trades))
+    metrics['trades'] = trades
+    metrics['by_symbol'] = by_symbol(trades)
+
+    metrics['turnover'] = None
+    if fills is not None and n:
+        notional = float((fills['size'].abs() * fills['price']).sum())
+        metrics['turnover'] = float(notional / values.mean() / (n / periods))
+    return metrics
+
+
+def report(metrics, top=5):
+    """绩效指标的文字报告（run_backtest 打印）"""
+    def fmt(value, suffix=''):
+        return '-' if value is None else f'{value:.2f}{suffix}'
+
+    lines = [
+        f"夏普比率: {fmt(metrics['sharpe_ratio'])}",
+        f"索提诺比率: {fmt(metrics['sortino_ratio'])}",
+        f"卡玛比率: {fmt(metrics['calmar_ratio'])}",
+        f"最大回撤: {fmt(metrics['max_drawdown'], '%')}",
+        f"年化收益率: {fmt(metrics['annual_return'], '%')}",
+        f"年化波动率: {fmt(metrics['volatility'], '%')}",
+        f"年化换手率: {fmt(metrics['turnover'], ' 倍')}",
+        f"平均仓位: {fmt(metrics['exposure'], '%')}",
+        f"总交易次数: {metrics['total_trades']}（未平仓 {metrics['open_trades']}）",
+        f"盈利次数: {metrics['winning_trades']}",
+        f"亏损次数: {metrics['losing_trades']}",
+        f"胜率: {fmt(metrics['win_rate'], '%')}",
+    ]
+    stats = metrics['by_symbol']
+    if len(stats):
+        lines.append(f"按股票（盈亏前 {top}）:")
+        for symbol, row in stats.head(top).iterrows():
+            lines.append(f"  {symbol}: 交易 {int(row['trades'])} 次，胜率 {row['win_rate']:.1f}%，"
+                         f"盈亏 {row['pnlcomm']:.2f}")
+    return "\n".join(lines)
@@ -0,0 +1,164 @@
+"""
+团队分析的上下文压缩
+
+多空辩论、风险评估和最终汇总的提示词原先拼接上游每个智能体的完整输出，越往后输入越长，
+汇总这一步最慢也最贵。这里在传给下游之前从每份输出中按规则提取要点:
+
+- rating:     投资评级/结论倾向（买入、持有、卖出、看多、看空等）
+- conclusion: 结论/总结句
+- numbers:    带关键数字的句子（估值、增速、价位、技术指标等）
+- risks:      风险相关的句子
+
+按 token 预算截取后以紧凑的文本交给下游；原文本身不超过预算时原样保留。
+只用正则和关键词，不额外调用模型。token 数按中文每字 1 个、其他字符每 4 个 1 个估算。
+"""
+
+import bisect
+import os
+import re
+
+# 每份上游输出压缩后的 token 预算
+SECTION_TOKENS = int(os.getenv('QUANT_AGENT_CONTEXT_TOKENS', '400'))
+# 单条要点的最大字符数
+MAX_ITEM_CHARS = 120
+
+RATINGS = ('强烈买入', '强烈推荐', '买入', '增持', '推荐', '持有', '中性', '观望', '减持', '卖出',
+           '回避', '看多', '看空', '看涨', '看跌')
+_RATING_RE = re.compile('|'.join(RATINGS))
+_RATING_LINE_RE = re.compile(r'评级|建议|结论|观点|操作|立场')
+# 明确标注的评级（"投资评级：持有"）优先于其他行中出现的评级词
+_RATING_LABEL_RE = re.compile(r'评级\s*[:：]')
+# 评级词前面是这些词时表示否定（"不建议买入"），不作为评级
+NEGATIONS = ('不', '不宜', '不建议', '避免', '非')
+_CONCLUSION_RE = re.compile(r'结论|总结|综合|总体|整体来看|核心观点')
+_NUMBER_RE = re.compile(r'\d')
+_METRIC_RE = re.compile(
+    r'%|元|倍|亿|万|PE|PB|ROE|EPS|MACD|KDJ|RSI|市盈率|市净率|增长|增速|毛利率|净利|负债率|'
+    r'营收|支撑|阻力|目标价|均线|成交量|换手|资金|评级')
+_RISK_RE = re.compile(r'风险|隐患|不确定|下行|回调|压力|利空|警惕|注意|担忧|亏损|下滑|减持')
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+# 行首的列表、引用、编号和加粗标记
+_MARKUP_RE = re.compile(r'^(?:[-*+>]|\d+[.、)]|[一二三四五六七八九十]+、|\*\*)\s*')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文字符每个 1 个，其他字符每 4 个 1 个"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """text 中估算 token 数不超过 budget 的最长前缀"""
+    # 前缀的 token 数随长度单调不减，二分查找截断位置
+    end = bisect.bisect_right(range(len(text) + 1), budget,
+                              key=lambda n: estimate_tokens(text[:n])) - 1
+    return text[:max(end, 0)]
+
+
+def _find_rating(text: str):
+    """text 中第一个没有被否定的评级词，没有时返回 None"""
+    for match in _RATING_RE.finditer(text):
+        if not text[:match.start()].rstrip().endswith(NEGATIONS):
+            return match.group(0)
+    return None
+
+
+def _clean_lines(text: str):
+    """去掉标题、markdown 标记和表格分隔线后的非空行"""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if set(line) <= set('|-: '):
+            continue
+        while True:
+            stripped = _MARKUP_RE.sub('', line)
+            if stripped == line:
+                break
+            line = stripped
+        line = line.replace('**', '').strip(' |')
+        line = re.sub(r'\s*\|\s*', ' | ', line)
+        if line:
+            yield line[:MAX_ITEM_CHARS]
+
+
+def extract_findings(text: str) -> dict:
+    """
+    从一份智能体输出中提取要点
+
+    Returns:
+        dict: rating（找不到或都被否定时为 None）、conclusion、numbers、risks（按原文顺序的句子列表）
+    """
+    findings = {'rating': None, 'conclusion': [], 'numbers': [], 'risks': []}
+    labelled = False
+    seen = set()
+    for line in _clean_lines(text or ''):
+        if line in seen:
+            continue
+        seen.add(line)
+        label = _RATING_LABEL_RE.search(line)
+        if label and not labelled:
+            rating = _find_rating(line[label.end():])
+            if rating:
+                findings['rating'] = rating
+                labelled = True
+        elif findings['rating'] is None and _RATING_LINE_RE.search(line):
+            findings['rating'] = _find_rating(line)
+        if _CONCLUSION_RE.search(line):
+            findings['conclusion'].append(line)
+        elif _RISK_RE.search(line):
+            findings['risks'].append(line)
+        elif _NUMBER_RE.search(line) and _METRIC_RE.search(line):
+            findings['numbers'].append(line)
+    return findings
+
+
+def format_findings(findings: dict, budget: int = SECTION_TOKENS) -> str:
+    """
+    要点 -> 紧凑文本，不超过 budget 个 token
+
+    评级和第一条结论优先，其余按 结论、关键数据、风险 轮流加入，直到用完预算。
+    """
+    lines = []
+    used = 0
+    if findings['rating']:
+        lines.append(f"评级: {findings['rating']}")
+        used += estimate_tokens(lines[-1])
+
+    groups = [('结论', findings['conclusion']), ('关键数据', findings['numbers']),
+              ('风险', findings['risks'])]
+    picked = {name: [] for name, _ in groups}
+    depth = 0
+    while any(depth < len(items) for _, items in groups):
+        for name, items in groups:
+            if depth >= len(items):
+                continue
+            item = f"- {items[depth]}"
+            cost = estimate_tokens(item) + (estimate_tokens(name) + 1 if not picked[name] else 0)
+            if used + cost > budget:
+                continue
+            picked[name].append(item)
+            used += cost
+        depth += 1
+
+    for name, _ in groups:
+        if picked[name]:
+            lines.append(f"{name}:")
+            lines.extend(picked[name])
+    return '\n'.join(lines)
+
+
+def compact(text: str, budget: int = SECTION_TOKENS) -> str:
+    """
+    压缩一份上游输出：不超过预算时原样返回，否则返回提取的要点
+
+    没有提取到任何要点（如只有一句失败信息）时返回截断的原文。
+    """
+    text = (text or '').strip()
+    if estimate_tokens(text) <= budget:
+        return text
+    compacted = format_findings(extract_findings(text), budget)
+    if compacted:
+        return compacted
+    # 没有可识别的要点：按预算截断原文
+    return truncate_tokens(text, budget)
@@ -1,8 +1,16 @@
 import os
 import json
+import time
 import asyncio
+import functools
+from collections import deque
 from typing import Dict, Any, Optional
-from claude_agent_sdk import query, ClaudeAgentOptions, AssistantMessage, TextBlock, ResultMessage
+from claude_agent_sdk import (
+    ClaudeSDKClient, ClaudeAgentOptions, AssistantMessage, TextBlock, ResultMessage,
+)
+
+from profiling import span
+from agent_context import compact
 
 PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -13,8 +21,23 @@ os.environ["ANTHROPIC_BASE_URL"] = "https://api.minimaxi.com/anthropic"
 os.environ["ANTHROPIC_API_KEY"] = "sk-cp-VQK8QjxOSd2I1LOW-snNGyEzir0QjgRjgiF44JD-949wSiyTZBHNv_-NG0vhW91sZBw_PU_iklRNf6P8fDsaWsGXcGH9vqJJ84vpiqPmw3YOwwNTUrffQUU"
 os.environ["ANTHROPIC_MODEL_NAME"] = "MiniMax-M2.5"
 
+# 会话池：同时保持的 CLI 会话数上限、每个会话最多使用次数、空闲多久后关闭（秒）
+POOL_SIZE = int(os.getenv('QUANT_AGENT_POOL_SIZE', '8'))
+MAX_USES = int(os.getenv('QUANT_AGENT_MAX_USES', '20'))
+IDLE_SECONDS = float(os.getenv('QUANT_AGENT_IDLE_SECONDS', '600'))
+# 归还会话时清空对话（/clear）的超时，超时视为会话失效
+RESET_TIMEOUT = 30
+
+# 团队分析依次调用的智能体
+TEAM_AGENTS = (
+    "fundamentals-analyst", "technical-analyst", "sentiment-analyst", "news-analyst",
+    "bullish-researcher", "bearish-researcher", "risk-manager", "team-leader",
+)
 
+
+@functools.lru_cache(maxsize=None)
 def load_agent_prompt(agent_name: str) -> str:
+    """智能体定义（.claude/agents/<name>.md），每个进程只读取一次"""
     agent_file = os.path.join(AGENTS_DIR, f"{agent_name}.md")
     if os.path.exists(agent_file):
         with open(agent_file, "r", encoding="utf-8") as f:
@@ -22,6 +45,253 @@ def load_agent_prompt(agent_name: str) -> str:
     return ""
 
 
+class AgentSession:
+    """
+    一个常驻的 CLI 会话（ClaudeSDKClient），智能体定义在启动时作为系统提示词载入
+
+    每次调用后清空对话再放回池中，下一次调用不带上一次的上下文。
+    """
+
+    def __init__(self, agent_name: str, cwd: str):
+        self.key = (agent_name, cwd)
+        self.agent_name = agent_name
+        self.client = ClaudeSDKClient(ClaudeAgentOptions(
+            cwd=cwd,
+            max_turns=10,
+            system_prompt=load_agent_prompt(agent_name) or None,
+        ))
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+    async def start(self):
+        with span(f"agent_pool.start.{self.agent_name}"):
+            await self.client.connect()
+
+    def alive(self) -> bool:
+        """CLI 进程仍在运行"""
+        transport = getattr(self.client, "_transport", None)
+        process = getattr(transport, "_process", None)
+        return transport is not None and transport.is_ready() and (
+            process is None or process.returncode is None)
+
+    def expired(self, max_uses: int, idle_seconds: float) -> bool:
+        return (self.uses >= max_uses or
+                time.monotonic() - self.last_used > idle_seconds or
+                not self.alive())
+
+    async def ask(self, prompt: str) -> str:
+        self.uses += 1
+        self.last_used = time.monotonic()
+        await self.client.query(prompt)
+        result_text = ""
+        async for message in self.client.receive_response():
+            if isinstance(message, AssistantMessage):
+                for block in message.content:
+                    if isinstance(block, TextBlock):
+                        result_text += block.text
+            elif isinstance(message, ResultMessage) and message.result:
+                # 最终回复，中间轮次（调用工具前）的文本不再返回
+                result_text = message.result
+        return result_text
+
+    async def reset(self):
+        """清空对话历史（系统提示词保留）"""
+        await self.client.query("/clear")
+        async for _ in self.client.receive_response():
+            pass
+        self.last_used = time.monotonic()
+
+    async def close(self):
+        try:
+            await self.client.disconnect()
+        except Exception as e:
+            print(f"关闭智能体会话 {self.agent_name} 失败: {e}")
+
+
+class AgentSessionPool:
+    """
+    智能体会话池
+
+    每次 call_agent 都启动一个新的 CLI 进程时，进程启动和载入智能体定义是每个阶段固定的开销。
+    池中按 (智能体, 工作目录) 保存空闲会话，调用时直接取用:
+    - 有界: 同时存在的会话（使用中 + 空闲 + 启动中）不超过 size，已满时先关闭最久未用的
+      空闲会话，没有空闲会话可关闭时等待归还
+    - 健康检查: 取出时检查 CLI 进程是否仍在运行、空闲是否超时；归还后在后台清空对话，
+      出错、清空失败或超时的会话直接关闭
+    - 回收: 每个会话使用 max_uses 次后关闭，下次调用时重新启动
+    """
+
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES, idle_seconds=IDLE_SECONDS):
+        self.size = max(int(size), 1)
+        self.max_uses = max(int(max_uses), 1)
+        self.idle_seconds = idle_seconds
+        self._idle = deque()  # 空闲会话，最久未用的在左边
+        self._count = 0  # 使用中 + 空闲 + 启动中 + 清空中的会话数
+        self._starting = {}  # 后台预启动中的会话数 {key: n}
+        self._cond = asyncio.Condition()
+        self._tasks = set()
+        self._closed = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {'sessions': self._count, 'idle': len(self._idle), 'size': self.size}
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _reserve(self, key) -> Optional[AgentSession]:
+        """取出 key 对应的空闲会话，或占用一个名额（返回 None，由调用方启动新会话）"""
+        stale = []
+        try:
+            async with self._cond:
+                while True:
+                    # 等待期间池被关闭时同样不再创建会话
+                    if self._closed:
+                        raise RuntimeError("智能体会话池已关闭")
+                    for session in list(self._idle):
+                        if session.expired(self.max_uses, self.idle_seconds):
+                            self._idle.remove(session)
+                            self._count -= 1
+                            stale.append(session)
+                    for session in reversed(self._idle):
+                        if session.key == key:
+                            self._idle.remove(session)
+                            return session
+                    if not self._starting.get(key):
+                        if self._count < self.size:
+                            self._count += 1
+                            return None
+                        if self._idle:
+                            # 关闭最久未用的空闲会话，名额留给本次调用
+                            stale.append(self._idle.popleft())
+                            return None
+                    # 同一智能体的会话正在预启动，或池已满：等待
+                    await self._cond.wait()
+        finally:
+            for session in stale:
+                await session.close()
+
+    async def acquire(self, agent_name: str, cwd: str = PROJECT_DIR) -> AgentSession:
+        """取出或启动一个会话，池已关闭时抛出 RuntimeError"""
+        session = await self._reserve((agent_name, cwd))
+        if session is not None:
+            return session
+        session = AgentSession(agent_name, cwd)
+        try:
+            await session.start()
+        except BaseException:
+            await self._discard(session)
+            raise
+        return session
+
+    async def release(self, session: AgentSession, healthy: bool = True):
+        """归还会话：正常结束且未用满次数时在后台清空对话后放回，否则关闭"""
+        if healthy and not self._closed and session.uses < self.max_uses:
+            self._spawn(self._recycle(session))
+        else:
+            await self._discard(session)
+
+    async def _recycle(self, session: AgentSession):
+        recycled = False
+        try:
+            await asyncio.wait_for(session.reset(), RESET_TIMEOUT)
+            recycled = True
+        except Exception as e:
+            print(f"智能体会话 {session.agent_name} 清空对话失败，关闭: {e}")
+        finally:
+            # 被 close() 取消时同样关闭会话、归还名额
+            if recycled:
+                await self._put(session)
+            else:
+                await self._discard(session)
+
+    async def _put(self, session: AgentSession):
+        if self._closed or not session.alive():
+            await self._discard(session)
+            return
+        async with self._cond:
+            self._idle.append(session)
+            self._cond.notify_all()
+
+    async def _discard(self, session: AgentSession):
+        try:
+            await session.close()
+        finally:
+            async with self._cond:
+                self._count -= 1
+                self._cond.notify_all()
+
+    def prewarm(self, agent_names, cwd: str = PROJECT_DIR):
+        """在后台为还没有空闲会话的智能体启动会话（不超过池的上限），与前面阶段的调用并行"""
+        if self._closed:
+            return
+        idle = {session.key for session in self._idle}
+        for agent_name in agent_names:
+            key = (agent_name, cwd)
+            if key in idle or self._starting.get(key) or self._count >= self.size:
+                continue
+            self._count += 1
+            self._starting[key] = self._starting.get(key, 0) + 1
+            self._spawn(self._start_idle(agent_name, cwd))
+
+    async def _start_idle(self, agent_name: str, cwd: str):
+        key = (agent_name, cwd)
+        session = AgentSession(agent_name, cwd)
+        started = False
+        try:
+            await session.start()
+            started = True
+        except Exception as e:
+            print(f"预启动智能体会话 {agent_name} 失败: {e}")
+        finally:
+            self._starting[key] -= 1
+            if started:
+                await self._put(session)
+            else:
+                await self._discard(session)
+
+    async def close(self):
+        """
+        关闭全部空闲会话（服务退出时调用），使用中的会话归还时关闭
+
+        关闭后 acquire() 抛出 RuntimeError，正在等待名额的调用同样被唤醒后抛出
+        """
+        self._closed = True
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        # 被取消的清空/预启动任务在 finally 中关闭各自的会话
+        await asyncio.gather(*tasks, return_exceptions=True)
+        async with self._cond:
+            sessions = list(self._idle)
+            self._idle.clear()
+            self._count -= len(sessions)
+            self._cond.notify_all()
+        for session in sessions:
+            await session.close()
+
+
+_pool: Optional[AgentSessionPool] = None
+_pool_loop = None
+
+
+def get_pool() -> AgentSessionPool:
+    """当前事件循环的会话池（会话绑定在创建它的事件循环上）"""
+    global _pool, _pool_loop
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool_loop is not loop:
+        _pool, _pool_loop = AgentSessionPool(), loop
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
 SYSTEM_PROMPT = """你是 TradingAgents 金融分析团队的协调者。你的任务是协调多个专业分析师对股票进行全面分析。
 
 工作流程：
@@ -51,23 +321,16 @@ SYSTEM_PROMPT = """你是 TradingAgents 金融分析团队的协调者。你的
 
 
 async def call_agent(agent_name: str, prompt: str, cwd: str = PROJECT_DIR) -> str:
-    agent_prompt = load_agent_prompt(agent_name)
-    full_prompt = f"{agent_prompt}\n\n{prompt}" if agent_prompt else prompt
-    
-    options = ClaudeAgentOptions(
-        cwd=cwd,
-        max_turns=10,
-    )
-    
-    result_text = ""
-    async for message in query(prompt=full_prompt, options=options):
-        if isinstance(message, AssistantMessage):
-            for block in message.content:
-                if isinstance(block, TextBlock):
-                    result_text += block.text
-        elif isinstance(message, ResultMessage):
-            result_text += message.content if hasattr(message, 'content') else str(message)
-    
+    pool = get_pool()
+    with span(f"agent.{agent_name}"):
+        session = await pool.acquire(agent_name, cwd)
+        healthy = False
+        try:
+            result_text = await session.ask(prompt)
+            healthy = True
+        finally:
+            await pool.release(session, healthy)
+
     return result_text
 
 
@@ -118,7 +381,10 @@ async def analyze_stock_team(code: str, name: str = "") -> Dict[str, Any]:
 请直接给出分析结论，无需过多解释。"""
 
     results = {}
-    
+
+    # 后面各阶段的会话在前面的阶段运行时启动
+    get_pool().prewarm(TEAM_AGENTS)
+
     try:
         results["fundamentals"] = await call_agent("fundamentals-analyst", fundamentals_prompt)
     except Exception as e:
@@ -139,19 +405,25 @@ async def analyze_stock_team(code: str, name: str = "") -> Dict[str, Any]:
     except Exception as e:
         results["news"] = f"新闻分析失败: {str(e)}"
     
+    # 下游只拿到上游输出的要点（评级、关键数据、风险），不再拼接全文
+    brief = {}
+    with span("agent.compact"):
+        for key in ("fundamentals", "technical", "sentiment", "news"):
+            brief[key] = compact(results.get(key, '无'))
+
     bull_bear_prompt = f"""基于以下分析结果，请进行多空辩论：
 
 【基本面分析】
-{results.get('fundamentals', '无')}
+{brief['fundamentals']}
 
 【技术分析】
-{results.get('technical', '无')}
+{brief['technical']}
 
 【情绪分析】
-{results.get('sentiment', '无')}
+{brief['sentiment']}
 
 【新闻分析】
-{results.get('news', '无')}
+{brief['news']}
 
 请分别从多头和空头角度提出观点和论据。"""
 
@@ -165,13 +437,17 @@ async def analyze_stock_team(code: str, name: str = "") -> Dict[str, Any]:
     except Exception as e:
         results["bearish"] = f"空头研究失败: {str(e)}"
     
+    with span("agent.compact"):
+        for key in ("bullish", "bearish"):
+            brief[key] = compact(results.get(key, '无'))
+
     risk_prompt = f"""基于以下分析，请进行风险评估：
 
 【多头观点】
-{results.get('bullish', '无')}
+{brief['bullish']}
 
 【空头观点】
-{results.get('bearish', '无')}
+{brief['bearish']}
 
 请评估投资风险，包括但不限于：
 1. 市场风险
@@ -187,28 +463,31 @@ async def analyze_stock_team(code: str, name: str = "") -> Dict[str, Any]:
     except Exception as e:
         results["risk"] = f"风险评估失败: {str(e)}"
     
-    summary_prompt = f"""基于以下完整分析，请生成最终投资建议：
+    with span("agent.compact"):
+        brief["risk"] = compact(results.get("risk", '无'))
+
+    summary_prompt = f"""基于以下各环节的分析要点，请生成最终投资建议：
 
 【基本面分析】
-{results.get('fundamentals', '无')}
+{brief['fundamentals']}
 
 【技术分析】
-{results.get('technical', '无')}
+{brief['technical']}
 
 【情绪分析】
-{results.get('sentiment', '无')}
+{brief['sentiment']}
 
 【新闻分析】
-{results.get('news', '无')}
+{brief['news']}
 
 【多头观点】
-{results.get('bullish', '无')}
+{brief['bullish']}
 
 【空头观点】
-{results.get('bearish', '无')}
+{brief['bearish']}
 
 【风险评估】
-{results.get('risk', '无')}
+{brief['risk']}
 
 请生成最终投资建议，包括：
 1. 投资评级（买入/持有/卖出）
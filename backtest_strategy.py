@@ -12,14 +12,314 @@
 """
 
 import backtrader as bt
+import numpy as np
 import pandas as pd
+import array
+import math
 import os
+import time
 from datetime import datetime, timedelta
 
 # 导入 data_fetcher
 import sys
 sys.path.insert(0, os.path.dirname(__file__))
 
+import analytics
+import checkpoint
+import kline_store
+import schema
+from kline_store import derive_float_values
+from profiling import span, timed
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+# backtrader 日期数值（自 0001-01-01 起的天数）中 1970-01-01 对应的值
+BT_EPOCH_DATENUM = 719163.0
+
+
+def datetime64_to_num(values):
+    """把 datetime64 数组批量转换成 backtrader 的日期数值（等价于逐个 bt.date2num）"""
+    values = np.asarray(values).astype('datetime64[us]')
+    return values.astype('int64') / 86400e6 + BT_EPOCH_DATENUM
+
+
+def num_to_datetime64(values):
+    """把 backtrader 的日期数值数组批量转换成 datetime64[us]（datetime64_to_num 的逆运算）"""
+    values = np.asarray(values, dtype='f8')
+    return np.round((values - BT_EPOCH_DATENUM) * 86400e6).astype('int64').astype('datetime64[us]')
+
+
+class ArrayData(bt.feed.DataBase):
+    """
+    直接从 NumPy 数组读取的K线数据源
+
+    dataname 可以是:
+    - kline_store 的结构化数组（包括 np.load(mmap_mode='r') 得到的内存映射数组）
+    - {字段名: 数组} 字典，日期字段为 date，类型为 datetime64
+
+    preload 时整列写入 backtrader 的 line 缓冲区，不再逐行解析；
+    除 OHLCV 外还带两条line:
+    - turnover: 换手率(%)
+    - float_mktcap: 流通市值(亿)
+    字段缺失时对应的line为 NaN。
+
+    resume_from（日期数值）非空时只载入该日期及之后的K线，用于从检查点续跑/增量延长回测，
+    跳过的K线数记在 bar_offset，完整的日期和收盘价保留在 history 中用于核对检查点。
+    """
+
+    lines = ('turnover', 'float_mktcap')
+
+    params = (
+        ('resume_from', None),
+    )
+
+    def start(self):
+        super(ArrayData, self).start()
+
+        source = self.p.dataname
+        fields = source.dtype.names if isinstance(source, np.ndarray) else list(source.keys())
+
+        self._datenum = datetime64_to_num(source['date'])
+        self._columns = {}
+        for alias in self.getlinealiases():
+            if alias != 'datetime' and alias in fields:
+                self._columns[alias] = np.ascontiguousarray(source[alias], dtype='f8')
+
+        self._row = -1
+        self.bar_offset = 0
+        self.history = None
+
+    def preload(self):
+        # 有过滤器或时区转换时走逐行加载
+        if self._filters or self._ffilters or self._tzinput:
+            return super(ArrayData, self).preload()
+
+        keep = (self._datenum >= self.fromdate) & (self._datenum <= self.todate)
+        close = self._columns.get('close', np.full(len(self._datenum), np.nan))
+        self.history = (self._datenum[keep], close[keep])
+        if self.p.resume_from is not None:
+            skip = keep & (self._datenum < self.p.resume_from)
+            self.bar_offset = int(skip.sum())
+            keep &= ~skip
+        size = int(keep.sum())
+        nan = np.full(size, np.nan)
+
+        for alias in self.getlinealiases():
+            if alias == 'datetime':
+                values = self._datenum[keep]
+            else:
+                values = self._columns[alias][keep] if alias in self._columns else nan
+            line = getattr(self.lines, alias)
+            line.array = array.array('d', np.ascontiguousarray(values, dtype='f8').tobytes())
+
+        # 已全部载入，之后 next() 不能再从头逐行读取
+        self._row = len(self._datenum)
+        self.home()
+
+    def _load(self):
+        self._row += 1
+        if self._row >= len(self._datenum):
+            return False
+
+        for alias in self.getlinealiases():
+            line = getattr(self.lines, alias)
+            if alias == 'datetime':
+                line[0] = self._datenum[self._row]
+            elif alias in self._columns:
+                line[0] = self._columns[alias][self._row]
+
+        return True
+
+
+class BufferedLog:
+    """
+    缓冲日志：攒够 buffer_size 行后一次写出，避免每条事件同步 print
+
+    sample > 1 时每 sample 条只保留第一条（抽样），dropped 记录被丢弃的条数。
+    写出时才取 sys.stdout，因此兼容 contextlib.redirect_stdout。
+    """
+
+    def __init__(self, buffer_size=1000, sample=1, stream=None):
+        self.buffer_size = max(1, int(buffer_size))
+        self.sample = max(1, int(sample))
+        self.stream = stream
+        self.count = 0
+        self.dropped = 0
+        self._lines = []
+
+    def write(self, line):
+        self.count += 1
+        if self.sample > 1 and (self.count - 1) % self.sample:
+            self.dropped += 1
+            return
+        self._lines.append(line)
+        if len(self._lines) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._lines:
+            return
+        stream = self.stream or sys.stdout
+        stream.write('\n'.join(self._lines) + '\n')
+        self._lines.clear()
+
+
+class StrategyStats:
+    """
+    策略 next 的开销统计，按股票（数据源下标）拆分
+
+    - bars:    参与条件判断的K线数
+    - signals: 触发的买入/卖出信号数
+    - orders:  提交的订单数
+    - seconds: 判断该股票所用的时间（仅 instrument=True 时统计）
+
+    计数用 Python 列表累加，逐 bar 递增比 numpy 标量快，结束后再转成 DataFrame。
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        n = len(self.names)
+        self.bars = [0] * n
+        self.signals = [0] * n
+        self.orders = [0] * n
+        self.seconds = [0.0] * n
+        self.next_calls = 0
+        self.next_seconds = 0.0
+
+    def to_frame(self):
+        """按股票的统计表，按耗时（无耗时统计时按K线数）降序"""
+        df = pd.DataFrame({
+            'symbol': self.names,
+            'bars': self.bars,
+            'signals': self.signals,
+            'orders': self.orders,
+            'seconds': self.seconds,
+        })
+        key = 'seconds' if any(self.seconds) else 'bars'
+        return df.sort_values(key, ascending=False).reset_index(drop=True)
+
+    def summary(self):
+        return {
+            'symbols': len(self.names),
+            'next_calls': self.next_calls,
+            'next_seconds': self.next_seconds,
+            'bars': sum(self.bars),
+            'signals': sum(self.signals),
+            'orders': sum(self.orders),
+            'us_per_bar': self.next_seconds / sum(self.bars) * 1e6 if sum(self.bars) else None,
+        }
+
+    def report(self, top=10):
+        """文本报告：总体开销 + 耗时最多的 top 只股票"""
+        summary = self.summary()
+        lines = [
+            f"next 调用 {summary['next_calls']} 次, 耗时 {summary['next_seconds']:.3f}s, "
+            f"股票 {summary['symbols']} 只, 判断K线 {summary['bars']} 根, "
+            f"信号 {summary['signals']} 个, 订单 {summary['orders']} 笔"
+        ]
+        if summary['us_per_bar'] is not None:
+            lines.append(f"平均每根K线 {summary['us_per_bar']:.1f} us")
+        if top:
+            for row in self.to_frame().head(top).itertuples(index=False):
+                lines.append(f"  {row.symbol}: K线 {row.bars}, 信号 {row.signals}, "
+                             f"订单 {row.orders}, 耗时 {row.seconds * 1000:.1f}ms")
+        return '\n'.join(lines)
+
+
+class PositionBook:
+    """
+    按股票（数据源下标）记录的持仓簿
+
+    - entry_bar:   产生买入信号时该股票的bar序号（len(d)），-1 表示未持仓
+    - entry_price: 买入成交价，未成交时为 NaN
+    - pending:     尚未完成的订单，None 表示没有在途订单
+
+    多只股票同时持仓时各自独立计算持有期，不会互相覆盖。
+    """
+
+    def __init__(self, size):
+        self.entry_bar = np.full(size, -1, dtype=np.int64)
+        self.entry_price = np.full(size, np.nan)
+        self.pending = [None] * size
+
+    def __len__(self):
+        return len(self.entry_bar)
+
+    def open(self, i, bar, order):
+        """提交买单"""
+        self.entry_bar[i] = bar
+        self.entry_price[i] = np.nan
+        self.pending[i] = order
+
+    def filled(self, i, price):
+        """买单成交"""
+        self.entry_price[i] = price
+        self.pending[i] = None
+
+    def close(self, i):
+        """平仓（卖单成交）或买单失败"""
+        self.entry_bar[i] = -1
+        self.entry_price[i] = np.nan
+        self.pending[i] = None
+
+    def holding(self):
+        """已记录买入的数据源下标"""
+        return np.flatnonzero(self.entry_bar >= 0)
+
+
+class ColumnRecorder:
+    """
+    预分配的列式记录器，每列一个定类型的 NumPy 数组
+
+    逐 bar / 逐笔成交写入下一行，容量不够时翻倍扩容，不为每条记录分配字典。
+    columns() 返回已写入部分的视图，交给 pandas 时不复制数据（之后继续写入扩容时视图不再更新）。
+    """
+
+    def __init__(self, columns, capacity=256):
+        self.names = [name for name, _ in columns]
+        self._columns = [np.empty(max(int(capacity), 1), dtype=dtype) for _, dtype in columns]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return len(self._columns[0])
+
+    def reserve(self, capacity):
+        """把容量扩大到至少 capacity 行"""
+        if capacity <= self.capacity:
+            return
+        for k, col in enumerate(self._columns):
+            grown = np.empty(capacity, dtype=col.dtype)
+            grown[:self.size] = col[:self.size]
+            self._columns[k] = grown
+
+    def append(self, *values):
+        i = self.size
+        if i == self.capacity:
+            self.reserve(2 * i)
+        for col, value in zip(self._columns, values):
+            col[i] = value
+        self.size = i + 1
+
+    def columns(self):
+        """{列名: 已写入部分的视图}"""
+        return {name: col[:self.size] for name, col in zip(self.names, self._columns)}
+
+    def get_state(self):
+        return {name: col.copy() for name, col in self.columns().items()}
+
+    def set_state(self, state):
+        size = len(state[self.names[0]])
+        self.size = 0
+        self.reserve(size)
+        for name, col in zip(self.names, self._columns):
+            col[:size] = state[name]
+        self.size = size
+
 
 class MAVolumeStrategy(bt.Strategy):
     """
@@ -44,14 +344,39 @@ class MAVolumeStrategy(bt.Strategy):
         ('turnover_min', 4.0),  # 最小换手率
         ('turnover_max', 10.0), # 最大换手率
         ('vol_ratio_min', 1.0), # 最小量比
+        ('mktcap_min', None),   # 最小流通市值(亿)，None 表示不限制（与实时选股一致）
+        ('mktcap_max', None),   # 最大流通市值(亿)
+        ('trade_start', None),  # 开始交易日期，之前的bar只用于均线预热
+        ('printlog', True),     # 是否打印交易日志
+        ('log_buffer', 1000),   # 日志缓冲行数，1 表示每条立即输出
+        ('log_sample', 1),      # 日志抽样间隔，N 表示每 N 条保留 1 条
+        ('instrument', False),  # 是否按股票统计 next 的耗时（计数始终统计）
+        ('checkpoint', None),   # 检查点文件，非空时定期保存进度，中断后再次运行从检查点继续
+        ('checkpoint_every', 50),  # 每隔多少根bar保存一次检查点
+        ('state_file', None),   # 回测结束状态文件，K线增加后再次运行时从该状态延长回测
     )
 
     def __init__(self):
         self.inds = {}
-        self.order = None
-        self.entry_bar = None  # 记录买入时的bar索引
+        self.book = PositionBook(len(self.datas))
+        # self.stats 已被 backtrader 用作观察器集合
+        self.next_stats = StrategyStats(d._name for d in self.datas)
+        self._logbuf = BufferedLog(self.params.log_buffer, self.params.log_sample)
+
+        # 每个数据源自身的预热期：均线形成且有前一根K线
+        self._warmup = max(self.params.ma_short, self.params.ma_mid, self.params.ma_long, 5, 2)
+        self._feed_lens = [0] * len(self.datas)
+        self._active_index = None
+        self._checkpoint = None
+
+        for i, d in enumerate(self.datas):
+            d.book_index = i
+
+            # 数据源是否带换手率/流通市值（ArrayData）
+            aliases = d.lines.getlinealiases()
+            d.has_turnover = 'turnover' in aliases
+            d.has_mktcap = 'float_mktcap' in aliases
 
-        for d in self.datas:
             # 计算移动平均线
             d.ma5 = bt.indicators.SMA(d.close, period=self.params.ma_short)
             d.ma10 = bt.indicators.SMA(d.close, period=self.params.ma_mid)
@@ -60,80 +385,321 @@ class MAVolumeStrategy(bt.Strategy):
             # 计算成交量均线
             d.vol_ma5 = bt.indicators.SMA(d.volume, period=5)
 
-            # 涨跌幅
-            d.pct_change = (d.close - d.close(-1)) / d.close(-1) * 100
-
             self.inds[d] = {
                 'ma5': d.ma5,
                 'ma10': d.ma10,
                 'ma20': d.ma20,
-                'pct_change': d.pct_change,
             }
 
     def log(self, txt, dt=None):
-        dt = dt or self.datas[0].datetime.date(0)
-        print(f'[{dt.isoformat()}] {txt}')
+        if not self.params.printlog:
+            return
+        dt = dt or self.datetime.date(0)
+        self._logbuf.write(f'[{dt.isoformat()}] {txt}')
+
+    def start(self):
+        self._active_index = self._build_active_index()
+        if self.params.checkpoint or self.params.state_file:
+            self._checkpoint = checkpoint.BacktestCheckpoint(
+                self, self.params.checkpoint, self.params.checkpoint_every,
+                self.params.state_file, lookback=self._warmup)
+
+    def stop(self):
+        self._logbuf.flush()
+        if self._checkpoint is not None:
+            self._checkpoint.finish()
+
+    def get_state(self):
+        """
+        检查点保存的策略状态，子类有额外的记录时扩展
+
+        bar 序号按完整数据保存（加上数据源裁剪掉的 bar_offset）
+        """
+        self._logbuf.flush()
+        offsets = np.asarray(self._checkpoint.offsets, dtype=np.int64)
+        entry_bar = self.book.entry_bar
+        return {
+            'entry_bar': np.where(entry_bar >= 0, entry_bar + offsets, -1),
+            'entry_price': self.book.entry_price.copy(),
+            'next_stats': vars(self.next_stats),
+            'feed_lens': [n + offset for n, offset in zip(self._feed_lens, offsets.tolist())],
+        }
+
+    def set_state(self, state):
+        offsets = np.asarray(self._checkpoint.offsets, dtype=np.int64)
+        entry_bar = state['entry_bar']
+        self.book.entry_bar[:] = np.where(entry_bar >= 0, entry_bar - offsets, -1)
+        self.book.entry_price[:] = state['entry_price']
+        vars(self.next_stats).update(state['next_stats'])
+        self._feed_lens = [n - offset for n, offset in zip(state['feed_lens'], offsets.tolist())]
+
+    def _build_active_index(self):
+        """
+        预加载时按日期建立活跃索引 {日期数值: [数据源下标]}
+
+        只收录当天有K线且已过各自预热期的数据源，next 中直接按日期取出，
+        每根bar的开销与当天活跃的股票数成正比，而不是与股票池大小成正比。
+        数据未预加载（如实时数据源）时返回 None，改为逐个比较长度。
+        """
+        if not self.datas or not all(d.buflen() > 0 for d in self.datas):
+            return None
+
+        dates, owners = [], []
+        for i, d in enumerate(self.datas):
+            dt = np.array(d.datetime.array[self._warmup - 1:], dtype=float)
+            dates.append(dt)
+            owners.append(np.full(len(dt), i, dtype=np.int64))
+        dates = np.concatenate(dates)
+        owners = np.concatenate(owners)
+
+        # 稳定排序，同一天内保持数据源的添加顺序（下单顺序与逐个遍历一致）
+        order = np.argsort(dates, kind='stable')
+        dates, owners = dates[order], owners[order]
+        keys, starts = np.unique(dates, return_index=True)
+        groups = np.split(owners, starts[1:])
+        return {key: group.tolist() for key, group in zip(keys.tolist(), groups)}
+
+    def _active_feeds(self):
+        """本bar有新K线且已过预热期的数据源下标"""
+        if self._active_index is not None:
+            return self._active_index.get(self.datetime[0], ())
+
+        active = []
+        feed_lens = self._feed_lens
+        for i, d in enumerate(self.datas):
+            n = len(d)
+            if n != feed_lens[i]:
+                feed_lens[i] = n
+                if n >= self._warmup:
+                    active.append(i)
+        return active
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
             return
 
+        i = order.data.book_index
         if order.status in [order.Completed]:
             if order.isbuy():
                 self.log(f'买入执行: 价格 {order.executed.price:.2f}, 数量 {order.executed.size}')
+                self.book.filled(i, order.executed.price)
             elif order.issell():
                 self.log(f'卖出执行: 价格 {order.executed.price:.2f}, 数量 {order.executed.size}')
-
-        self.order = None
+                if self.getposition(order.data).size > 0:
+                    self.book.pending[i] = None
+                else:
+                    self.book.close(i)
+        elif order.isbuy():
+            # 买单被拒绝/取消（如资金不足），视为未买入
+            self.book.close(i)
+        else:
+            self.book.pending[i] = None
+
+    def prenext(self):
+        # 上市日期不同的股票各自预热，不必等所有数据源的均线都形成
+        self.next()
 
     def next(self):
-        # 跳过前20天（等待均线形成）
-        if len(self) < self.params.ma_long:
+        # 从检查点续跑时，检查点之前的bar已经执行过
+        if self._checkpoint is not None and not self._checkpoint.step():
+            return
+        self.on_bar()
+        start = time.perf_counter()
+        self._next_bar()
+        self.next_stats.next_calls += 1
+        self.next_stats.next_seconds += time.perf_counter() - start
+
+    def _next_bar(self):
+        # 预热期内不交易（滚动窗口回测时使用）
+        if (self.params.trade_start is not None and
+                self.datetime.date(0) < self.params.trade_start):
             return
 
-        for d in self.datas:
-            # 获取当前数据
-            close = d.close[0]
-            ma5 = d.ma5[0]
-            ma10 = d.ma10[0]
-            ma20 = d.ma20[0]
-            pct = d.pct_change[0]
-            volume = d.volume[0]
-            vol_yesterday = d.volume[-1]
-
-            # 计算量比
-            vol_ratio = volume / vol_yesterday if vol_yesterday > 0 else 0
-
-            # 买入条件检查
-            # 1. 均线多头排列: ma5 > ma10 > ma20
-            # 2. 涨幅在2%-5%之间
-            # 3. 收盘价在均线上方
-
-            ma_alignment = ma5 > ma10 > ma20
-            price_above_ma = close > ma5
-
-            buy_condition = (
-                ma_alignment and
-                price_above_ma and
-                self.params.pct_min <= pct <= self.params.pct_max and
-                vol_ratio > self.params.vol_ratio_min
-            )
+        # 只判断本bar有新K线且均线已形成的股票
+        active = self._active_feeds()
+        datas = self.datas
+        if self.params.instrument:
+            seconds = self.next_stats.seconds
+            for i in active:
+                start = time.perf_counter()
+                self._next_data(i, datas[i])
+                seconds[i] += time.perf_counter() - start
+        else:
+            for i in active:
+                self._next_data(i, datas[i])
+
+    def _next_data(self, i, d):
+        """判断第 i 个数据源当前bar的买卖条件"""
+        stats = self.next_stats
+        stats.bars[i] += 1
+
+        # 获取当前数据
+        close = d.close[0]
+        close_prev = d.close[-1]
+        ma5 = d.ma5[0]
+        ma10 = d.ma10[0]
+        ma20 = d.ma20[0]
+        volume = d.volume[0]
+        vol_yesterday = d.volume[-1]
+
+        # 均线未形成（NaN）或价格异常时跳过
+        if not (ma5 > 0 and ma10 > 0 and ma20 > 0):
+            return
+
+        # 涨跌幅和量比
+        pct = (close - close_prev) / close_prev * 100 if close_prev > 0 else 0
+        vol_ratio = volume / vol_yesterday if vol_yesterday > 0 else 0
+
+        # 买入条件检查
+        # 1. 均线多头排列: ma5 > ma10 > ma20
+        # 2. 涨幅在2%-5%之间
+        # 3. 收盘价在均线上方
+        # 4. 换手率/流通市值在范围内（数据源带有这些字段时）
+
+        ma_alignment = ma5 > ma10 > ma20
+        price_above_ma = close > ma5
+
+        buy_condition = (
+            ma_alignment and
+            price_above_ma and
+            self.params.pct_min <= pct <= self.params.pct_max and
+            vol_ratio > self.params.vol_ratio_min and
+            self._screen_fields_ok(d)
+        )
+
+        # 该股票有在途订单时等待成交
+        book = self.book
+        if book.pending[i] is not None:
+            return
 
-            # 如果没有持仓且满足买入条件
-            if not self.getposition(d).size > 0:
-                if buy_condition:
+        # 如果没有持仓且满足买入条件
+        if not self.getposition(d).size > 0:
+            if buy_condition:
+                stats.signals[i] += 1
+                if self.params.printlog:
                     self.log(f'{d._name} 满足买入条件: 收盘价={close:.2f}, '
-                            f'涨幅={pct:.2f}%, 量比={vol_ratio:.2f}, '
-                            f'MA5={ma5:.2f}, MA10={ma10:.2f}, MA20={ma20:.2f}')
-                    self.order = self.buy(d)
-                    self.entry_bar = len(d)
+                             f'涨幅={pct:.2f}%, 量比={vol_ratio:.2f}, '
+                             f'MA5={ma5:.2f}, MA10={ma10:.2f}, MA20={ma20:.2f}')
+                book.open(i, len(d), self.buy(d))
+                stats.orders[i] += 1
+                self.on_signal(d, 'buy', close)
+
+        # 卖出条件：次日卖出（T+1），按该股票自己的买入bar计算持有期
+        else:
+            entry_bar = book.entry_bar[i]
+            if entry_bar < 0 or len(d) - entry_bar > 1:
+                stats.signals[i] += 1
+                self.log(f'{d._name} 卖出: 持有期结束')
+                book.pending[i] = self.sell(d)
+                stats.orders[i] += 1
+                self.on_signal(d, 'sell', close)
+
+    def on_bar(self):
+        """每根bar判断条件之前的回调，子类可用来记录权益"""
+        pass
+
+    def on_signal(self, d, action, price):
+        """下单后的回调，子类可用来记录信号"""
+        pass
+
+    def _screen_fields_ok(self, d):
+        """换手率和流通市值条件，字段缺失（NaN）时不作限制"""
+        if d.has_turnover:
+            turnover = d.turnover[0]
+            if turnover == turnover and not (
+                    self.params.turnover_min <= turnover <= self.params.turnover_max):
+                return False
+        if d.has_mktcap and (self.params.mktcap_min is not None or
+                             self.params.mktcap_max is not None):
+            mktcap = d.float_mktcap[0]
+            if mktcap != mktcap:
+                return False
+            if self.params.mktcap_min is not None and mktcap < self.params.mktcap_min:
+                return False
+            if self.params.mktcap_max is not None and mktcap > self.params.mktcap_max:
+                return False
+        return True
+
+
+class TrackedMAVolumeStrategy(MAVolumeStrategy):
+    """
+    记录权益曲线和成交明细的 MAVolumeStrategy
 
-            # 卖出条件：次日卖出（T+1）
-            else:
-                if self.entry_bar is not None and len(d) - self.entry_bar > 1:
-                    self.log(f'{d._name} 卖出: 持有期结束')
-                    self.order = self.sell(d)
-                    self.entry_bar = None
+    每根bar的总资产、现金和每笔成交（notify_order 中的实际成交价、数量、手续费、平仓盈亏）
+    写入预分配的列式记录器。回测结束后 equity_frame() / fills_frame() 以记录数组的视图构建
+    DataFrame 供 API 返回给前端，analyze() 由它们计算绩效指标（不挂载分析器）。
+    """
+
+    params = (
+        ('printlog', False),
+    )
+
+    # 记录格式变化时递增，之前保存的检查点和结束状态不再使用（checkpoint 的任务签名包含该值）
+    STATE_VERSION = 2
+
+    EQUITY_COLUMNS = [('datetime', 'f8'), ('value', 'f8'), ('cash', 'f8')]
+    FILL_COLUMNS = [('datetime', 'f8'), ('feed', 'i4'), ('size', 'f8'), ('price', 'f8'),
+                    ('commission', 'f8'), ('pnl', 'f8')]
+
+    def __init__(self):
+        super().__init__()
+        self.equity = ColumnRecorder(self.EQUITY_COLUMNS)
+        self.fills = ColumnRecorder(self.FILL_COLUMNS)
+
+    def start(self):
+        super().start()
+        # 数据已预加载时按交易日数一次分配权益记录
+        if self.datas and all(d.buflen() > 0 for d in self.datas):
+            dates = np.concatenate([np.asarray(d.datetime.array, dtype='f8') for d in self.datas])
+            self.equity.reserve(len(np.unique(dates)))
+
+    def on_bar(self):
+        broker = self.broker
+        self.equity.append(self.datetime[0], broker.getvalue(), broker.getcash())
+
+    def notify_order(self, order):
+        super().notify_order(order)
+        if order.status == order.Completed:
+            executed = order.executed
+            self.fills.append(executed.dt, order.data.book_index, executed.size, executed.price,
+                              executed.comm, executed.pnl)
+
+    def get_state(self):
+        state = super().get_state()
+        state['equity'] = self.equity.get_state()
+        state['fills'] = self.fills.get_state()
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.equity.set_state(state['equity'])
+        self.fills.set_state(state['fills'])
+
+    def equity_frame(self):
+        """权益曲线：以时间为索引，value（总资产）、cash（现金）两列"""
+        columns = self.equity.columns()
+        index = pd.DatetimeIndex(num_to_datetime64(columns['datetime']), name='datetime')
+        return pd.DataFrame({'value': columns['value'], 'cash': columns['cash']},
+                            index=index, copy=False)
+
+    def fills_frame(self):
+        """成交明细（analytics.FILL_COLUMNS），买入 size 为正、卖出为负"""
+        columns = self.fills.columns()
+        names = np.array([d._name for d in self.datas], dtype=object)
+        return pd.DataFrame({
+            'date': num_to_datetime64(columns['datetime']),
+            'symbol': names[columns['feed']],
+            'size': columns['size'],
+            'price': columns['price'],
+            'commission': columns['commission'],
+            'pnl': columns['pnl'],
+        }, copy=False)
+
+    def analyze(self):
+        """由记录的权益曲线和成交明细计算绩效指标（见 analytics.analyze）"""
+        equity = self.equity_frame()
+        return analytics.analyze(equity.index, equity['value'], self.broker.startingcash,
+                                 fills=self.fills_frame(), cash=equity['cash'])
 
 
 class MeanReversionStrategy(bt.Strategy):
@@ -155,7 +721,7 @@ class MeanReversionStrategy(bt.Strategy):
             }
 
     def next(self):
-        for d in self.dates:
+        for d in self.datas:
             if len(self) < self.params.period:
                 continue
 
@@ -172,6 +738,74 @@ class MeanReversionStrategy(bt.Strategy):
                     self.sell(d)
 
 
+def returns_metrics(returns):
+    """
+    根据日收益率序列计算收益、夏普和最大回撤
+
+    Args:
+        returns: 以日期为索引的日收益率 Series（小数形式）
+
+    Returns:
+        dict: total_return/annual_return/max_drawdown 为百分比
+    """
+    if returns is None or len(returns) == 0:
+        return {
+            'total_return': 0.0,
+            'annual_return': 0.0,
+            'sharpe_ratio': None,
+            'max_drawdown': 0.0,
+            'days': 0,
+        }
+
+    equity = (1 + returns).cumprod()
+    total_return = equity.iloc[-1] - 1
+    annual_return = (1 + total_return) ** (TRADING_DAYS_PER_YEAR / len(returns)) - 1
+    std = returns.std()
+    sharpe = None
+    if std and not math.isnan(std) and std > 0:
+        sharpe = returns.mean() / std * math.sqrt(TRADING_DAYS_PER_YEAR)
+    drawdown = 1 - equity / equity.cummax()
+
+    return {
+        'total_return': float(total_return * 100),
+        'annual_return': float(annual_return * 100),
+        'sharpe_ratio': float(sharpe) if sharpe is not None else None,
+        'max_drawdown': float(drawdown.max() * 100),
+        'days': int(len(returns)),
+    }
+
+
+def benchmark_equity(close, index, initial_cash):
+    """
+    把基准收盘价对齐到回测的时间轴并换算成净值
+
+    Args:
+        close: 以时间为索引的基准收盘价 Series（指数或等权组合）
+        index: 回测净值的时间索引（日线或分钟线）
+        initial_cash: 初始资金，基准净值从该值开始
+
+    Returns:
+        与 index 对齐的基准净值 Series；index 中早于基准数据的时点净值为 initial_cash
+    """
+    close = close[~close.index.duplicated(keep='last')].sort_index()
+    # 先在并集上前向填充，停牌/非交易时点沿用最近的收盘价，再取回测时点
+    aligned = close.reindex(close.index.union(index)).ffill().reindex(index)
+    returns = aligned.pct_change(fill_method=None).fillna(0.0)
+    return initial_cash * (1 + returns).cumprod()
+
+
+def equal_weight_close(closes):
+    """
+    多只股票的等权组合价格（每日收益率取平均后累乘），没有指数数据时作为基准
+
+    Args:
+        closes: {股票代码: 以日期为索引的收盘价 Series}
+    """
+    panel = pd.DataFrame(closes).sort_index()
+    returns = panel.pct_change(fill_method=None).mean(axis=1).fillna(0.0)
+    return (1 + returns).cumprod()
+
+
 def run_backtest(data_file=None, initial_cash=100000):
     """
     运行回测
@@ -218,14 +852,8 @@ def run_backtest(data_file=None, initial_cash=100000):
             )
             cerebro.adddata(data)
 
-    # 添加策略
-    cerebro.addstrategy(MAVolumeStrategy)
-
-    # 添加分析器
-    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
-    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
-    cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
-    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+    # 添加策略（记录权益曲线和成交明细，回测结束后计算绩效指标）
+    cerebro.addstrategy(TrackedMAVolumeStrategy, printlog=True)
 
     # 设置头寸大小
     cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
@@ -234,7 +862,8 @@ def run_backtest(data_file=None, initial_cash=100000):
     print(f'初始资金: {cerebro.broker.getvalue():.2f}')
 
     # 运行回测
-    results = cerebro.run()
+    with span('cerebro.run'):
+        results = cerebro.run()
 
     # 打印最终资金
     final_value = cerebro.broker.getvalue()
@@ -248,29 +877,14 @@ def run_backtest(data_file=None, initial_cash=100000):
 
     strat = results[0]
 
-    # 夏普比率
-    sharpe = strat.analyzers.sharpe.get_analysis()
-    if sharpe.get('sharperatio'):
-        print(f"夏普比率: {sharpe['sharperatio']:.2f}")
-
-    # 回撤
-    drawdown = strat.analyzers.drawdown.get_analysis()
-    if drawdown.get('max'):
-        print(f"最大回撤: {drawdown['max']['drawdown']:.2f}%")
-
-    # 收益率
-    returns = strat.analyzers.returns.get_analysis()
-    if returns.get('rnorm100'):
-        print(f"年化收益率: {returns['rnorm100']:.2f}%")
-
-    # 交易统计
-    trades = strat.analyzers.trades.get_analysis()
-    if trades.get('total'):
-        print(f"总交易次数: {trades['total']['total']}")
-        if trades.get('won'):
-            print(f"盈利次数: {trades['won']['total']}")
-        if trades.get('lost'):
-            print(f"亏损次数: {trades['lost']['total']}")
+    # 绩效指标
+    with span('analytics'):
+        metrics = strat.analyze()
+    print(analytics.report(metrics))
+
+    # 策略开销
+    print("\n策略开销:")
+    print(strat.next_stats.report(top=5))
 
     print("\n" + "=" * 60)
     print("回测完成!")
@@ -279,62 +893,115 @@ def run_backtest(data_file=None, initial_cash=100000):
     return results
 
 
-def dataframe_to_backtrader(df, symbol, date_col='日期'):
+def frame_columns(df, date_col='日期'):
     """
-    将 pandas DataFrame 转换为 backtrader 可用的格式
+    把K线 DataFrame 转换成 {line 名: NumPy 数组}（ArrayData 的 dataname，也供 kernels 使用）
+
+    除 OHLCV 外，还会带上换手率和流通市值（缺少流通市值时由成交额和换手率反推）。
 
     Args:
-        df: 包含历史数据的 DataFrame
-        symbol: 股票代码
+        df: 包含历史数据的 DataFrame（akshare 中文列名或 kline_store 英文字段名）
         date_col: 日期列名
 
     Returns:
-        backtrader.feeds.PandasData
+        dict，日期字段为 date（datetime64）；df 为空时返回 None
     """
     if df is None or len(df) == 0:
         return None
 
     # 确保日期列是 datetime 类型
-    df = df.copy()
-    if date_col in df.columns:
-        df[date_col] = pd.to_datetime(df[date_col])
-        df.set_index(date_col, inplace=True)
+    if date_col not in df.columns and 'date' in df.columns:
+        date_col = 'date'
+    dates = df[date_col] if date_col in df.columns else df.index
+    columns = {'date': schema.to_datetime(dates).to_numpy()}
 
-    # 检查必需的列并重命名
+    # 中文列名 -> backtrader line 名
     rename_map = {
         '开盘': 'open',
         '最高': 'high',
         '最低': 'low',
         '收盘': 'close',
-        '成交量': 'volume'
+        '成交量': 'volume',
+        '成交额': 'amount',
+        '换手率': 'turnover',
     }
+    for src, dst in rename_map.items():
+        if src in df.columns:
+            columns[dst] = df[src].to_numpy(dtype='f8')
+        elif dst in df.columns:
+            columns[dst] = df[dst].to_numpy(dtype='f8')
+
+    # 缺失的价格列补 0（与之前的行为一致）
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        if col not in columns:
+            columns[col] = np.zeros(len(df))
+
+    if 'float_mktcap' in df.columns:
+        columns['float_mktcap'] = df['float_mktcap'].to_numpy(dtype='f8')
+    elif 'amount' in columns and 'turnover' in columns:
+        _, columns['float_mktcap'] = derive_float_values(
+            columns['volume'], columns['amount'], columns['turnover'])
+    return columns
+
+
+@timed('feed.build')
+def dataframe_to_backtrader(df, symbol, date_col='日期'):
+    """
+    将 pandas DataFrame 转换为 backtrader 可用的格式
 
-    # 重命名列以匹配 backtrader 期望的格式
-    df_bt = df.rename(columns=rename_map)
+    直接取出各列的 NumPy 数组构建 ArrayData，不再复制/重命名整个 DataFrame。
+    除 OHLCV 外，还会带上换手率和流通市值（缺少流通市值时由成交额和换手率反推），
+    供策略按实时选股同样的条件过滤。
 
-    # 确保只包含需要的列
-    cols_needed = ['open', 'high', 'low', 'close', 'volume']
-    for col in cols_needed:
-        if col not in df_bt.columns:
-            df_bt[col] = 0.0
+    Args:
+        df: 包含历史数据的 DataFrame（akshare 中文列名或 kline_store 英文字段名）
+        symbol: 股票代码
+        date_col: 日期列名
 
-    df_bt = df_bt[cols_needed].copy()
+    Returns:
+        ArrayData
+    """
+    columns = frame_columns(df, date_col)
+    if columns is None:
+        return None
 
     # 创建 backtrader 数据源
-    data = bt.feeds.PandasData(
-        dataname=df_bt,
+    data = ArrayData(
+        dataname=columns,
         name=symbol
     )
     return data
 
 
-def run_backtest_with_datafetcher(initial_cash=100000, force_refresh=False):
+def kline_store_to_backtrader(symbol, fromdate=None, todate=None):
+    """
+    以内存映射方式从本地K线存储创建数据源
+
+    多次回测（以及多个进程）共享同一份文件页缓存，不经过 DataFrame。
+
+    Returns:
+        ArrayData，本地没有该股票数据时返回 None
+    """
+    records = kline_store.load_kline(symbol, mmap=True)
+    if records is None or len(records) == 0:
+        return None
+
+    kwargs = {}
+    if fromdate is not None:
+        kwargs['fromdate'] = fromdate
+    if todate is not None:
+        kwargs['todate'] = todate
+    return ArrayData(dataname=records, name=str(symbol).zfill(6), **kwargs)
+
+
+def run_backtest_with_datafetcher(initial_cash=100000, force_refresh=False, checkpoint_file=None):
     """
     使用 data_fetcher 获取数据并运行回测
 
     Args:
         initial_cash: 初始资金
         force_refresh: 是否强制刷新数据
+        checkpoint_file: 检查点文件，中断后再次运行时从检查点继续
 
     Returns:
         回测结果
@@ -364,7 +1031,7 @@ def run_backtest_with_datafetcher(initial_cash=100000, force_refresh=False):
     cerebro.broker.setcommission(commission=0.001)
 
     # 获取每只股票的历史数据并添加到 cerebro
-    symbols = filtered_df['代码'].head(10).tolist()  # 限制数量避免请求过多
+    symbols = filtered_df['code'].head(10).astype(str).tolist()  # 限制数量避免请求过多
     loaded_count = 0
 
     for symbol in symbols:
@@ -385,59 +1052,39 @@ def run_backtest_with_datafetcher(initial_cash=100000, force_refresh=False):
 
     print(f"\n成功加载 {loaded_count} 只股票的历史数据")
 
-    # 3. 添加策略
-    cerebro.addstrategy(MAVolumeStrategy)
-
-    # 4. 添加分析器
-    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
-    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
-    cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
-    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+    # 3. 添加策略（记录权益曲线和成交明细，回测结束后计算绩效指标）
+    cerebro.addstrategy(TrackedMAVolumeStrategy, printlog=True, checkpoint=checkpoint_file)
 
-    # 5. 设置头寸大小
+    # 4. 设置头寸大小
     cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
 
-    # 6. 打印初始资金
+    # 5. 打印初始资金
     print(f'初始资金: {cerebro.broker.getvalue():.2f}')
 
-    # 7. 运行回测
-    results = cerebro.run()
+    # 6. 运行回测
+    with span('cerebro.run'):
+        results = cerebro.run()
 
-    # 8. 打印最终资金
+    # 7. 打印最终资金
     final_value = cerebro.broker.getvalue()
     print(f'最终资金: {final_value:.2f}')
     print(f'总收益率: {(final_value - initial_cash) / initial_cash * 100:.2f}%')
 
-    # 9. 打印分析结果
+    # 8. 打印分析结果
     print("\n" + "=" * 60)
     print("回测分析")
     print("=" * 60)
 
     strat = results[0]
 
-    # 夏普比率
-    sharpe = strat.analyzers.sharpe.get_analysis()
-    if sharpe.get('sharperatio'):
-        print(f"夏普比率: {sharpe['sharperatio']:.2f}")
-
-    # 回撤
-    drawdown = strat.analyzers.drawdown.get_analysis()
-    if drawdown.get('max'):
-        print(f"最大回撤: {drawdown['max']['drawdown']:.2f}%")
-
-    # 收益率
-    returns = strat.analyzers.returns.get_analysis()
-    if returns.get('rnorm100'):
-        print(f"年化收益率: {returns['rnorm100']:.2f}%")
-
-    # 交易统计
-    trades = strat.analyzers.trades.get_analysis()
-    if trades.get('total'):
-        print(f"总交易次数: {trades['total']['total']}")
-        if trades.get('won'):
-            print(f"盈利次数: {trades['won']['total']}")
-        if trades.get('lost'):
-            print(f"亏损次数: {trades['lost']['total']}")
+    # 绩效指标
+    with span('analytics'):
+        metrics = strat.analyze()
+    print(analytics.report(metrics))
+
+    # 策略开销
+    print("\n策略开销:")
+    print(strat.next_stats.report(top=5))
 
     print("\n" + "=" * 60)
     print("回测完成!")
@@ -449,14 +1096,17 @@ def run_backtest_with_datafetcher(initial_cash=100000, force_refresh=False):
 if __name__ == "__main__":
     import sys
 
+    # 中断后再次运行时从检查点继续
+    checkpoint_file = os.path.join(os.path.dirname(__file__), 'data', 'backtest.checkpoint')
+
     # 检查命令行参数
     if len(sys.argv) > 1 and sys.argv[1] == '--live':
         # 使用实时数据模式
         force_refresh = len(sys.argv) > 2 and sys.argv[2] == '--refresh'
-        run_backtest_with_datafetcher(force_refresh=force_refresh)
+        run_backtest_with_datafetcher(force_refresh=force_refresh, checkpoint_file=checkpoint_file)
     elif len(sys.argv) > 1:
         data_file = sys.argv[1]
         run_backtest(data_file)
     else:
         # 默认使用 data_fetcher 获取数据
-        run_backtest_with_datafetcher()
+        run_backtest_with_datafetcher(checkpoint_file=checkpoint_file)
@@ -0,0 +1,626 @@
+#!/usr/bin/env python3
+"""
+性能基准测试
+
+使用合成（或本地已存储的）K线数据，不需要网络，测量:
+1. screen        - fetch_and_save_data 的选股流程（读本地行情CSV + 条件筛选）
+2. feed          - dataframe_to_backtrader 构建数据源
+3. cerebro       - MAVolumeStrategy 完整回测，默认 10/100/1000 只股票
+4. api_backtest  - 通过 TestClient 调用 /api/backtest
+
+结果写成 JSON（含 git commit），可以用 --compare 和之前的结果对比，跟踪性能回退。
+每条结果的 params 只包含输入（股票数、K线条数等），按 (name, params) 与之前的结果对应；
+结果正确性检查（如与完整回测是否一致）记在 checks 中，未通过时输出和对比中都会标出。
+
+用法:
+    python benchmark.py                           # 全部基准，结果写到 bench_results.json
+    python benchmark.py cerebro --sizes 10 100    # 只跑部分基准
+    python benchmark.py --store                   # 使用 kline_store 中的真实K线
+    python benchmark.py --replay data/replay      # 经 ReplayProvider 回放录制的 akshare 数据
+    python benchmark.py --compare old.json        # 与之前的结果对比
+"""
+
+import os
+import sys
+import io
+import gc
+import json
+import time
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PROJECT_DIR)
+
+BENCHMARKS = ['screen', 'feed', 'cerebro', 'incremental', 'precompute_backtest', 'kernels',
+              'api_backtest', 'startup']
+
+
+# ---------------------------------------------------------------------------
+# 合成数据
+# ---------------------------------------------------------------------------
+
+def make_kline(symbol, days=500, seed=0, end_date='2025-12-31'):
+    """生成 ak.stock_zh_a_hist 格式的日K线（随机游走）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end_date, periods=days)
+
+    close = 10 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, days)))
+    open_ = close * (1 + rng.normal(0, 0.005, days))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, days))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, days))
+    volume = rng.integers(50_000, 1_000_000, days).astype(float)
+    prev_close = np.r_[close[0], close[:-1]]
+
+    return pd.DataFrame({
+        '日期': dates.strftime('%Y-%m-%d'),
+        '股票代码': symbol,
+        '开盘': open_.round(2),
+        '收盘': close.round(2),
+        '最高': high.round(2),
+        '最低': low.round(2),
+        '成交量': volume,
+        '成交额': volume * 100 * close,
+        '振幅': ((high - low) / prev_close * 100).round(2),
+        '涨跌幅': ((close - prev_close) / prev_close * 100).round(2),
+        '涨跌额': (close - prev_close).round(2),
+        '换手率': rng.uniform(0.5, 12, days).round(2),
+    })
+
+
+def make_symbols(count):
+    return [f"{600000 + i:06d}" for i in range(count)]
+
+
+def make_spot(count=5000, seed=0):
+    """生成 ak.stock_zh_a_spot_em 格式的实时行情快照"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '序号': np.arange(1, count + 1),
+        '代码': make_symbols(count),
+        '名称': [f"股票{i}" for i in range(count)],
+        '最新价': rng.uniform(3, 100, count).round(2),
+        '涨跌幅': rng.normal(0, 3, count).round(2),
+        '换手率': rng.uniform(0.1, 20, count).round(2),
+        '量比': rng.uniform(0.2, 3, count).round(2),
+        '总市值': rng.uniform(10, 1000, count).round(2) * 1e8,  # 元
+    })
+
+
+@contextlib.contextmanager
+def symbol_master(codes):
+    """用给定代码构建证券主表替换当前主表（不访问网络，不写 data/symbols）"""
+    import symbols
+
+    codes = sorted(set(codes))
+    records = np.zeros(len(codes), dtype=symbols.SYMBOL_DTYPE)
+    records['code'] = codes
+    records['name'] = [f"股票{code}" for code in codes]
+    original, symbols._master = symbols._master, symbols.SymbolMaster(records)
+    try:
+        yield
+    finally:
+        symbols._master = original
+
+
+class DataSource:
+    """
+    基准测试的K线来源
+
+    - 默认: 合成数据
+    - use_store: 本地 kline_store
+    - replay_dir: 经 ReplayProvider 回放录制的数据（每次都走数据源，包含模拟延迟）
+    """
+
+    def __init__(self, days=500, use_store=False, replay_dir=None, latency_ms=0):
+        self.days = days
+        self.use_store = use_store
+        self.replay_dir = replay_dir
+        self._cache = {}
+        self._symbols = None
+        if use_store:
+            import kline_store
+            self._symbols = kline_store.list_symbols()
+            if not self._symbols:
+                raise SystemExit("kline_store 中没有数据，先运行 data_fetcher.sync_kline")
+        elif replay_dir:
+            from data_provider import ReplayProvider, set_provider
+            set_provider(ReplayProvider(replay_dir, latency_ms=latency_ms))
+            self._symbols = self._replay_symbols(replay_dir)
+            if not self._symbols:
+                raise SystemExit(f"{replay_dir} 中没有录制的历史K线")
+
+    @staticmethod
+    def _replay_symbols(replay_dir):
+        """从录制索引中找出录制过日K线（未指定日期范围）的股票"""
+        symbols = []
+        index_file = os.path.join(replay_dir, 'index.jsonl')
+        if os.path.exists(index_file):
+            with open(index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    params = entry.get('params', {})
+                    if (entry.get('name') == 'stock_zh_a_hist' and params.get('period') == 'daily'
+                            and 'start_date' not in params and 'end_date' not in params):
+                        symbols.append(params['symbol'])
+        return sorted(set(symbols))
+
+    def symbols(self, count):
+        if self._symbols is not None:
+            return self._symbols[:count]
+        return make_symbols(count)
+
+    def kline(self, symbol):
+        if self.replay_dir:
+            from data_fetcher import get_historical_data
+            return get_historical_data(symbol, period='daily').tail(self.days).reset_index(drop=True)
+
+        if symbol not in self._cache:
+            if self.use_store:
+                import kline_store
+                df = kline_store.load_kline_frame(symbol)
+                df = df.tail(self.days).reset_index(drop=True)
+            else:
+                df = make_kline(symbol, self.days, seed=int(symbol))
+            self._cache[symbol] = df
+        return self._cache[symbol]
+
+
+# ---------------------------------------------------------------------------
+# 计时工具
+# ---------------------------------------------------------------------------
+
+def measure(name, func, repeat=3, warmup=1, checks=None, **params):
+    """
+    运行 func 多次，返回耗时统计（秒）
+
+    params 为基准的输入，checks 为结果正确性检查 {名称: bool}（不参与 --compare 的对应）
+    """
+    for _ in range(warmup):
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return summarize(name, timings, checks=checks, **params)
+
+
+def summarize(name, timings, checks=None, **params):
+    """耗时列表 -> 统计结果（与 measure 相同的格式）"""
+    repeat = len(timings)
+    result = {
+        'name': name,
+        'params': params,
+        'repeat': repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'max': max(timings),
+    }
+    if checks:
+        result['checks'] = checks
+    print(f"{name:<16} {json.dumps(params, ensure_ascii=False):<32} "
+          f"median {result['median'] * 1000:>10.1f} ms   min {result['min'] * 1000:>10.1f} ms"
+          f"{_failed_checks(result)}")
+    return result
+
+
+def _failed_checks(result):
+    """未通过的正确性检查，用于在输出中标出"""
+    failed = [name for name, ok in result.get('checks', {}).items() if not ok]
+    return f"   <-- 检查未通过: {', '.join(failed)}" if failed else ''
+
+
+# ---------------------------------------------------------------------------
+# 基准
+# ---------------------------------------------------------------------------
+
+def bench_screen(source, args):
+    """fetch_and_save_data 选股流程：本地行情CSV -> 筛选 -> 获取前5只历史数据"""
+    import data_fetcher
+    import kline_store
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        spot = make_spot(args.spot_size)
+        spot.to_csv(os.path.join(tmp_dir, 'realtime_quotes.csv'), index=False, encoding='utf-8-sig')
+
+        # 所有输出写到临时目录，不影响本地数据
+        original = data_fetcher.DATA_DIR, data_fetcher.get_historical_data, kline_store.KLINE_DIR
+        data_fetcher.DATA_DIR = tmp_dir
+        data_fetcher.get_historical_data = lambda symbol, **kwargs: source.kline(symbol).copy()
+        kline_store.KLINE_DIR = os.path.join(tmp_dir, 'kline')
+        try:
+            with symbol_master(spot['代码']):
+                results.append(measure(
+                    'screen', lambda: data_fetcher.screen_stocks(spot.copy()),
+                    repeat=args.repeat, stocks=args.spot_size))
+                results.append(measure(
+                    'fetch_and_save', lambda: data_fetcher.fetch_and_save_data(force_refresh=False),
+                    repeat=args.repeat, stocks=args.spot_size))
+        finally:
+            data_fetcher.DATA_DIR, data_fetcher.get_historical_data, kline_store.KLINE_DIR = original
+
+    return results
+
+
+def bench_feed(source, args):
+    """dataframe_to_backtrader 构建数据源"""
+    from backtest_strategy import dataframe_to_backtrader
+
+    count = min(args.sizes) if args.sizes else 10
+    symbols = source.symbols(max(count, 10))
+    frames = [(s, source.kline(s)) for s in symbols]
+
+    def build():
+        for symbol, df in frames:
+            dataframe_to_backtrader(df, symbol, date_col='日期')
+
+    return [measure('feed', build, repeat=args.repeat, symbols=len(frames), days=args.days)]
+
+
+def _run_cerebro(frames, initial_cash=100000, state_file=None):
+    import backtrader as bt
+    import checkpoint
+    from backtest_strategy import TrackedMAVolumeStrategy, dataframe_to_backtrader
+
+    cerebro = bt.Cerebro()
+    cerebro.broker.setcash(initial_cash)
+    cerebro.broker.setcommission(commission=0.001)
+    datas = [dataframe_to_backtrader(df, symbol, date_col='日期') for symbol, df in frames]
+    for data in datas:
+        cerebro.adddata(data)
+    if state_file:
+        checkpoint.trim_feeds(datas, state_file)
+    cerebro.addstrategy(TrackedMAVolumeStrategy, state_file=state_file)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
+    results = cerebro.run()
+    # 与 /api/backtest 相同：回测结束后由权益曲线和成交明细计算绩效指标
+    results[0].analyze()
+    return results
+
+
+def bench_cerebro(source, args):
+    """MAVolumeStrategy 完整回测（含数据源构建和绩效指标）"""
+    results = []
+    for size in args.sizes:
+        frames = [(s, source.kline(s)) for s in source.symbols(size)]
+        # 大规模回测只跑一次，避免基准本身耗时过长
+        repeat = args.repeat if size <= 100 else 1
+        results.append(measure('cerebro', lambda: _run_cerebro(frames), repeat=repeat,
+                               warmup=0 if size > 100 else 1,
+                               symbols=len(frames), days=args.days))
+    return results
+
+
+def _same_columns(a, b):
+    """两个 ColumnRecorder 记录的各列逐位相同"""
+    a, b = a.columns(), b.columns()
+    return a.keys() == b.keys() and all(
+        a[name].dtype == b[name].dtype and np.array_equal(a[name], b[name]) for name in a)
+
+
+def bench_incremental(source, args):
+    """在上一次回测的结束状态上延长一个交易日（与完整回测结果一致）"""
+    results = []
+    for size in args.sizes:
+        frames = [(s, source.kline(s)) for s in source.symbols(size)]
+        previous = [(s, df.iloc[:-1]) for s, df in frames]
+        tmp_dir = tempfile.mkdtemp()
+        base_state = os.path.join(tmp_dir, 'base.state')
+        state_file = os.path.join(tmp_dir, 'run.state')
+        with contextlib.redirect_stdout(io.StringIO()):
+            _run_cerebro(previous, state_file=base_state)
+            full = _run_cerebro(frames)[0]
+
+        def extend():
+            shutil.copyfile(base_state, state_file)
+            return _run_cerebro(frames, state_file=state_file)[0]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            extended = extend()
+        identical = (extended.broker.getvalue() == full.broker.getvalue() and
+                     extended.next_stats.bars == full.next_stats.bars and
+                     _same_columns(extended.equity, full.equity) and
+                     _same_columns(extended.fills, full.fills))
+        results.append(measure('incremental', extend, repeat=args.repeat,
+                               symbols=len(frames), days=args.days,
+                               checks={'identical': identical}))
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def bench_precompute_backtest(source, args):
+    """
+    收盘后预计算的固定股票池回测（precompute.default_backtest，与 /api/backtest 相同的代码）
+
+    前一天收盘后运行一次保存结束状态，本地K线存储同步一根新K线后，对比从结束状态延长和删除状态完整重放
+    （结果应完全一致）。K线存储和预计算目录都在临时目录中。
+    """
+    import glob
+    import kline_store
+    import precompute
+
+    results = []
+    for size in args.sizes:
+        symbols = source.symbols(size)
+        frames = {symbol: source.kline(symbol) for symbol in symbols}
+        params = {'symbols': symbols}
+        tmp_dir = tempfile.mkdtemp()
+        original = kline_store.KLINE_DIR, precompute.PRECOMPUTE_DIR, precompute.last_close
+        kline_store.KLINE_DIR = os.path.join(tmp_dir, 'kline')
+        precompute.PRECOMPUTE_DIR = os.path.join(tmp_dir, 'precomputed')
+        # 存储中的K线都视为收盘后同步的
+        precompute.last_close = lambda now=None: datetime(2000, 1, 1)
+        try:
+            with symbol_master(symbols), contextlib.redirect_stdout(io.StringIO()):
+                for symbol, df in frames.items():
+                    kline_store.save_kline(symbol, df.iloc[:-1], merge=False)
+                precompute.default_backtest(params)
+                state_file, = glob.glob(os.path.join(precompute.PRECOMPUTE_DIR, '*.state'))
+                base_state = os.path.join(tmp_dir, 'base.state')
+                shutil.copyfile(state_file, base_state)
+                for symbol, df in frames.items():
+                    kline_store.save_kline(symbol, df.iloc[-1:])
+
+            def resume():
+                shutil.copyfile(base_state, state_file)
+                return precompute.default_backtest(params)
+
+            def replay():
+                os.remove(state_file)
+                return precompute.default_backtest(params)
+
+            with symbol_master(symbols):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    identical = resume().model_dump() == replay().model_dump()
+                results.append(measure('precompute_resume', resume, repeat=args.repeat,
+                                       symbols=len(symbols), days=args.days,
+                                       checks={'identical': identical}))
+                results.append(measure('precompute_full', replay, repeat=args.repeat,
+                                       symbols=len(symbols), days=args.days))
+        finally:
+            kline_store.KLINE_DIR, precompute.PRECOMPUTE_DIR, precompute.last_close = original
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def _run_mean_reversion(frames, initial_cash=100000):
+    import backtrader as bt
+    from backtest_strategy import MeanReversionStrategy, dataframe_to_backtrader
+
+    cerebro = bt.Cerebro()
+    cerebro.broker.setcash(initial_cash)
+    cerebro.broker.setcommission(commission=0.001)
+    for symbol, df in frames:
+        cerebro.adddata(dataframe_to_backtrader(df, symbol, date_col='日期'))
+    cerebro.addstrategy(MeanReversionStrategy)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
+    cerebro.run()
+    return cerebro.broker.getvalue()
+
+
+def bench_kernels(source, args):
+    """
+    kernels 数组内核运行 MAVolumeStrategy（numba 或 NumPy 后端），与 cerebro 的最终资金对比
+
+    另外用上市日期错开的K线（第 i 只股票去掉前 i*7 根）对比 MeanReversionStrategy 的最终资金。
+    """
+    import kernels
+
+    results = []
+    for size in args.sizes:
+        frames = [(s, source.kline(s)) for s in source.symbols(size)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            full = _run_cerebro(frames)[0]
+        result = kernels.run_ma_volume(frames)
+        identical = result['final_value'] == full.broker.getvalue()
+
+        staggered = [(s, df.iloc[i * 7 % 120:].reset_index(drop=True))
+                     for i, (s, df) in enumerate(frames)]
+        mean_reversion = (kernels.run_mean_reversion(staggered)['final_value'] ==
+                          _run_mean_reversion(staggered))
+        results.append(measure('kernels', lambda: kernels.run_ma_volume(frames), repeat=args.repeat,
+                               symbols=len(frames), days=args.days, backend=kernels.BACKEND,
+                               checks={'identical': identical,
+                                       'mean_reversion_identical': mean_reversion}))
+    return results
+
+
+def bench_api_backtest(source, args):
+    """通过 FastAPI TestClient 调用 /api/backtest（跳过鉴权，数据来自合成K线）"""
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    sys.path.insert(0, os.path.join(PROJECT_DIR, 'backend'))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from fastapi.testclient import TestClient
+        import main
+
+    stock_limit = min(args.sizes) if args.sizes else 10
+    symbols = source.symbols(stock_limit)
+    filtered = pd.DataFrame({'code': symbols})
+
+    import data_fetcher
+
+    import kline_store
+
+    original = (data_fetcher.fetch_and_save_data, data_fetcher.get_historical_data,
+                main.precompute.PRECOMPUTE_DIR, kline_store.KLINE_DIR)
+    tmp_dir = tempfile.mkdtemp()
+    data_fetcher.fetch_and_save_data = lambda force_refresh=False: (filtered, filtered)
+    data_fetcher.get_historical_data = lambda symbol, **kwargs: source.kline(symbol).copy()
+    # 回测结果缓存写到临时目录，不影响 data/precomputed；K线不读本地存储
+    main.precompute.PRECOMPUTE_DIR = tmp_dir
+    kline_store.KLINE_DIR = os.path.join(tmp_dir, 'kline')
+    main.app.dependency_overrides[main.get_current_user] = lambda: main.User(username='bench')
+    try:
+        with symbol_master(symbols):
+            client = TestClient(main.app)
+
+            def call(force_refresh=True):
+                response = client.post('/api/backtest', json={
+                    'stock_limit': stock_limit, 'force_refresh': force_refresh})
+                response.raise_for_status()
+
+            return [
+                measure('api_backtest', call, repeat=args.repeat,
+                        symbols=stock_limit, days=args.days),
+                # 命中收盘后预计算（或当天已计算）的缓存
+                measure('api_backtest_cached', lambda: call(force_refresh=False), repeat=args.repeat,
+                        symbols=stock_limit, days=args.days),
+            ]
+    finally:
+        (data_fetcher.fetch_and_save_data, data_fetcher.get_historical_data,
+         main.precompute.PRECOMPUTE_DIR, kline_store.KLINE_DIR) = original
+        main.app.dependency_overrides.clear()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# 在新进程中导入后端并请求一次 /api/health，输出各阶段耗时
+STARTUP_SCRIPT = """
+import sys, time, json, io, contextlib
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client_ready = time.perf_counter()
+with TestClient(main.app) as client:
+    client.get('/api/health').raise_for_status()
+healthy = time.perf_counter()
+heavy = [m for m in ('pandas', 'backtrader', 'akshare', 'claude_agent_sdk') if m in sys.modules]
+print(json.dumps({'import': imported - start,
+                  'health': (healthy - client_ready) + (imported - start),
+                  'heavy': heavy}))
+"""
+
+
+def bench_startup(source, args):
+    """后端冷启动：新进程导入 main 的耗时，以及到第一次 /api/health 响应的耗时"""
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    runs = []
+    for _ in range(args.repeat + 1):
+        output = subprocess.check_output(
+            [sys.executable, '-c', STARTUP_SCRIPT],
+            cwd=os.path.join(PROJECT_DIR, 'backend'), env=env, stderr=subprocess.DEVNULL)
+        runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+    # 第一次运行用于预热磁盘缓存和 .pyc
+    runs = runs[1:]
+    print(f"启动后已导入的重依赖: {', '.join(runs[-1]['heavy']) or '无'}")
+    return [
+        summarize('startup_import', [run['import'] for run in runs]),
+        summarize('startup_health', [run['health'] for run in runs]),
+    ]
+
+
+# ---------------------------------------------------------------------------
+# 结果输出
+# ---------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+# 旧版本把检查结果写在 params 中，读取之前的结果时忽略这些字段
+_LEGACY_CHECKS = ('identical', 'mean_reversion_identical')
+
+
+def _result_key(result):
+    params = {k: v for k, v in result['params'].items() if k not in _LEGACY_CHECKS}
+    return result['name'], json.dumps(params, sort_keys=True)
+
+
+def compare(results, baseline_file):
+    """打印与之前结果的耗时对比（按 median）"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {_result_key(r): r for r in baseline.get('results', [])}
+
+    print("\n" + "=" * 60)
+    print(f"与 {baseline_file} (commit {baseline.get('commit')}) 对比")
+    print("=" * 60)
+    for result in results:
+        prev = old.get(_result_key(result))
+        if prev is None:
+            continue
+        ratio = result['median'] / prev['median'] if prev['median'] else float('nan')
+        flag = ('  <-- 变慢' if ratio > 1.1 else '') + _failed_checks(result)
+        print(f"{result['name']:<16} {json.dumps(result['params'], ensure_ascii=False):<32} "
+              f"{prev['median'] * 1000:>10.1f} -> {result['median'] * 1000:>10.1f} ms "
+              f"(x{ratio:.2f}){flag}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='尾盘选股项目性能基准测试')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help=f"要运行的基准（{'/'.join(BENCHMARKS)}），默认全部")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help='cerebro 基准的股票数量')
+    parser.add_argument('--days', type=int, default=500, help='每只股票的K线条数')
+    parser.add_argument('--spot-size', type=int, default=5000, help='实时行情快照股票数')
+    parser.add_argument('--repeat', type=int, default=3, help='每个基准重复次数')
+    parser.add_argument('--store', action='store_true', help='使用 kline_store 中的真实K线')
+    parser.add_argument('--replay', metavar='DIR', help='回放 data_provider 录制的数据')
+    parser.add_argument('--latency-ms', type=float, default=0, help='回放时每次调用的模拟延迟')
+    parser.add_argument('--output', default='bench_results.json', help='结果JSON文件')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    args = parser.parse_args(argv)
+
+    selected = args.benchmarks or BENCHMARKS
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(sorted(unknown))}")
+    source = DataSource(days=args.days, use_store=args.store,
+                        replay_dir=args.replay, latency_ms=args.latency_ms)
+
+    print("=" * 60)
+    print("性能基准测试")
+    print("=" * 60)
+
+    results = []
+    for name in BENCHMARKS:
+        if name in selected:
+            results.extend(globals()[f'bench_{name}'](source, args))
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'data': 'kline_store' if args.store else 'replay' if args.replay else 'synthetic',
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到: {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+断点续跑
+
+长时间运行的任务定期把进度写入检查点文件，进程中途退出（网络中断、OOM、重新部署）后
+用同样的参数再次运行时从最近的检查点继续:
+
+- 历史K线获取（data_fetcher.ingest_history）: 已完成的股票、CSV 行数和写入位置
+- 回测（MAVolumeStrategy 的 checkpoint 参数）: 在没有在途订单的 bar 上保存券商现金与持仓、
+  未平仓交易、分析器累计值和策略自身的记录（持仓簿、权益曲线、交易信号）。
+  续跑时检查点之前的 bar 只推进数据和指标，不执行策略逻辑，到检查点所在的 bar 恢复状态后继续，
+  结果与不中断运行一致
+
+回测检查点读写 backtrader 的内部属性（券商的 pending/submitted/_toactivate、strategy._trades、
+Position/Trade/分析器的实例属性），这些不属于公开接口，requirements.txt 因此固定了 backtrader 版本。
+升级 backtrader 前先运行 tests/test_checkpoint.py（中断后续跑与完整运行的结果逐项比较）。
+
+检查点用 pickle 保存，先写临时文件再替换，写到一半退出不会损坏上一个检查点。
+检查点带有任务签名（参数、股票列表、数据指纹），不一致时忽略检查点从头运行。
+任务正常完成后删除检查点。
+"""
+
+import collections
+import hashlib
+import json
+import os
+import pickle
+from datetime import date
+
+import numpy as np
+
+
+def signature(*parts):
+    """任务签名：参数序列化后的 sha1"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _write(path, payload):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def save(path, state, sig=None):
+    _write(path, pickle.dumps({'signature': sig, 'state': state},
+                              protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load(path, sig=None):
+    """读取检查点，文件不存在、损坏或签名不一致时返回 None"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"检查点 {path} 无法读取，从头运行: {e}")
+        return None
+    if sig is not None and payload.get('signature') != sig:
+        print(f"检查点 {path} 与当前任务的参数不一致，从头运行")
+        return None
+    return payload['state']
+
+
+def clear(path):
+    for p in (path, path + '.tmp'):
+        if p and os.path.exists(p):
+            os.remove(p)
+
+
+# ----------------------------------------------------------------------
+# backtrader 状态
+# ----------------------------------------------------------------------
+
+_SCALARS = (bool, int, float, str, bytes, type(None), date)
+
+# 对象之间的引用，恢复时保持新对象自己的值
+_SKIP_ATTRS = frozenset(('params', 'p', 'strategy', 'cerebro', '_parent', '_children',
+                         'data', 'datas'))
+
+
+def _is_plain(value):
+    """只由标量和容器组成（不引用数据源、订单等 backtrader 对象）"""
+    if isinstance(value, _SCALARS):
+        return True
+    if isinstance(value, dict):
+        return all(_is_plain(k) and _is_plain(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, collections.deque)):
+        return all(_is_plain(v) for v in value)
+    return False
+
+
+def plain_state(obj, exclude=()):
+    """对象属性中的纯数据部分（累计值、计数器等）"""
+    return {k: v for k, v in vars(obj).items()
+            if k not in _SKIP_ATTRS and k not in exclude and _is_plain(v)}
+
+
+def restore_plain(obj, state):
+    for name, value in state.items():
+        setattr(obj, name, value)
+
+
+def _walk_analyzers(analyzers):
+    for analyzer in analyzers:
+        yield analyzer
+        yield from _walk_analyzers(analyzer._children)
+
+
+class StaleCheckpoint(RuntimeError):
+    """数据源按检查点裁剪过，但检查点与本次回测不匹配，需要用完整数据重新运行"""
+
+
+def _feed_history(d):
+    """数据源本次回测的全部K线日期和收盘价（包括 resume_from 之前跳过的部分）"""
+    history = getattr(d, 'history', None)
+    if history is not None:
+        return history
+    return np.asarray(d.datetime.array, dtype='f8'), np.asarray(d.close.array, dtype='f8')
+
+
+def _fingerprint(dates, close):
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(dates, dtype='f8').tobytes())
+    digest.update(np.ascontiguousarray(close, dtype='f8').tobytes())
+    return digest.hexdigest()
+
+
+def trim_feeds(datas, *paths):
+    """
+    按检查点设置数据源的 resume_from，续跑时只载入检查点前的指标窗口和之后的K线
+
+    需要在 cerebro.run() 之前调用（数据源预加载时生效），只对 ArrayData 有效。
+    检查点与本次回测不匹配时策略启动时抛出 StaleCheckpoint，调用方应改用完整数据重新运行。
+
+    Returns:
+        裁剪的数据源个数
+    """
+    names = [d._name for d in datas]
+    points = {}
+    for path in paths:
+        state = load(path)
+        if state is None:
+            continue
+        if [feed[0] for feed in state['feeds']] != names:
+            # 股票池不同的检查点不会被使用，裁剪后只会触发 StaleCheckpoint 再完整运行一次
+            continue
+        for name, _, _, resume_from in state['feeds']:
+            points[name] = min(points.get(name, resume_from), resume_from)
+
+    trimmed = 0
+    for d in datas:
+        if d._name in points and hasattr(d.p, 'resume_from'):
+            d.p.resume_from = points[d._name]
+            trimmed += 1
+    return trimmed
+
+
+class BacktestCheckpoint:
+    """
+    策略运行中的检查点和回测结束时的状态
+
+    策略在 start() 中创建，每根bar开始时调用 step()：
+    - 续跑时检查点之前的bar返回 False（策略跳过这根bar），到检查点所在的bar恢复状态
+    - path 非空时每 every 根bar（没有在途订单时）保存一次，回测正常结束后删除
+    - state_file 非空时在最后几根没有在途订单的bar上记录状态，结束时写入 state_file。
+      第二天K线增加后再次运行，从该状态延长回测，结果与完整重放一致
+
+    保存和恢复都在策略 next 开始时进行：此时券商已处理完本bar的订单，
+    分析器已收到本bar的资金通知、还没有执行 next，两次运行在这一点上的状态完全相同。
+    策略自身的状态通过 strategy.get_state() / set_state() 保存和恢复。
+
+    bar 序号（持仓簿的买入bar、交易的开仓bar）按完整数据保存，恢复到裁剪过的数据源时
+    减去各自的 bar_offset。lookback 为检查点之前需要保留的K线数（指标窗口）。
+    """
+
+    # 回测结束前在最后多少根bar中寻找没有在途订单的bar
+    TAIL_BARS = 10
+
+    def __init__(self, strategy, path=None, every=50, state_file=None, lookback=0):
+        self.strategy = strategy
+        self.path = path
+        self.every = max(int(every), 1)
+        self.state_file = state_file
+        self.lookback = lookback
+        self.bars = 0
+        self.final = None
+        self.offsets = [getattr(d, 'bar_offset', 0) for d in strategy.datas]
+        self.signature = self._signature()
+
+        self.resume = None
+        for candidate in (path, state_file):
+            state = load(candidate, self.signature) if candidate else None
+            if state is not None and self._matches(state):
+                self.resume = state
+                print(f"从 {candidate} 继续回测: {state['date']}")
+                break
+            if state is not None:
+                print(f"检查点 {candidate} 之前的K线数据已变化")
+        if self.resume is None and any(self.offsets):
+            raise StaleCheckpoint("数据源已按检查点裁剪，但检查点与本次回测不匹配")
+
+        self.tail_start = float('inf')
+        if state_file and all(d.buflen() > 0 for d in strategy.datas):
+            dates = np.unique(np.concatenate([np.asarray(d.datetime.array, dtype='f8')
+                                              for d in strategy.datas]))
+            if len(dates):
+                self.tail_start = dates[max(len(dates) - self.TAIL_BARS, 0)]
+
+    def _signature(self):
+        strategy = self.strategy
+        skip = ('checkpoint', 'checkpoint_every', 'state_file', 'printlog', 'log_buffer',
+                'log_sample', 'instrument')
+        params = {k: v for k, v in strategy.params._getkwargs().items() if k not in skip}
+        return signature(
+            type(strategy).__name__, getattr(strategy, 'STATE_VERSION', 0), params,
+            [d._name for d in strategy.datas],
+            strategy.broker.startingcash,
+            [type(a).__name__ for a in _walk_analyzers(strategy.analyzers)],
+        )
+
+    def _matches(self, state):
+        """检查点之前的K线（日期、收盘价）与本次数据一致，且没有裁剪掉需要的K线"""
+        for d, offset, (_, bars, fingerprint, _) in zip(
+                self.strategy.datas, self.offsets, state['feeds']):
+            dates, close = _feed_history(d)
+            if len(dates) < bars or bars - offset < min(self.lookback + 1, bars):
+                return False
+            if _fingerprint(dates[:bars], close[:bars]) != fingerprint:
+                return False
+        return True
+
+    def step(self):
+        """每根bar开始时调用，返回 False 表示这根bar在检查点之前，策略应跳过"""
+        if self.resume is not None:
+            if self.strategy.datetime[0] < self.resume['datetime']:
+                return False
+            self.restore(self.resume)
+            self.resume = None
+        else:
+            self.bars += 1
+            if self.path and self.bars % self.every == 0 and self.idle():
+                save(self.path, self.capture(), self.signature)
+
+        if self.strategy.datetime[0] >= self.tail_start and self.idle():
+            # 捕获的对象之后还会变化，立即序列化
+            self.final = pickle.dumps({'signature': self.signature, 'state': self.capture()},
+                                      protocol=pickle.HIGHEST_PROTOCOL)
+        return True
+
+    def finish(self):
+        """回测正常结束：删除运行中的检查点，写入结束状态"""
+        if self.path:
+            clear(self.path)
+        if self.state_file and self.final is not None:
+            _write(self.state_file, self.final)
+
+    def idle(self):
+        """没有在途订单（检查点不保存订单对象）"""
+        broker = self.strategy.broker
+        return not (broker.pending or broker.submitted or broker._toactivate)
+
+    def capture(self):
+        strategy = self.strategy
+        broker = strategy.broker
+        names = {d: d._name for d in strategy.datas}
+        offsets = dict(zip(strategy.datas, self.offsets))
+
+        feeds = []
+        for d, offset in offsets.items():
+            bars = len(d) + offset
+            dates, close = _feed_history(d)
+            # 还没有K线的数据源（检查点之后才上市）全部载入
+            resume_from = dates[max(bars - 1 - self.lookback, 0)] if bars else float('-inf')
+            feeds.append((d._name, bars, _fingerprint(dates[:bars], close[:bars]),
+                          float(resume_from)))
+
+        trades = []
+        for d, by_id in strategy._trades.items():
+            for tradeid, items in by_id.items():
+                # 只有最后一笔未平仓的交易会被后续订单更新
+                if items and items[-1].isopen:
+                    if items[-1].historyon:
+                        # 交易历史由 TradeHistory 对象组成，不在检查点中保存
+                        raise RuntimeError("回测检查点不支持 tradehistory=True")
+                    trade_state = plain_state(items[-1])
+                    trade_state['baropen'] += offsets[d]
+                    trades.append((names[d], tradeid, trade_state))
+
+        return {
+            'datetime': strategy.datetime[0],
+            'date': strategy.datetime.date(0).isoformat(),
+            'feeds': feeds,
+            'broker': plain_state(broker, exclude=('positions', 'orders')),
+            # 顺序影响券商市值的累加顺序，按原顺序保存
+            'positions': [(names[d], plain_state(pos)) for d, pos in broker.positions.items()],
+            'trades': trades,
+            'analyzers': [plain_state(a) for a in _walk_analyzers(strategy.analyzers)],
+            'strategy': strategy.get_state(),
+        }
+
+    def restore(self, state):
+        from backtrader import Position, Trade
+
+        strategy = self.strategy
+        broker = strategy.broker
+        if strategy.datetime[0] != state['datetime']:
+            raise RuntimeError(f"检查点所在的K线 {state['date']} 不存在")
+        datas = {d._name: d for d in strategy.datas}
+        offsets = {d._name: offset for d, offset in zip(strategy.datas, self.offsets)}
+
+        restore_plain(broker, state['broker'])
+        broker.positions = collections.defaultdict(Position)
+        for name, pos_state in state['positions']:
+            restore_plain(broker.positions[datas[name]], pos_state)
+
+        strategy._trades.clear()
+        for name, tradeid, trade_state in state['trades']:
+            trade = Trade(data=datas[name], tradeid=tradeid)
+            restore_plain(trade, trade_state)
+            trade.baropen -= offsets[name]
+            strategy._trades[datas[name]][tradeid].append(trade)
+
+        for analyzer, analyzer_state in zip(_walk_analyzers(strategy.analyzers),
+                                            state['analyzers']):
+            restore_plain(analyzer, analyzer_state)
+
+        strategy.set_state(state['strategy'])
@@ -2,34 +2,46 @@
 """
 使用akshare获取A股实时股票数据并保存到CSV
 基于掘金文章中的尾盘选股策略
+
+akshare 调用经由 data_provider，设置 QUANT_DATA_PROVIDER=record/replay
+即可录制或离线回放全部数据。
 """
 
-import akshare as ak
+import numpy as np
 import pandas as pd
 import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
+import checkpoint
+import kline_store
+import minute_store
+import precompute
+import schema
+import symbols as symbol_master
+from data_provider import get_provider
+from profiling import span, timed, with_context
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
 
 
-def get_all_stocks():
-    """获取所有A股股票列表"""
+def get_all_stocks(refresh=False):
+    """获取所有A股股票列表（使用本地缓存的证券主表，过期后自动刷新）"""
     print("获取A股股票列表...")
-    df = ak.stock_info_a_code_name()
+    df = symbol_master.load(refresh=refresh).to_frame()
     print(f"共获取 {len(df)} 只股票")
     return df
 
 
 def get_realtime_quotes(symbols=None):
-    """获取实时行情数据"""
+    """获取实时行情数据（已规范化为 schema.QUOTE_FIELDS 的英文字段）"""
     print("获取实时行情数据...")
     
-    if symbols is None:
-        df = ak.stock_zh_a_spot_em()
-    else:
-        df = ak.stock_zh_a_spot_em()
-        df = df[df['代码'].isin(symbols)]
+    with span('fetch.spot'):
+        df = schema.normalize_quotes(get_provider().akshare('stock_zh_a_spot_em'))
+    if symbols is not None:
+        df = df[df['code'].isin(symbols)]
     
     print(f"获取到 {len(df)} 条行情数据")
     return df
@@ -52,17 +64,265 @@ def get_historical_data(symbol, period='daily', start_date=None, end_date=None):
         if end_date is not None:
             kwargs['end_date'] = end_date
 
-        df = ak.stock_zh_a_hist(**kwargs)
+        with span('fetch.history'):
+            df = get_provider().akshare('stock_zh_a_hist', **kwargs)
         return df
     except Exception as e:
         print(f"获取 {symbol} 历史数据失败: {e}")
         return None
 
 
+def load_history(symbol, start_date=None, end_date=None):
+    """
+    日K线：本地存储在最近一次收盘后同步过（收盘后预计算或 sync_kline）时直接读取，否则在线获取
+
+    本地存储返回 kline_store 的英文字段（含流通股本、流通市值），在线获取返回 akshare 的中文列名，
+    下游的 frame_columns / compact_history 两种格式都接受。
+
+    Returns:
+        (DataFrame, 是否来自本地存储)，获取失败时 DataFrame 为 None
+    """
+    symbol = str(symbol).zfill(6)
+    if kline_store.synced_since(symbol, precompute.last_close()):
+        with span('load.kline_store'):
+            return kline_store.load_kline_frame(symbol, start_date, end_date), True
+    return get_historical_data(symbol, period='daily', start_date=start_date, end_date=end_date), False
+
+
+def sync_kline(symbol, start_date=None):
+    """
+    同步一只股票的日K线到本地存储（含换手率、流通股本、流通市值）
+
+    本地已有数据时从最后一个交易日开始增量获取。K线是前复权的，如果重叠那天的
+    收盘价和本地不一致（期间发生了除权除息），则重新获取全部历史。
+
+    Returns:
+        本地存储的记录条数，获取失败返回 None
+    """
+    symbol = str(symbol).zfill(6)
+    existing = None
+    if start_date is None:
+        existing = kline_store.load_kline(symbol)
+        if existing is not None and len(existing) > 0:
+            start_date = existing['date'][-1].astype(datetime).strftime('%Y%m%d')
+
+    hist_df = get_historical_data(symbol, period='daily', start_date=start_date)
+    if hist_df is None:
+        return None
+
+    if existing is not None and len(existing) > 0:
+        if len(hist_df) == 0:
+            return len(existing)
+        overlap = hist_df[pd.to_datetime(hist_df['日期']) == pd.Timestamp(existing['date'][-1])]
+        if len(overlap) == 0 or abs(float(overlap['收盘'].iloc[0]) - existing['close'][-1]) > 1e-6:
+            print(f"{symbol} 复权价格发生变化，重新获取全部历史数据")
+            hist_df = get_historical_data(symbol, period='daily')
+            if hist_df is None:
+                return None
+            return kline_store.save_kline(symbol, hist_df, merge=False)
+
+    if len(hist_df) == 0:
+        return 0
+    return kline_store.save_kline(symbol, hist_df)
+
+
+def compact_history(df, symbol=None):
+    """
+    把历史K线转成规范字段和紧凑类型（schema.KLINE_FIELDS），内存约为默认类型的 1/4
+
+    Args:
+        symbol: 非空时添加 symbol 列（category 类型，多只股票拼接后只保存一份代码）
+    """
+    return schema.normalize_kline(df, symbol)
+
+
+def iter_history(symbols, start_date=None, end_date=None, workers=4, max_inflight=None,
+                 store=True):
+    """
+    并发获取多只股票的日K线，按完成顺序逐只产出 (代码, 紧凑 DataFrame)
+
+    同时在途（请求中或已完成但未被消费）的股票不超过 max_inflight 只，
+    内存占用与股票总数无关。本地存储在最近一次收盘后同步过的股票直接读取（load_history），
+    其余在线获取，store=True 时在工作线程中写入 kline_store
+    （写入的是原始精度的数据，之后才转为紧凑类型）。
+    获取失败的股票产出 (代码, None)。
+    """
+    max_inflight = max_inflight or workers * 2
+
+    def fetch(symbol):
+        df, stored = load_history(symbol, start_date, end_date)
+        if df is None or len(df) == 0:
+            return symbol, None
+        if store and not stored:
+            kline_store.save_kline(symbol, df)
+        return symbol, compact_history(df, symbol)
+
+    symbols = iter(str(symbol).zfill(6) for symbol in symbols)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for symbol in symbols:
+            pending.add(pool.submit(with_context(fetch), symbol))
+            if len(pending) >= max_inflight:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                # 每消费一只才提交下一只
+                for symbol in symbols:
+                    pending.add(pool.submit(with_context(fetch), symbol))
+                    break
+
+
+def ingest_history(symbols, csv_file=None, start_date=None, end_date=None, workers=4,
+                   max_inflight=None, store=True, log_every=100, checkpoint_file=None,
+                   checkpoint_every=50):
+    """
+    流式获取并保存历史K线
+
+    每只股票到达后立即写入 kline_store 并追加到长表 CSV（带 symbol 列），
+    不在内存中累积全部股票，适合在内存较小的机器上获取全市场历史。
+    CSV 先写到临时文件，全部完成后再替换，中途失败不会留下半个文件。
+
+    checkpoint_file 非空时每完成 checkpoint_every 只股票保存一次进度（已完成的股票、
+    CSV 行数和临时文件的写入位置）。中途退出后用同样的参数再次调用，跳过已完成的股票，
+    临时文件截断到检查点位置后继续追加；上次失败的股票会重新获取。
+
+    Returns:
+        {'saved': 成功的股票数, 'failed': 失败的股票代码列表, 'rows': CSV 总行数}
+    """
+    symbols = [str(symbol).zfill(6) for symbol in symbols]
+    saved, rows, failed, done = 0, 0, [], set()
+    tmp_file = csv_file + '.tmp' if csv_file else None
+
+    sig = checkpoint.signature('ingest_history', symbols, csv_file, start_date, end_date, store)
+    state = checkpoint.load(checkpoint_file, sig) if checkpoint_file else None
+    if state is not None and tmp_file and state['offset'] and (
+            not os.path.exists(tmp_file) or os.path.getsize(tmp_file) < state['offset']):
+        print(f"临时文件 {tmp_file} 与检查点不一致，从头获取")
+        state = None
+    if state is not None:
+        done, saved, rows = set(state['done']), state['saved'], state['rows']
+        if tmp_file and state['offset']:
+            # 丢弃检查点之后写入的行，这些股票会重新获取
+            with open(tmp_file, 'r+b') as f:
+                f.truncate(state['offset'])
+        print(f"从检查点继续: 已完成 {len(done)}/{len(symbols)} 只股票")
+
+    def save_checkpoint():
+        checkpoint.save(checkpoint_file, {
+            'done': sorted(done), 'saved': saved, 'rows': rows,
+            'offset': os.path.getsize(tmp_file) if tmp_file and rows else 0,
+        }, sig)
+
+    remaining = [symbol for symbol in symbols if symbol not in done]
+    for i, (symbol, df) in enumerate(iter_history(
+            remaining, start_date, end_date, workers, max_inflight, store), len(done) + 1):
+        if df is None:
+            failed.append(symbol)
+        else:
+            if tmp_file:
+                # 只在文件开头写一次 BOM 和表头
+                first = rows == 0
+                df.to_csv(tmp_file, mode='w' if first else 'a', header=first, index=False,
+                          encoding='utf-8-sig' if first else 'utf-8')
+            saved += 1
+            rows += len(df)
+            done.add(symbol)
+            if checkpoint_file and saved % checkpoint_every == 0:
+                save_checkpoint()
+        if log_every and i % log_every == 0:
+            print(f"已获取 {i}/{len(symbols)} 只股票历史数据")
+
+    if tmp_file and rows:
+        os.replace(tmp_file, csv_file)
+    if checkpoint_file:
+        checkpoint.clear(checkpoint_file)
+    return {'saved': saved, 'failed': failed, 'rows': rows}
+
+
+def get_index_history(code, start_date=None, end_date=None):
+    """获取指数日K线（如 000300 沪深300、000905 中证500）"""
+    try:
+        with span('fetch.index'):
+            return get_provider().akshare(
+                'index_zh_a_hist', symbol=code, period='daily',
+                start_date=start_date or '19700101', end_date=end_date or '22220101')
+    except Exception as e:
+        print(f"获取指数 {code} 历史数据失败: {e}")
+        return None
+
+
+def sync_index(code):
+    """
+    增量同步一个指数的日K线到本地存储（回测基准使用）
+
+    由收盘后预计算和 python data_fetcher.py 调用；/api/backtest 只读取本地存储，不在请求中同步。
+
+    Returns:
+        本地存储的记录条数，获取失败返回 None
+    """
+    code = kline_store.BENCHMARK_INDEXES.get(code, code)
+    existing = kline_store.load_kline(code, directory=kline_store.INDEX_DIR)
+    start_date = None
+    if existing is not None and len(existing) > 0:
+        start_date = existing['date'][-1].astype(datetime).strftime('%Y%m%d')
+
+    hist_df = get_index_history(code, start_date=start_date)
+    if hist_df is None:
+        return None
+    if len(hist_df) == 0:
+        return 0 if existing is None else len(existing)
+    return kline_store.save_index_kline(code, hist_df)
+
+
+def get_minute_history(symbol, period='1', start_date=None, end_date=None, adjust=''):
+    """
+    获取分钟K线（东方财富）
+
+    注意东方财富的1分钟线只提供最近5个交易日，需要每天收盘后同步才能积累历史；
+    5/15/30/60分钟线可以取到更长的历史。
+
+    Args:
+        period: '1'/'5'/'15'/'30'/'60'
+        start_date/end_date: 'YYYY-MM-DD HH:MM:SS'
+    """
+    try:
+        with span('fetch.minute'):
+            return get_provider().akshare(
+                'stock_zh_a_hist_min_em', symbol=str(symbol).zfill(6), period=period,
+                start_date=start_date or '1979-09-01 09:32:00',
+                end_date=end_date or '2222-01-01 09:32:00', adjust=adjust)
+    except Exception as e:
+        print(f"获取 {symbol} 分钟数据失败: {e}")
+        return None
+
+
+def sync_minutes(symbol, period='1'):
+    """
+    增量同步一只股票的分钟K线到本地存储（从本地最后一个交易日开始）
+
+    Returns:
+        写入的月份列表，获取失败返回 None
+    """
+    symbol = str(symbol).zfill(6)
+    start_date = None
+    months = minute_store.list_months(symbol, period)
+    if months:
+        last = minute_store.load_month(symbol, months[-1], period)['datetime'][-1]
+        last_day = np.datetime64(int(last), 'm').astype('datetime64[D]')
+        start_date = f"{last_day} 09:00:00"
+
+    df = get_minute_history(symbol, period=period, start_date=start_date)
+    if df is None:
+        return None
+    return minute_store.save_minutes(symbol, df, period)
+
+
 def get_stock_daily_basic(symbol):
     """获取股票每日基本指标（换手率、市值等）"""
     try:
-        df = ak.stock_individual_info_em(symbol=symbol)
+        df = get_provider().akshare('stock_individual_info_em', symbol=symbol)
         return df
     except Exception as e:
         print(f"获取 {symbol} 基本信息失败: {e}")
@@ -72,13 +332,69 @@ def get_stock_daily_basic(symbol):
 def get_market_value(symbol):
     """获取股票市值数据"""
     try:
-        df = ak.stock_financial_abstract_ths(symbol=symbol)
+        df = get_provider().akshare('stock_financial_abstract_ths', symbol=symbol)
         return df
     except Exception as e:
         print(f"获取 {symbol} 市值数据失败: {e}")
         return None
 
 
+@timed('screen')
+def screen_stocks(realtime_df):
+    """
+    按尾盘选股条件筛选实时行情
+
+    Args:
+        realtime_df: 规范化的实时行情（schema.normalize_quotes），
+                     也接受 ak.stock_zh_a_spot_em 原始格式（先规范化）
+
+    Returns:
+        符合条件的股票 DataFrame（规范字段）
+    """
+    # 条件1: 涨幅在2%-5%之间
+    # 条件2: 换手率4-10%
+    # 条件3: 量比>1
+    # 条件4: 流通市值50-200亿
+    
+    print("\n筛选符合尾盘选股条件的股票...")
+
+    df = schema.normalize_quotes(realtime_df)
+
+    def column(name):
+        # 缺少的字段按 NaN 处理，比较结果为 False
+        if name in df.columns:
+            return df[name].to_numpy(dtype='float64')
+        return np.full(len(df), np.nan)
+
+    pct = column('pct')
+    turnover = column('turnover')
+    vol_ratio = column('vol_ratio')
+    market_cap = column('total_mktcap')  # 亿
+
+    condition_pct = (pct >= 2) & (pct <= 5)
+    condition_turnover = (turnover >= 4) & (turnover <= 10)
+    condition_volume = vol_ratio > 1
+    condition_market_cap = (market_cap >= 50) & (market_cap <= 200)
+
+    # 综合筛选
+    filtered_df = df[condition_pct & condition_turnover & condition_volume]
+
+    # 经证券主表过滤（非A股号段、主表中没有的代码不参与回测），并标注交易所和板块
+    codes = set(symbol_master.universe(filtered_df['code'].astype(str)))
+    filtered_df = filtered_df[filtered_df['code'].astype(str).isin(codes)]
+    boards = [symbol_master.classify(code) for code in filtered_df['code'].astype(str)]
+    filtered_df = filtered_df.assign(exchange=[exchange for exchange, _ in boards],
+                                     board=[board for _, board in boards])
+
+    print(f"涨幅2-5%: {condition_pct.sum()}")
+    print(f"换手率4-10%: {condition_turnover.sum()}")
+    print(f"量比>1: {condition_volume.sum()}")
+    print(f"市值50-200亿: {condition_market_cap.sum()}")
+    print(f"\n初步筛选出 {len(filtered_df)} 只股票")
+
+    return filtered_df
+
+
 def fetch_and_save_data(force_refresh=False):
     """获取所有数据并保存到CSV
 
@@ -90,94 +406,58 @@ def fetch_and_save_data(force_refresh=False):
     print("开始获取A股数据...")
     print("=" * 50)
 
-    # 1. 获取实时行情（如果本地有CSV且不强制刷新，则从本地加载）
+    # 1. 获取实时行情（如果本地有缓存且不强制刷新，则从本地加载）
+    # CSV 保持中文列名供查看和旧接口使用，pkl 缓存保存规范化后的类型，加载时无需再解析
     realtime_file = os.path.join(DATA_DIR, 'realtime_quotes.csv')
+    realtime_cache = os.path.join(DATA_DIR, 'realtime_quotes.pkl')
 
-    if not force_refresh and os.path.exists(realtime_file):
+    if not force_refresh and os.path.exists(realtime_cache):
+        print(f"从本地缓存加载实时行情: {realtime_cache}")
+        with span('load.spot_cache'):
+            realtime_df = pd.read_pickle(realtime_cache)
+        print(f"加载到 {len(realtime_df)} 条行情数据")
+    elif not force_refresh and os.path.exists(realtime_file):
         print(f"从本地文件加载实时行情: {realtime_file}")
         # 读取时保持股票代码为字符串类型
-        realtime_df = pd.read_csv(realtime_file, dtype={'代码': str})
+        with span('load.spot_csv'):
+            realtime_df = schema.normalize_quotes(pd.read_csv(realtime_file, dtype={'代码': str}))
+        realtime_df.to_pickle(realtime_cache)
         print(f"加载到 {len(realtime_df)} 条行情数据")
     else:
         realtime_df = get_realtime_quotes()
         # 保存实时行情
-        realtime_df.to_csv(realtime_file, index=False, encoding='utf-8-sig')
+        schema.to_source(realtime_df, schema.QUOTE_FIELDS).to_csv(
+            realtime_file, index=False, encoding='utf-8-sig')
+        realtime_df.to_pickle(realtime_cache)
         print(f"实时行情已保存到: {realtime_file}")
+
+    invalid = realtime_df.attrs.get('invalid')
+    if invalid:
+        print(f"超出合理范围已置空的字段: {invalid}")
     
     # 2. 筛选符合尾盘选股条件的股票
-    # 条件1: 涨幅在2%-5%之间
-    # 条件2: 换手率4-10%
-    # 条件3: 量比>1
-    # 条件4: 流通市值50-200亿
-    
-    print("\n筛选符合尾盘选股条件的股票...")
-    
-    # 解析涨跌幅
-    if '涨跌幅' in realtime_df.columns:
-        realtime_df['涨跌幅'] = pd.to_numeric(realtime_df['涨跌幅'], errors='coerce')
-        condition_pct = (realtime_df['涨跌幅'] >= 2) & (realtime_df['涨跌幅'] <= 5)
-    else:
-        condition_pct = pd.Series([False] * len(realtime_df), index=realtime_df.index)
-    
-    # 解析换手率
-    if '换手率' in realtime_df.columns:
-        # 先检查列类型，如果是字符串则去除%，否则直接转换
-        if pd.api.types.is_string_dtype(realtime_df['换手率']):
-            realtime_df['换手率'] = pd.to_numeric(realtime_df['换手率'].str.replace('%', ''), errors='coerce')
-        else:
-            realtime_df['换手率'] = pd.to_numeric(realtime_df['换手率'], errors='coerce')
-        condition_turnover = (realtime_df['换手率'] >= 4) & (realtime_df['换手率'] <= 10)
-    else:
-        condition_turnover = pd.Series([False] * len(realtime_df), index=realtime_df.index)
-    
-    # 解析量比
-    if '量比' in realtime_df.columns:
-        realtime_df['量比'] = pd.to_numeric(realtime_df['量比'], errors='coerce')
-        condition_volume = realtime_df['量比'] > 1
-    else:
-        condition_volume = pd.Series([False] * len(realtime_df), index=realtime_df.index)
-    
-    # 解析市值（单位：亿）
-    if '总市值' in realtime_df.columns:
-        realtime_df['总市值_亿'] = pd.to_numeric(realtime_df['总市值'], errors='coerce')
-        condition_market_cap = (realtime_df['总市值_亿'] >= 50) & (realtime_df['总市值_亿'] <= 200)
-    else:
-        condition_market_cap = pd.Series([False] * len(realtime_df), index=realtime_df.index)
-    
-    # 综合筛选
-    filtered_df = realtime_df[condition_pct & condition_turnover & condition_volume]
-    
-    print(f"涨幅2-5%: {condition_pct.sum()}")
-    print(f"换手率4-10%: {condition_turnover.sum()}")
-    print(f"量比>1: {condition_volume.sum()}")
-    print(f"市值50-200亿: {condition_market_cap.sum()}")
-    print(f"\n初步筛选出 {len(filtered_df)} 只股票")
+    filtered_df = screen_stocks(realtime_df)
     
     # 保存筛选结果
     if len(filtered_df) > 0:
         filtered_file = os.path.join(DATA_DIR, 'filtered_stocks.csv')
-        filtered_df.to_csv(filtered_file, index=False, encoding='utf-8-sig')
+        schema.to_source(filtered_df, schema.QUOTE_FIELDS).to_csv(
+            filtered_file, index=False, encoding='utf-8-sig')
         print(f"筛选结果已保存到: {filtered_file}")
     
     # 3. 获取符合条件股票的历史数据（用于均线判断）
     print("\n获取符合条件股票的历史数据...")
     
-    sample_symbols = filtered_df['代码'].head(10).tolist() if len(filtered_df) > 0 else []
-    
-    history_data = []
-    for symbol in sample_symbols[:5]:  # 限制数量避免请求过多
-        print(f"获取 {symbol} 历史数据...")
-        hist_df = get_historical_data(symbol, period='daily')
-        if hist_df is not None and len(hist_df) > 0:
-            hist_df['symbol'] = symbol
-            history_data.append(hist_df)
-    
-    if history_data:
-        all_history = pd.concat(history_data, ignore_index=True)
-        history_file = os.path.join(DATA_DIR, 'historical_data.csv')
-        all_history.to_csv(history_file, index=False, encoding='utf-8-sig')
-        print(f"历史数据已保存到: {history_file}")
+    sample_symbols = filtered_df['code'].head(10).astype(str).tolist() if len(filtered_df) > 0 else []
     
+    # 逐只写入本地存储和长表 CSV，不在内存中拼接
+    history_file = os.path.join(DATA_DIR, 'historical_data.csv')
+    with span('ingest.history'):
+        result = ingest_history(sample_symbols[:5], csv_file=history_file,  # 限制数量避免请求过多
+                                checkpoint_file=history_file + '.checkpoint')
+    if result['saved']:
+        print(f"历史数据已保存到: {history_file}（{result['saved']} 只股票，{result['rows']} 条）")
+
     print("\n" + "=" * 50)
     print("数据获取完成!")
     print("=" * 50)
@@ -206,7 +486,23 @@ def load_data_from_csv():
 
 
 if __name__ == "__main__":
+    import sys
+
+    # python data_fetcher.py           - 获取实时行情、筛选并获取前几只股票的历史数据
+    # python data_fetcher.py --market  - 流式获取全市场历史K线到本地存储
+    if len(sys.argv) > 1 and sys.argv[1] == '--market':
+        symbols = get_all_stocks()['code'].tolist()
+        market_file = os.path.join(DATA_DIR, 'market_history.csv')
+        # 中途退出后再次运行，从检查点继续
+        result = ingest_history(symbols, csv_file=market_file,
+                                checkpoint_file=market_file + '.checkpoint')
+        print(f"完成: {result['saved']} 只股票，{result['rows']} 条，失败 {len(result['failed'])} 只")
+        sys.exit(0)
+
     realtime_df, filtered_df = fetch_and_save_data()
+    # 同步基准指数（沪深300、中证500）
+    for code in kline_store.BENCHMARK_INDEXES.values():
+        sync_index(code)
     
     print("\n实时行情数据预览:")
     print(realtime_df.head())
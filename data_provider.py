@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+数据源接口 - 在线获取 / 录制 / 离线回放
+
+所有对 akshare 和东方财富接口的访问都经过 DataProvider:
+- LiveProvider:      直接访问 akshare / HTTP 接口（默认）
+- RecordingProvider: 在线获取的同时把响应保存到磁盘
+- ReplayProvider:    只从磁盘读取录制的响应，可模拟固定的网络延迟
+
+通过环境变量选择:
+    QUANT_DATA_PROVIDER=live|record|replay   （默认 live）
+    QUANT_REPLAY_DIR=data/replay             录制文件目录
+    QUANT_REPLAY_LATENCY_MS=0                回放时每次调用的延迟（毫秒）
+    QUANT_REPLAY_JITTER_MS=0                 回放延迟的随机抖动（毫秒，固定随机种子）
+
+录制格式: DataFrame 保存为 gzip 压缩的 pickle，JSON 响应保存为 gzip 压缩的 JSON，
+文件名由调用名和参数的哈希决定，index.jsonl 记录每个文件对应的调用参数。
+"""
+
+import os
+import json
+import gzip
+import time
+import random
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+DEFAULT_REPLAY_DIR = os.path.join(os.path.dirname(__file__), 'data', 'replay')
+
+
+class ReplayMissError(KeyError):
+    """回放模式下找不到对应的录制数据"""
+
+
+class DataProvider(ABC):
+    """数据源基类，子类缺少任一方法时在实例化时就会报错"""
+
+    mode = None
+
+    @abstractmethod
+    def akshare(self, func_name, **kwargs):
+        """调用 akshare 函数，返回 DataFrame"""
+
+    @abstractmethod
+    def get_json(self, url, headers=None, timeout=30):
+        """HTTP GET 请求，返回解析后的 JSON"""
+
+
+class LiveProvider(DataProvider):
+    """在线访问 akshare 和 HTTP 接口"""
+
+    mode = 'live'
+
+    def akshare(self, func_name, **kwargs):
+        import akshare as ak
+        return getattr(ak, func_name)(**kwargs)
+
+    def get_json(self, url, headers=None, timeout=30):
+        import requests
+        r = requests.get(url, headers=headers, timeout=timeout)
+        return r.json()
+
+
+def _call_key(kind, name, params):
+    """由调用类型、名称和参数生成稳定的文件名"""
+    payload = json.dumps([kind, name, params], sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+    safe_name = ''.join(c if c.isalnum() or c in '_-' else '_' for c in name)[:40]
+    return f"{kind}-{safe_name}-{digest}"
+
+
+class RecordingProvider(DataProvider):
+    """在线获取并把每次响应保存到磁盘"""
+
+    mode = 'record'
+
+    def __init__(self, replay_dir=DEFAULT_REPLAY_DIR, live=None):
+        self.replay_dir = replay_dir
+        self.live = live or LiveProvider()
+        self._lock = threading.Lock()
+        os.makedirs(replay_dir, exist_ok=True)
+
+    def _record(self, kind, name, params, path, writer):
+        tmp_path = path + '.tmp'
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock, open(os.path.join(self.replay_dir, 'index.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'file': os.path.basename(path),
+                'kind': kind,
+                'name': name,
+                'params': params,
+                'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }, ensure_ascii=False, default=str) + '\n')
+
+    def akshare(self, func_name, **kwargs):
+        df = self.live.akshare(func_name, **kwargs)
+        if isinstance(df, pd.DataFrame):
+            key = _call_key('ak', func_name, kwargs)
+            path = os.path.join(self.replay_dir, key + '.pkl.gz')
+            self._record('ak', func_name, kwargs, path,
+                         lambda p: df.to_pickle(p, compression='gzip'))
+        return df
+
+    def get_json(self, url, headers=None, timeout=30):
+        data = self.live.get_json(url, headers=headers, timeout=timeout)
+        key = _call_key('http', url.split('?')[0].rsplit('/', 1)[-1], {'url': url})
+        path = os.path.join(self.replay_dir, key + '.json.gz')
+
+        def write(p):
+            with gzip.open(p, 'wt', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+
+        self._record('http', url, {'url': url}, path, write)
+        return data
+
+
+class ReplayProvider(DataProvider):
+    """
+    从磁盘回放录制的响应
+
+    Args:
+        replay_dir: 录制文件目录
+        latency_ms: 每次调用的固定延迟，用于模拟网络耗时
+        jitter_ms: 延迟的随机抖动范围（使用固定随机种子，结果可复现）
+        seed: 抖动的随机种子
+    """
+
+    mode = 'replay'
+
+    def __init__(self, replay_dir=DEFAULT_REPLAY_DIR, latency_ms=0, jitter_ms=0, seed=0):
+        self.replay_dir = replay_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        delay = self.latency_ms
+        if self.jitter_ms:
+            with self._lock:
+                delay += self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _path(self, key, suffix, description):
+        path = os.path.join(self.replay_dir, key + suffix)
+        if not os.path.exists(path):
+            raise ReplayMissError(f"没有录制数据: {description}")
+        return path
+
+    def akshare(self, func_name, **kwargs):
+        path = self._path(_call_key('ak', func_name, kwargs), '.pkl.gz',
+                          f"{func_name}({kwargs})")
+        self._wait()
+        return pd.read_pickle(path, compression='gzip')
+
+    def get_json(self, url, headers=None, timeout=30):
+        key = _call_key('http', url.split('?')[0].rsplit('/', 1)[-1], {'url': url})
+        path = self._path(key, '.json.gz', url)
+        self._wait()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+
+_provider = None
+
+
+def create_provider(mode=None):
+    """按环境变量（或指定的 mode）创建数据源"""
+    mode = mode or os.getenv('QUANT_DATA_PROVIDER', 'live')
+    replay_dir = os.getenv('QUANT_REPLAY_DIR', DEFAULT_REPLAY_DIR)
+
+    if mode == 'live':
+        return LiveProvider()
+    if mode == 'record':
+        return RecordingProvider(replay_dir)
+    if mode == 'replay':
+        return ReplayProvider(
+            replay_dir,
+            latency_ms=float(os.getenv('QUANT_REPLAY_LATENCY_MS', '0')),
+            jitter_ms=float(os.getenv('QUANT_REPLAY_JITTER_MS', '0')),
+        )
+    raise ValueError(f"未知的数据源模式: {mode}")
+
+
+def get_provider():
+    """当前使用的数据源（首次调用时按环境变量创建）"""
+    global _provider
+    if _provider is None:
+        _provider = create_provider()
+    return _provider
+
+
+def set_provider(provider):
+    """替换当前数据源，返回之前的数据源"""
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
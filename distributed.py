@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+分布式回测
+
+协调者把工作拆成独立的任务写入任务队列（task_queue.TaskQueue），各节点上的 worker
+领取任务、运行 Cerebro 回测并写回结果，协调者汇总:
+
+- walk-forward: 每个滚动窗口一个任务（训练窗口寻优 + 测试窗口样本外回测）
+- sweep:        参数网格中每组参数一个任务（全区间回测）
+- shard:        股票按分片拆开，每个分片独立运行默认参数的组合回测；
+                汇总为各分片日收益率的等权平均，是近似值（见 merge_shards）
+
+K线数据作为作业的共享数据只写入队列一次，worker 按作业缓存，不随每个任务重复传输。
+worker 失联时任务在租约过期后被重新领取，同一任务的结果只接受第一次提交。
+
+运行方式:
+    # 协调者：提交作业，并在本机启动 4 个 worker（其他节点可以同时运行 worker 加入）
+    python distributed.py walk-forward 600000 000001 --local 4
+    python distributed.py sweep 600000 000001 --local 4
+    python distributed.py shard --store --shard-size 50 --local 4
+
+    # 其他节点：队列文件放在共享存储上，启动 worker
+    python distributed.py worker --queue /shared/queue.db
+
+    # 查看作业进度
+    python distributed.py status <作业名>
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from task_queue import TaskQueue, DEFAULT_QUEUE, PENDING, RUNNING, DONE, FAILED, default_worker_id
+
+DEFAULT_LEASE_SECONDS = 300
+
+
+# ---------------------------------------------------------------------------
+# 任务处理函数（在 worker 上执行）
+# ---------------------------------------------------------------------------
+
+def _handle_window(frames, payload):
+    """滚动窗口：训练窗口寻优 + 测试窗口样本外回测"""
+    from walk_forward import _run_window
+    return _run_window(dict(payload, frames=frames))
+
+
+def _handle_params(frames, payload):
+    """一组参数在全区间（去掉预热期）的回测指标"""
+    from walk_forward import evaluate_window
+    returns, metrics = evaluate_window(
+        frames, payload['params'], payload['warmup_start'], payload['start'], payload['end'],
+        initial_cash=payload['initial_cash'])
+    return {'params': payload['params'], 'metrics': metrics}
+
+
+def _handle_shard(frames, payload):
+    """一个股票分片的组合回测"""
+    from walk_forward import evaluate_window
+    shard = {symbol: frames[symbol] for symbol in payload['symbols'] if symbol in frames}
+    returns, metrics = evaluate_window(
+        shard, payload.get('params', {}), payload['warmup_start'], payload['start'],
+        payload['end'], initial_cash=payload['initial_cash'])
+    return {'shard': payload['shard'], 'symbols': sorted(shard), 'metrics': metrics,
+            'returns': returns}
+
+
+HANDLERS = {
+    'window': _handle_window,
+    'params': _handle_params,
+    'shard': _handle_shard,
+}
+
+
+# ---------------------------------------------------------------------------
+# worker
+# ---------------------------------------------------------------------------
+
+class _Heartbeat(threading.Thread):
+    """执行任务期间定期续约"""
+
+    def __init__(self, queue, task_id, worker, lease_seconds):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.task_id = task_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(self.task_id, self.worker, self.lease_seconds):
+                # 租约已被其他 worker 接管，本次结果提交时会被忽略
+                self.lost = True
+                return
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def run_worker(queue_path=DEFAULT_QUEUE, worker=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+               idle_exit=None, poll=1.0, job=None):
+    """
+    领取并执行任务，直到队列空闲超过 idle_exit 秒（None 表示一直运行）
+
+    Returns:
+        本 worker 完成的任务数
+    """
+    queue = TaskQueue(queue_path)
+    worker = worker or default_worker_id()
+    contexts = {}
+    completed = 0
+    idle_since = time.time()
+
+    while True:
+        task = queue.claim(worker, lease_seconds, job=job)
+        if task is None:
+            if idle_exit is not None and time.time() - idle_since >= idle_exit:
+                return completed
+            time.sleep(poll)
+            continue
+
+        task_id, task_job, key, kind, payload = task
+        if task_job not in contexts:
+            # 每个作业的共享数据只读取一次
+            contexts = {task_job: queue.load_context(task_job)}
+
+        heartbeat = _Heartbeat(queue, task_id, worker, lease_seconds)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            result = HANDLERS[kind](contexts[task_job], payload)
+        except Exception as e:
+            heartbeat.stop()
+            print(f"[{worker}] {task_job}/{key} 失败: {e}")
+            queue.fail(task_id, worker, repr(e))
+        else:
+            heartbeat.stop()
+            accepted = queue.complete(task_id, worker, result)
+            completed += accepted
+            print(f"[{worker}] {task_job}/{key} 完成，耗时 {time.perf_counter() - start:.1f} 秒"
+                  + ('' if accepted else '（任务已完成或已失败，结果已忽略）'))
+        idle_since = time.time()
+
+
+def spawn_local_workers(queue_path, count, lease_seconds=DEFAULT_LEASE_SECONDS, idle_exit=5):
+    """在本机启动 count 个 worker 子进程（队列空闲 idle_exit 秒后自动退出）"""
+    processes = []
+    for i in range(count):
+        processes.append(subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), 'worker',
+            '--queue', queue_path,
+            '--worker', f"{default_worker_id()}-{i}",
+            '--lease', str(lease_seconds),
+            '--idle-exit', str(idle_exit),
+        ]))
+    return processes
+
+
+# ---------------------------------------------------------------------------
+# 协调者
+# ---------------------------------------------------------------------------
+
+def job_name(kind, symbols, **options):
+    """由作业类型、股票和参数生成稳定的作业名，重复提交同一作业时复用已完成的任务"""
+    payload = json.dumps([kind, sorted(symbols), options], sort_keys=True, default=str)
+    return f"{kind}-{hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _key(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def submit_walk_forward(queue, job, prepared, param_grid=None, train_days=250, test_days=60,
+                        step_days=None, initial_cash=100000, objective='sharpe', max_attempts=3):
+    """每个滚动窗口一个任务"""
+    from walk_forward import build_window_tasks
+    tasks, dates = build_window_tasks(prepared, param_grid, train_days, test_days,
+                                      step_days, initial_cash, objective)
+    queue.create_job(job, prepared)
+    for task in tasks:
+        task.pop('frames')
+        queue.submit(job, f"window-{task['window']}", 'window', task, max_attempts)
+    return len(tasks)
+
+
+def _warmup_range(prepared, warmup):
+    from walk_forward import trading_dates
+    dates = trading_dates(prepared)
+    if len(dates) <= warmup:
+        return None
+    return dates[0], dates[warmup], dates[-1]
+
+
+def submit_sweep(queue, job, prepared, param_grid=None, initial_cash=100000, max_attempts=3):
+    """参数网格中每组参数一个任务"""
+    from walk_forward import DEFAULT_PARAM_GRID, _param_combinations
+    param_grid = param_grid or DEFAULT_PARAM_GRID
+    combos = _param_combinations(param_grid)
+    warmup = max(param_grid.get('ma_long', [20])) + 1
+    span = _warmup_range(prepared, warmup)
+    if span is None:
+        return 0
+
+    queue.create_job(job, prepared)
+    for params in combos:
+        queue.submit(job, _key(params), 'params', {
+            'params': params, 'warmup_start': span[0], 'start': span[1], 'end': span[2],
+            'initial_cash': initial_cash,
+        }, max_attempts)
+    return len(combos)
+
+
+def submit_shards(queue, job, prepared, shard_size=50, params=None, initial_cash=100000,
+                  max_attempts=3):
+    """股票按代码排序后每 shard_size 只一个任务"""
+    span = _warmup_range(prepared, 21)
+    if span is None:
+        return 0
+    symbols = sorted(prepared)
+    queue.create_job(job, prepared)
+    count = 0
+    for count, i in enumerate(range(0, len(symbols), shard_size), 1):
+        queue.submit(job, f"shard-{count - 1}", 'shard', {
+            'shard': count - 1, 'symbols': symbols[i:i + shard_size], 'params': params or {},
+            'warmup_start': span[0], 'start': span[1], 'end': span[2],
+            'initial_cash': initial_cash,
+        }, max_attempts)
+    return count
+
+
+def run_job(queue, job, local_workers=0, lease_seconds=DEFAULT_LEASE_SECONDS, poll=1.0):
+    """
+    等待作业完成
+
+    local_workers > 0 时在本机启动 worker；本机 worker 全部退出后仍有未完成的任务
+    （其他节点失联）时，由协调者自己执行剩余任务。
+    """
+    processes = spawn_local_workers(queue.path, local_workers, lease_seconds) if local_workers else []
+    last = None
+    takeover = False
+
+    def progress(counts):
+        nonlocal last
+        if counts != last:
+            print(f"{job}: 待执行 {counts[PENDING]}，运行中 {counts[RUNNING]}，"
+                  f"完成 {counts[DONE]}，失败 {counts[FAILED]}")
+            last = counts
+
+    try:
+        while True:
+            counts = queue.wait(job, poll=poll, timeout=poll * 5, progress=progress)
+            if counts[PENDING] == 0 and counts[RUNNING] == 0:
+                break
+            if processes and all(p.poll() is not None for p in processes):
+                if not takeover:
+                    print("本机 worker 已全部退出，由协调者执行剩余任务")
+                    takeover = True
+                # 领取待执行和租约已过期的任务，没有可领取的任务时立即返回
+                run_worker(queue.path, worker=f"{default_worker_id()}-coordinator",
+                           lease_seconds=lease_seconds, idle_exit=0, poll=poll, job=job)
+    finally:
+        for p in processes:
+            p.wait()
+    return queue.counts(job)
+
+
+def merge_walk_forward(queue, job):
+    from walk_forward import merge_window_results
+    return merge_window_results(list(queue.results(job).values()))
+
+
+def merge_sweep(queue, job, objective='sharpe'):
+    """按目标函数排序的参数回测结果"""
+    from walk_forward import _score
+    results = list(queue.results(job).values())
+    return sorted(results, key=lambda r: _score(r['metrics'], objective), reverse=True)
+
+
+SHARD_SUMMARY_NOTE = '近似值：各分片日收益率的等权平均（相当于每日再平衡到等权），不等于全部股票在同一账户中回测'
+
+
+def merge_shards(queue, job):
+    """
+    各分片结果，以及分片等权组合的汇总指标
+
+    每个分片是独立资金的组合回测，汇总只是各分片日收益率的等权平均（每日再平衡到等权），
+    与全部股票放在同一个账户中回测（资金在股票之间竞争）的结果不同，只作近似参考。
+    summary 中的 approximate / note 标明这一点。
+    """
+    import pandas as pd
+    from backtest_strategy import returns_metrics
+    results = sorted(queue.results(job).values(), key=lambda r: r['shard'])
+    returns = [r.pop('returns') for r in results]
+    returns = [r for r in returns if len(r) > 0]
+    combined = pd.concat(returns, axis=1).fillna(0).mean(axis=1) if returns else None
+    summary = {**returns_metrics(combined), 'approximate': True, 'note': SHARD_SUMMARY_NOTE}
+    return {'shards': results, 'summary': summary}
+
+
+def _load_prepared(args):
+    from walk_forward import prepare_frames, load_frames
+    if args.store:
+        import kline_store
+        frames = kline_store.load_frames(args.symbols or None)
+        # kline_store 使用英文字段名，转换为 walk_forward 使用的中文列名
+        rename = {v: k for k, v in kline_store.KLINE_COLUMNS.items()}
+        frames = {symbol: df.rename(columns=rename) for symbol, df in frames.items()}
+    else:
+        frames = load_frames(args.symbols)
+    return prepare_frames(frames)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='分布式回测（SQLite 任务队列）')
+    parser.add_argument('command', choices=['walk-forward', 'sweep', 'shard', 'worker', 'status'])
+    parser.add_argument('symbols', nargs='*', help='股票代码（status 时为作业名）')
+    parser.add_argument('--queue', default=DEFAULT_QUEUE, help='任务队列文件')
+    parser.add_argument('--local', type=int, default=0, help='在本机启动的 worker 数')
+    parser.add_argument('--store', action='store_true', help='使用本地K线存储')
+    parser.add_argument('--shard-size', type=int, default=50)
+    parser.add_argument('--train', type=int, default=250)
+    parser.add_argument('--test', type=int, default=60)
+    parser.add_argument('--objective', choices=['sharpe', 'return'], default='sharpe')
+    parser.add_argument('--cash', type=float, default=100000)
+    parser.add_argument('--retry-failed', action='store_true', help='重新执行之前失败的任务')
+    parser.add_argument('--worker', default=None, help='worker 名称')
+    parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS, help='任务租约（秒）')
+    parser.add_argument('--idle-exit', type=float, default=None, help='队列空闲多少秒后退出')
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        done = run_worker(args.queue, args.worker, args.lease, args.idle_exit)
+        print(f"worker 退出，完成 {done} 个任务")
+        sys.exit(0)
+
+    queue = TaskQueue(args.queue)
+    if args.command == 'status':
+        for job in args.symbols:
+            print(job, queue.counts(job), queue.failures(job) or '')
+        sys.exit(0)
+
+    start = datetime.now()
+    prepared = _load_prepared(args)
+    if not prepared:
+        print("没有可用的历史数据")
+        sys.exit(1)
+    # 作业名包含数据的最后日期，数据更新后不会复用旧结果
+    last_date = max(df['日期'].iloc[-1] for df in prepared.values()).date()
+
+    if args.command == 'walk-forward':
+        job = job_name('wf', prepared, last=last_date, train=args.train, test=args.test,
+                       objective=args.objective, cash=args.cash)
+        count = submit_walk_forward(queue, job, prepared, train_days=args.train,
+                                    test_days=args.test, initial_cash=args.cash,
+                                    objective=args.objective)
+    elif args.command == 'sweep':
+        job = job_name('sweep', prepared, last=last_date, cash=args.cash)
+        count = submit_sweep(queue, job, prepared, initial_cash=args.cash)
+    else:
+        job = job_name('shard', prepared, last=last_date, size=args.shard_size,
+                       cash=args.cash)
+        count = submit_shards(queue, job, prepared, args.shard_size, initial_cash=args.cash)
+
+    if args.retry_failed:
+        queue.retry_failed(job)
+    print(f"作业 {job}: {count} 个任务（已完成的任务不会重复执行）")
+    counts = run_job(queue, job, args.local, args.lease)
+
+    if args.command == 'walk-forward':
+        from walk_forward import print_report
+        print_report(merge_walk_forward(queue, job))
+    elif args.command == 'sweep':
+        for r in merge_sweep(queue, job, args.objective)[:10]:
+            m = r['metrics']
+            sharpe = f"{m['sharpe_ratio']:.2f}" if m['sharpe_ratio'] is not None else '-'
+            print(f"收益 {m['total_return']:>7.2f}% 夏普 {sharpe:>6} 回撤 {m['max_drawdown']:.2f}%  {r['params']}")
+    else:
+        result = merge_shards(queue, job)
+        for r in result['shards']:
+            print(f"分片 {r['shard']:>3} ({len(r['symbols'])} 只) 收益 {r['metrics']['total_return']:>7.2f}%")
+        print(f"分片等权组合收益（近似）: {result['summary']['total_return']:.2f}%")
+        print(f"  {result['summary']['note']}")
+
+    if counts[FAILED]:
+        print(f"失败任务: {queue.failures(job)}")
+    print(f"\n耗时: {(datetime.now() - start).total_seconds():.1f} 秒")
@@ -3,6 +3,9 @@ import sys
 import os
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from symbols import market_code
+
 try:
     import requests
     HAS_REQUESTS = True
@@ -13,7 +16,7 @@ except ImportError:
 def fetch_stock_data(code, name=""):
     print(f"Fetching {code} {name}...")
     results = {'quote': {}, 'news': []}
-    market = '1' if code.startswith('6') else '0'
+    market = market_code(code)
     headers = {'User-Agent': 'Mozilla/5.0'}
     try:
         url = f"https://push2.eastmoney.com/api/qt/stock/get?secid={market}.{code}&fields=f43,f44,f45,f46,f47,f50,f51,f55,f57,f58,f59,f169,f170,f171"
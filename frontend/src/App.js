@@ -194,8 +194,8 @@ function BacktestApp({ onLogout }) {
       return {
         date: point.date,
         close: point.close,
-        buy: buyTrade ? point.close : null,
-        sell: sellTrade ? point.close : null,
+        buy: buyTrade ? buyTrade.price : null,
+        sell: sellTrade ? sellTrade.price : null,
       };
     });
   };
@@ -373,6 +373,26 @@ function BacktestApp({ onLogout }) {
               <div className="label">亏损次数</div>
               <div className="value negative">{result.losing_trades}</div>
             </div>
+            <div className="metric-card">
+              <div className="label">胜率</div>
+              <div className="value">{formatPercent(result.win_rate)}</div>
+            </div>
+            <div className="metric-card">
+              <div className="label">索提诺比率</div>
+              <div className="value">{result.sortino_ratio?.toFixed(2) || '-'}</div>
+            </div>
+            <div className="metric-card">
+              <div className="label">卡玛比率</div>
+              <div className="value">{result.calmar_ratio?.toFixed(2) || '-'}</div>
+            </div>
+            <div className="metric-card">
+              <div className="label">年化换手率</div>
+              <div className="value">{result.turnover ? `${result.turnover.toFixed(1)} 倍` : '-'}</div>
+            </div>
+            <div className="metric-card">
+              <div className="label">平均仓位</div>
+              <div className="value">{formatPercent(result.exposure)}</div>
+            </div>
           </div>
 
           <div className="charts">
@@ -484,7 +504,9 @@ function BacktestApp({ onLogout }) {
                     <th>日期</th>
                     <th>股票代码</th>
                     <th>操作</th>
-                    <th>价格</th>
+                    <th>成交价</th>
+                    <th>数量</th>
+                    <th>手续费</th>
                   </tr>
                 </thead>
                 <tbody>
@@ -494,6 +516,8 @@ function BacktestApp({ onLogout }) {
                       <td>{trade.symbol}</td>
                       <td className={trade.action}>{trade.action === 'buy' ? '买入' : '卖出'}</td>
                       <td>{trade.price.toFixed(2)}</td>
+                      <td>{trade.size}</td>
+                      <td>{trade.commission?.toFixed(2)}</td>
                     </tr>
                   ))}
                 </tbody>
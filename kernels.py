@@ -0,0 +1,667 @@
+#!/usr/bin/env python3
+"""
+回测计算内核（可选 Numba 编译）
+
+把 MAVolumeStrategy / MeanReversionStrategy 在 backtrader 中逐 bar 经过 line 机制的计算
+拆成数组运算，用于参数寻优等需要反复回测同一批K线的场景:
+
+- 滚动指标: rolling_mean（与 bt.indicators.SMA 相同，窗口内用 fsum 精确求和）、
+  rolling_std（与 bt.indicators.StandardDeviation 相同）
+- 信号: ma_volume_signals（均线多头排列、涨幅、量比、换手率/流通市值）、
+  bollinger_signals（布林带），向量化计算买卖条件
+- 模拟: simulate 逐 bar 顺序撮合，复现 backtrader BackBroker 的行为
+  （下一根K线开盘价成交、PercentSizer 按信号时的现金和收盘价定量、按比例收取手续费、
+  提交时和成交时现金不足拒单、T+1 持有期、按持仓建立顺序累加市值），
+  权益曲线、订单和最终资金与 cerebro.run() 逐位一致
+
+撮合循环前后依赖（现金、持仓、在途订单），无法向量化；安装 numba 时编译成机器码，
+否则以普通 Python 运行，滚动指标改用 NumPy 滑动窗口 + math.fsum。两种方式结果相同。
+
+只覆盖日线、单个策略、市价单、无滑点的默认 broker 设置（与项目中所有回测一致）。
+"""
+
+import math
+import itertools
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import numba
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+BACKEND = 'numba' if HAS_NUMBA else 'numpy'
+
+# 订单状态
+SUBMITTED, ACCEPTED, COMPLETED, MARGIN = 0, 1, 2, 3
+STATUS_NAMES = {SUBMITTED: 'submitted', ACCEPTED: 'accepted',
+                COMPLETED: 'completed', MARGIN: 'margin'}
+
+
+def jit(func):
+    """有 numba 时编译（结果缓存到 __pycache__），否则原样返回"""
+    if HAS_NUMBA:
+        return numba.njit(cache=True)(func)
+    return func
+
+
+# ----------------------------------------------------------------------
+# 滚动指标
+# ----------------------------------------------------------------------
+
+@jit
+def _fsum(values, start, stop, partials):
+    """values[start:stop] 的精确求和，逐步复现 CPython math.fsum（Shewchuk 算法）"""
+    n = 0
+    special = 0.0
+    for k in range(start, stop):
+        x = values[k]
+        xsave = x
+        i = 0
+        for m in range(n):
+            y = partials[m]
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            yr = hi - x
+            lo = y - yr
+            if lo != 0.0:
+                partials[i] = lo
+                i += 1
+            x = hi
+        n = i
+        if x != 0.0:
+            if not math.isfinite(x):
+                # NaN/inf 输入：结果为这些值之和
+                special += xsave
+                n = 0
+            else:
+                partials[n] = x
+                n += 1
+    if special != 0.0:
+        return special
+
+    hi = 0.0
+    if n > 0:
+        n -= 1
+        hi = partials[n]
+        lo = 0.0
+        while n > 0:
+            x = hi
+            n -= 1
+            y = partials[n]
+            hi = x + y
+            yr = hi - x
+            lo = y - yr
+            if lo != 0.0:
+                break
+        # 多个分量时保证就近偶数舍入
+        if n > 0 and ((lo < 0.0 and partials[n - 1] < 0.0) or
+                      (lo > 0.0 and partials[n - 1] > 0.0)):
+            y = lo * 2.0
+            x = hi + y
+            yr = x - hi
+            if y == yr:
+                hi = x
+    return hi
+
+
+@jit
+def _rolling_mean(values, period, out):
+    partials = np.empty(period + 1)
+    for i in range(period - 1, len(values)):
+        out[i] = _fsum(values, i - period + 1, i + 1, partials) / period
+
+
+@jit
+def _power(values, exponent, out):
+    # exponent 由调用方传入，编译器不会把 x ** 2 改写成 x * x，与 Python 一样调用 libm pow
+    for i in range(len(values)):
+        out[i] = values[i] ** exponent
+
+
+def rolling_mean(values, period):
+    """简单移动平均，前 period-1 个值为 NaN（与 bt.indicators.SMA 逐位一致）"""
+    values = np.ascontiguousarray(values, dtype='f8')
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+    if HAS_NUMBA:
+        _rolling_mean(values, period, out)
+    else:
+        windows = sliding_window_view(values, period).tolist()
+        out[period - 1:] = np.fromiter(map(math.fsum, windows), dtype='f8',
+                                       count=len(windows)) / period
+    return out
+
+
+def power(values, exponent):
+    """逐元素乘方，与 Python 的 x ** exponent 逐位一致（np.square 在少数值上差 1ulp）"""
+    values = np.ascontiguousarray(values, dtype='f8')
+    if HAS_NUMBA:
+        out = np.empty(len(values))
+        _power(values, float(exponent), out)
+        return out
+    return np.fromiter(map(pow, values.tolist(), itertools.repeat(exponent)),
+                       dtype='f8', count=len(values))
+
+
+def rolling_std(values, period):
+    """
+    滚动标准差（总体），与 bt.indicators.StandardDeviation（safepow=True）逐位一致:
+    sqrt(|SMA(x^2) - SMA(x)^2|)
+    """
+    mean = rolling_mean(values, period)
+    meansq = rolling_mean(power(values, 2), period)
+    return power(np.abs(meansq - power(mean, 2)), 0.5)
+
+
+def _shift(values):
+    """上一根K线的值，第一根为 NaN"""
+    return np.r_[np.nan, values[:-1]]
+
+
+# ----------------------------------------------------------------------
+# 面板
+# ----------------------------------------------------------------------
+
+def build_panel(feeds):
+    """
+    把多只股票的K线对齐到交易日并集上
+
+    Args:
+        feeds: [(股票代码, {line 名: 数组})]，数组格式同 ArrayData 的 dataname
+            （backtest_strategy.frame_columns 的结果）
+
+    Returns:
+        dict:
+        - symbols / columns: 股票代码和各自的原始数组
+        - dates: 交易日并集（datetime64）
+        - has_bar: (日期, 股票) 当天是否有K线
+        - feed_len: 截至当天的K线数（backtrader 中 len(data)）
+        - open / close: 当天的开盘价 / 最近一根K线的收盘价（停牌日沿用之前的收盘价）
+    """
+    symbols = [symbol for symbol, _ in feeds]
+    columns = [cols for _, cols in feeds]
+    feed_dates = [np.asarray(cols['date']).astype('datetime64[us]') for cols in columns]
+    dates = np.unique(np.concatenate(feed_dates)) if feed_dates else np.array([], 'datetime64[us]')
+
+    has_bar = np.zeros((len(dates), len(symbols)), dtype=bool)
+    for j, fd in enumerate(feed_dates):
+        has_bar[np.searchsorted(dates, fd), j] = True
+    feed_len = np.cumsum(has_bar, axis=0, dtype=np.int64)
+
+    panel = {
+        'symbols': symbols,
+        'columns': columns,
+        'dates': dates,
+        'has_bar': has_bar,
+        'feed_len': feed_len,
+    }
+    panel['open'] = to_grid(panel, [cols['open'] for cols in columns])
+    panel['close'] = to_grid(panel, [cols['close'] for cols in columns])
+    return panel
+
+
+def to_grid(panel, values, fill=np.nan):
+    """
+    每只股票自己K线上的数组 -> (日期, 股票) 矩阵
+
+    停牌日取最近一根K线的值（与 backtrader 中 data.close[0] 一致），上市前为 fill。
+    """
+    feed_len = panel['feed_len']
+    dtype = np.asarray(values[0]).dtype if len(values) else 'f8'
+    out = np.full(feed_len.shape, fill, dtype=dtype)
+    for j, column in enumerate(values):
+        idx = feed_len[:, j] - 1
+        listed = idx >= 0
+        out[listed, j] = np.asarray(column)[idx[listed]]
+    return out
+
+
+# ----------------------------------------------------------------------
+# 信号
+# ----------------------------------------------------------------------
+
+def ma_volume_signals(panel, ma_short=5, ma_mid=10, ma_long=20, pct_min=2.0, pct_max=5.0,
+                      turnover_min=4.0, turnover_max=10.0, vol_ratio_min=1.0,
+                      mktcap_min=None, mktcap_max=None, trade_start=None, **_):
+    """
+    MAVolumeStrategy 的判断条件（参数同策略，其余策略参数忽略）
+
+    Returns:
+        dict:
+        - active: 策略判断该股票的 bar（有新K线、过了预热期、均线已形成、不早于 trade_start）
+        - entry:  满足买入条件
+        - exit:   允许卖出（T+1 持有期由 simulate 的 hold_bars 判断）
+        - rank:   持仓在券商中的建立顺序（第一次被判断的先后）
+    """
+    warmup = max(ma_short, ma_mid, ma_long, 5, 2)
+    valid, entry = [], []
+    for cols in panel['columns']:
+        close = np.asarray(cols['close'], dtype='f8')
+        volume = np.asarray(cols['volume'], dtype='f8')
+        ma_s = rolling_mean(close, ma_short)
+        ma_m = rolling_mean(close, ma_mid)
+        ma_l = rolling_mean(close, ma_long)
+        close_prev = _shift(close)
+        vol_prev = _shift(volume)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct = np.where(close_prev > 0, (close - close_prev) / close_prev * 100, 0.0)
+            vol_ratio = np.where(vol_prev > 0, volume / vol_prev, 0.0)
+
+        # 换手率和流通市值，字段缺失（NaN）时换手率不作限制、流通市值视为不满足
+        nan = np.full(len(close), np.nan)
+        turnover = np.asarray(cols.get('turnover', nan), dtype='f8')
+        screen = ~((turnover == turnover) &
+                   ~((turnover_min <= turnover) & (turnover <= turnover_max)))
+        if mktcap_min is not None or mktcap_max is not None:
+            mktcap = np.asarray(cols.get('float_mktcap', nan), dtype='f8')
+            screen &= mktcap == mktcap
+            if mktcap_min is not None:
+                screen &= ~(mktcap < mktcap_min)
+            if mktcap_max is not None:
+                screen &= ~(mktcap > mktcap_max)
+
+        valid.append((ma_s > 0) & (ma_m > 0) & (ma_l > 0))
+        entry.append((ma_s > ma_m) & (ma_m > ma_l) & (close > ma_s) &
+                     (pct_min <= pct) & (pct <= pct_max) &
+                     (vol_ratio > vol_ratio_min) & screen)
+
+    active = panel['has_bar'] & (panel['feed_len'] >= warmup) & to_grid(panel, valid, False)
+    if trade_start is not None:
+        dates = panel['dates'].astype('datetime64[D]')
+        active &= (dates >= np.datetime64(trade_start, 'D'))[:, None]
+    return {
+        'active': active,
+        'entry': active & to_grid(panel, entry, False),
+        'exit': active,
+        'rank': _first_touch_rank(active),
+    }
+
+
+def bollinger_signals(panel, period=20, devfactor=2, **_):
+    """
+    MeanReversionStrategy 的布林带条件：收盘价自下而上穿过下轨买入，高于上轨卖出
+
+    backtrader 在每只股票都有 period 根K线（SMA/StdDev 都有值）之前停留在 prenext，
+    此后每根bar判断所有股票（停牌的股票沿用最近的K线）。
+    """
+    entry, exit_ = [], []
+    for cols in panel['columns']:
+        close = np.asarray(cols['close'], dtype='f8')
+        ma = rolling_mean(close, period)
+        std = rolling_std(close, period)
+        upper = ma + devfactor * std
+        lower = ma - devfactor * std
+        entry.append((_shift(close) < lower) & (close > lower))
+        exit_.append(close > upper)
+
+    bars = np.arange(len(panel['dates']))
+    active = ((bars >= period - 1)[:, None] & (panel['feed_len'] >= 1) &
+              (panel['feed_len'] >= period).all(axis=1)[:, None])
+    return {
+        'active': active,
+        'entry': active & to_grid(panel, entry, False),
+        'exit': active & to_grid(panel, exit_, False),
+        # 策略每根bar按顺序查询所有股票的持仓
+        'rank': np.arange(len(panel['symbols']), dtype=np.int64),
+    }
+
+
+def _first_touch_rank(active):
+    """按第一次 active 的日期（同一天按股票顺序）排序的名次"""
+    n_dates, n_feeds = active.shape
+    first = np.where(active.any(axis=0), active.argmax(axis=0), n_dates)
+    rank = np.empty(n_feeds, dtype=np.int64)
+    rank[np.lexsort((np.arange(n_feeds), first))] = np.arange(n_feeds)
+    return rank
+
+
+# ----------------------------------------------------------------------
+# 撮合
+# ----------------------------------------------------------------------
+
+@jit
+def _split(old, size):
+    """Position.update 的开仓/平仓拆分，返回 (opened, closed)"""
+    new = old + size
+    if new == 0.0:
+        return 0.0, size
+    if old == 0.0:
+        return size, 0.0
+    if old > 0.0:
+        if size > 0.0:
+            return size, 0.0
+        if new > 0.0:
+            return 0.0, size
+        return new, -old
+    if size < 0.0:
+        return size, 0.0
+    if new < 0.0:
+        return 0.0, size
+    return new, -old
+
+
+@jit
+def _simulate(has_bar, feed_len, open_, close, ptr, active_idx, entry, exit_, rank,
+              initial_cash, commission, pct, track_orders, hold_bars):
+    n_dates, n_feeds = has_bar.shape
+    cap = len(active_idx) + 1
+
+    ord_feed = np.empty(cap, dtype=np.int64)
+    ord_size = np.empty(cap)
+    ord_created = np.empty(cap, dtype=np.int64)
+    ord_price = np.empty(cap)
+    ord_status = np.empty(cap, dtype=np.int64)
+    ord_exec = np.full(cap, -1, dtype=np.int64)
+    ord_exec_price = np.full(cap, np.nan)
+    ord_comm = np.zeros(cap)
+    ord_pnl = np.zeros(cap)
+    n_orders = 0
+    batch = 0        # 上一根bar提交、等待券商检查的第一笔订单
+    first_open = 0   # 之前的订单都已结束
+
+    pos_size = np.zeros(n_feeds)
+    pos_price = np.zeros(n_feeds)
+    pseudo = np.zeros(n_feeds)
+    entry_bar = np.full(n_feeds, -1, dtype=np.int64)
+    pending = np.zeros(n_feeds, dtype=np.bool_)
+    held = np.empty(n_feeds, dtype=np.int64)
+    n_held = 0
+
+    cash = initial_cash
+    equity = np.empty(n_dates)
+    cash_curve = np.empty(n_dates)
+
+    for t in range(n_dates):
+        # 1. 检查上一根bar提交的订单（BackBroker.check_submitted）：按信号时的收盘价
+        #    依次预扣现金，累计现金为负的订单被拒绝
+        if batch < n_orders:
+            for k in range(batch, n_orders):
+                pseudo[ord_feed[k]] = pos_size[ord_feed[k]]
+            chain = cash
+            for k in range(batch, n_orders):
+                j = ord_feed[k]
+                price = ord_price[k]
+                opened, closed = _split(pseudo[j], ord_size[k])
+                pseudo[j] += ord_size[k]
+                if closed != 0.0:
+                    chain += -closed * price
+                    chain -= abs(closed) * commission * price
+                if opened != 0.0:
+                    chain -= opened * price
+                    chain -= abs(opened) * commission * price
+                if chain >= 0.0:
+                    ord_status[k] = ACCEPTED
+                else:
+                    ord_status[k] = MARGIN
+                    ord_exec[k] = t
+                    if track_orders:
+                        if ord_size[k] > 0.0:
+                            entry_bar[j] = -1
+                        pending[j] = False
+            batch = n_orders
+
+        # 2. 在途订单按提交顺序在该股票下一根K线的开盘价成交
+        next_open = -1
+        for k in range(first_open, n_orders):
+            if ord_status[k] != ACCEPTED:
+                continue
+            j = ord_feed[k]
+            if not has_bar[t, j]:
+                if next_open < 0:
+                    next_open = k
+                continue
+
+            price = open_[t, j]
+            size = ord_size[k]
+            old = pos_size[j]
+            old_price = pos_price[j]
+            opened, closed = _split(old, size)
+            popened = opened
+            pnl = -closed * (price - old_price)
+            comm = 0.0
+            value = cash
+            if closed != 0.0:
+                value += -closed * old_price + pnl
+                closedcomm = abs(closed) * commission * price
+                value -= closedcomm
+                comm += closedcomm
+                cash = value
+            if opened != 0.0:
+                value -= opened * price
+                openedcomm = abs(opened) * commission * price
+                value -= openedcomm
+                if value < 0.0:
+                    opened = 0.0
+                else:
+                    comm += openedcomm
+                    cash = value
+
+            execsize = closed + opened
+            if execsize != 0.0:
+                new = old + execsize
+                if new == 0.0:
+                    pos_price[j] = 0.0
+                elif old == 0.0:
+                    pos_price[j] = price
+                elif (old > 0.0) == (execsize > 0.0):
+                    pos_price[j] = (old_price * old + execsize * price) / new
+                elif (old > 0.0) != (new > 0.0):
+                    pos_price[j] = price
+                pos_size[j] = new
+
+                # 市值按持仓建立顺序累加
+                if old == 0.0:
+                    h = n_held
+                    while h > 0 and rank[held[h - 1]] > rank[j]:
+                        held[h] = held[h - 1]
+                        h -= 1
+                    held[h] = j
+                    n_held += 1
+                elif new == 0.0:
+                    h = 0
+                    while held[h] != j:
+                        h += 1
+                    for m in range(h, n_held - 1):
+                        held[m] = held[m + 1]
+                    n_held -= 1
+
+            ord_exec[k] = t
+            # OrderData.addbit 的成交均价 (0 * 0 + size * price) / size，可能与 price 差 1ulp
+            ord_exec_price[k] = (execsize * price) / execsize if execsize != 0.0 else price
+            ord_comm[k] = comm
+            ord_pnl[k] = pnl if closed != 0.0 else 0.0
+            if popened != 0.0 and opened == 0.0:
+                ord_status[k] = MARGIN
+            else:
+                ord_status[k] = COMPLETED
+
+            if track_orders:
+                # MAVolumeStrategy.notify_order
+                if ord_status[k] == COMPLETED and size > 0.0:
+                    pending[j] = False
+                elif ord_status[k] == COMPLETED:
+                    if pos_size[j] <= 0.0:
+                        entry_bar[j] = -1
+                    pending[j] = False
+                else:
+                    if size > 0.0:
+                        entry_bar[j] = -1
+                    pending[j] = False
+        first_open = next_open if next_open >= 0 else n_orders
+
+        # 3. 账户市值（BackBroker._get_value）
+        pos_value = 0.0
+        for h in range(n_held):
+            j = held[h]
+            size = pos_size[j]
+            dvalue = size * close[t, j]
+            unrealized = size * (close[t, j] - pos_price[j])
+            if dvalue > 0.0:
+                pos_value += dvalue - unrealized
+                pos_value += unrealized
+            else:
+                pos_value += dvalue
+        equity[t] = cash + pos_value
+        cash_curve[t] = cash
+
+        # 4. 策略：按股票顺序判断，PercentSizer 按当前现金和收盘价定量
+        for a in range(ptr[t], ptr[t + 1]):
+            j = active_idx[a]
+            action = 0
+            if track_orders:
+                if pending[j]:
+                    continue
+                if not pos_size[j] > 0.0:
+                    if entry[a]:
+                        entry_bar[j] = feed_len[t, j]
+                        action = 1
+                elif exit_[a] and (entry_bar[j] < 0 or feed_len[t, j] - entry_bar[j] > hold_bars):
+                    action = -1
+            elif pos_size[j] == 0.0:
+                if entry[a]:
+                    action = 1
+            elif exit_[a]:
+                action = -1
+            if action == 0:
+                continue
+
+            if pos_size[j] != 0.0:
+                size = abs(pos_size[j])
+            else:
+                size = abs(cash / close[t, j] * pct)
+            if size == 0.0:
+                continue
+            ord_feed[n_orders] = j
+            ord_size[n_orders] = size * action
+            ord_created[n_orders] = t
+            ord_price[n_orders] = close[t, j]
+            ord_status[n_orders] = SUBMITTED
+            n_orders += 1
+            if track_orders:
+                pending[j] = True
+
+    return (equity, cash_curve, pos_size, pos_price,
+            ord_feed[:n_orders], ord_size[:n_orders], ord_created[:n_orders],
+            ord_price[:n_orders], ord_status[:n_orders], ord_exec[:n_orders],
+            ord_exec_price[:n_orders], ord_comm[:n_orders], ord_pnl[:n_orders])
+
+
+def simulate(panel, signals, initial_cash=100000, commission=0.001, percents=95,
+             track_orders=True, hold_bars=1):
+    """
+    按信号逐 bar 撮合
+
+    Args:
+        panel: build_panel 的结果
+        signals: ma_volume_signals / bollinger_signals 的结果
+        commission: 按成交金额收取的手续费比例（broker.setcommission(commission=...)）
+        percents: PercentSizer 的 percents
+        track_orders: 按 MAVolumeStrategy 的持仓簿处理（有在途订单时不判断、T+1 持有期）；
+            False 时按 MeanReversionStrategy 处理（空仓时看买入信号，持仓时看卖出信号）
+        hold_bars: track_orders 时买入信号之后至少经过的K线数（len(d) - entry_bar > hold_bars）
+
+    Returns:
+        dict: equity / cash（以日期为索引的 Series）、final_value、
+        orders（订单表）、fills（已成交订单的成交明细，见 analytics）、positions（{股票代码: 持仓数量}）
+    """
+    active = signals['active']
+    rows, cols = np.nonzero(active)
+    ptr = np.searchsorted(rows, np.arange(active.shape[0] + 1)).astype(np.int64)
+
+    (equity, cash, pos_size, _, feed, size, created, price, status,
+     executed, exec_price, comm, pnl) = _simulate(
+        panel['has_bar'], panel['feed_len'],
+        np.ascontiguousarray(panel['open']), np.ascontiguousarray(panel['close']),
+        ptr, cols.astype(np.int64), signals['entry'][rows, cols], signals['exit'][rows, cols],
+        np.asarray(signals['rank'], dtype=np.int64),
+        float(initial_cash), float(commission), percents / 100,
+        bool(track_orders), int(hold_bars))
+
+    dates = pd.DatetimeIndex(panel['dates'])
+    symbols = np.asarray(panel['symbols'], dtype=object)
+    nat = np.datetime64('NaT', 'us')
+    orders = pd.DataFrame({
+        'symbol': symbols[feed] if len(feed) else [],
+        'created': dates[created],
+        'executed': np.where(executed >= 0, panel['dates'][np.maximum(executed, 0)], nat)
+        if len(executed) else [],
+        'action': np.where(size > 0, 'buy', 'sell'),
+        'size': np.abs(size),
+        'signal_price': price,
+        'price': exec_price,
+        'commission': comm,
+        'pnl': pnl,
+        'status': [STATUS_NAMES[s] for s in status.tolist()],
+    })
+    # 成交明细（analytics.analyze 的 fills），与 TrackedMAVolumeStrategy.fills_frame() 相同
+    done = status == COMPLETED
+    fills = pd.DataFrame({
+        'date': panel['dates'][executed[done]],
+        'symbol': symbols[feed[done]],
+        'size': size[done],
+        'price': exec_price[done],
+        'commission': comm[done],
+        'pnl': pnl[done],
+    })
+    return {
+        'equity': pd.Series(equity, index=dates),
+        'cash': pd.Series(cash, index=dates),
+        'final_value': float(equity[-1]) if len(equity) else float(initial_cash),
+        'orders': orders,
+        'fills': fills,
+        'positions': {symbols[j]: float(pos_size[j]) for j in np.flatnonzero(pos_size)},
+    }
+
+
+# ----------------------------------------------------------------------
+# 策略
+# ----------------------------------------------------------------------
+
+def panel_from_frames(frames):
+    """{股票代码: K线 DataFrame} 或 [(股票代码, DataFrame)] -> build_panel 的结果"""
+    from backtest_strategy import frame_columns
+
+    items = frames.items() if isinstance(frames, dict) else frames
+    feeds = []
+    for symbol, df in items:
+        columns = frame_columns(df)
+        if columns is not None:
+            feeds.append((symbol, columns))
+    return build_panel(feeds)
+
+
+def run_ma_volume(frames, initial_cash=100000, commission=0.001, percents=95, panel=None,
+                  **params):
+    """
+    用内核运行 MAVolumeStrategy，结果与 cerebro（setcommission(commission)、
+    PercentSizer(percents)）运行该策略一致
+
+    Args:
+        frames: {股票代码: K线 DataFrame} 或 [(股票代码, DataFrame)]，顺序即 adddata 的顺序
+        panel: 已构建的面板（同一批K线反复回测时复用）
+        **params: MAVolumeStrategy 的参数
+    """
+    from backtest_strategy import MAVolumeStrategy
+
+    if panel is None:
+        panel = panel_from_frames(frames)
+    merged = dict(zip(MAVolumeStrategy.params._getkeys(), MAVolumeStrategy.params._getdefaults()))
+    merged.update(params)
+    signals = ma_volume_signals(panel, **merged)
+    return simulate(panel, signals, initial_cash, commission, percents,
+                    track_orders=True, hold_bars=1)
+
+
+def run_mean_reversion(frames, initial_cash=100000, commission=0.001, percents=95, panel=None,
+                       period=20, devfactor=2):
+    """用内核运行 MeanReversionStrategy（参数同上）"""
+    if panel is None:
+        panel = panel_from_frames(frames)
+    signals = bollinger_signals(panel, period, devfactor)
+    return simulate(panel, signals, initial_cash, commission, percents, track_orders=False)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+本地K线存储
+
+每只股票的日K线保存为一个 NumPy 结构化数组文件 data/kline/daily/<代码>.npy，
+除 OHLCV 外还按日保存换手率、流通股本和流通市值，供选股回放和回测使用。
+
+akshare 的历史K线没有流通股本/市值字段，这里用当日数据反推（只用当天的数据，不含未来信息）:
+- 流通股本(股) = 成交量(手) × 100 / (换手率% / 100)
+- 流通市值(亿) = 成交额(元) / (换手率% / 100) / 1e8
+  （即按当日成交均价估算，避免前复权价格带来的偏差）
+
+指数日K线（回测基准）使用同样的格式，保存在 data/kline/index/<指数代码>.npy，
+与股票分开存放（指数代码和股票代码有重复，如 000001）。
+"""
+
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+KLINE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'kline', 'daily')
+INDEX_DIR = os.path.join(os.path.dirname(__file__), 'data', 'kline', 'index')
+
+# 回测基准指数
+BENCHMARK_INDEXES = {
+    'hs300': '000300',  # 沪深300
+    'zz500': '000905',  # 中证500
+}
+
+KLINE_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),        # 成交量（手）
+    ('amount', 'f8'),        # 成交额（元）
+    ('pct', 'f8'),           # 涨跌幅（%）
+    ('turnover', 'f8'),      # 换手率（%）
+    ('float_shares', 'f8'),  # 流通股本（股）
+    ('float_mktcap', 'f8'),  # 流通市值（亿）
+])
+
+# akshare K线列名 -> 存储字段名
+KLINE_COLUMNS = {
+    '日期': 'date',
+    '开盘': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '收盘': 'close',
+    '成交量': 'volume',
+    '成交额': 'amount',
+    '涨跌幅': 'pct',
+    '换手率': 'turnover',
+}
+
+
+def ffill(values):
+    """用前一个非 NaN 值填充 NaN（一维数组）"""
+    values = np.asarray(values, dtype=float)
+    idx = np.where(np.isnan(values), 0, np.arange(len(values)))
+    np.maximum.accumulate(idx, out=idx)
+    return values[idx]
+
+
+def derive_float_values(volume, amount, turnover):
+    """
+    由成交量、成交额和换手率反推流通股本和流通市值
+
+    停牌或换手率缺失的日子沿用之前最近一次的值。
+
+    Returns:
+        (float_shares, float_mktcap) - 两个 numpy 数组
+    """
+    volume = np.asarray(volume, dtype=float)
+    amount = np.asarray(amount, dtype=float)
+    turnover = np.asarray(turnover, dtype=float)
+
+    valid = (turnover > 0) & (volume > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        float_shares = np.where(valid, volume * 100 / (turnover / 100), np.nan)
+        float_mktcap = np.where(valid & (amount > 0), amount / (turnover / 100) / 1e8, np.nan)
+
+    return ffill(float_shares), ffill(float_mktcap)
+
+
+def kline_to_records(df):
+    """
+    把 akshare 返回的K线 DataFrame 转成 KLINE_DTYPE 结构化数组
+
+    Args:
+        df: 包含 日期/开盘/最高/最低/收盘/成交量 等列的 DataFrame，
+            也接受已经是存储字段名的 DataFrame
+    """
+    df = df.rename(columns=KLINE_COLUMNS)
+    df = df.assign(date=schema.to_datetime(df['date'])).sort_values('date')
+    df = df.drop_duplicates('date', keep='last')
+
+    records = np.zeros(len(df), dtype=KLINE_DTYPE)
+    records['date'] = df['date'].to_numpy().astype('datetime64[D]')
+    for field in ('open', 'high', 'low', 'close', 'volume', 'amount', 'pct', 'turnover'):
+        if field in df.columns:
+            records[field] = pd.to_numeric(df[field], errors='coerce').to_numpy()
+        else:
+            records[field] = np.nan
+
+    if 'float_shares' in df.columns and 'float_mktcap' in df.columns:
+        records['float_shares'] = df['float_shares'].to_numpy()
+        records['float_mktcap'] = df['float_mktcap'].to_numpy()
+    else:
+        records['float_shares'], records['float_mktcap'] = derive_float_values(
+            records['volume'], records['amount'], records['turnover'])
+
+    return records
+
+
+def records_to_frame(records):
+    """结构化数组 -> DataFrame（字段名即列名，date 为 datetime64 列）"""
+    df = pd.DataFrame(records)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def kline_path(symbol, directory=None):
+    return os.path.join(directory or KLINE_DIR, f"{str(symbol).zfill(6)}.npy")
+
+
+def merge_records(old, new):
+    """合并两段K线，日期重复时以新数据为准"""
+    if old is None or len(old) == 0:
+        return new
+    if new is None or len(new) == 0:
+        return old
+    keep = ~np.isin(old['date'], new['date'])
+    merged = np.concatenate([old[keep], new])
+    return merged[np.argsort(merged['date'], kind='stable')]
+
+
+def save_kline(symbol, data, merge=True, directory=None):
+    """
+    保存一只股票的K线
+
+    Args:
+        symbol: 股票代码
+        data: akshare K线 DataFrame 或 KLINE_DTYPE 结构化数组
+        merge: 是否与本地已有数据合并（增量更新）
+        directory: 存储目录，默认 KLINE_DIR（指数使用 INDEX_DIR）
+
+    Returns:
+        保存后的记录条数
+    """
+    directory = directory or KLINE_DIR
+    records = data if isinstance(data, np.ndarray) else kline_to_records(data)
+    if merge:
+        records = merge_records(load_kline(symbol, directory=directory), records)
+        # 新数据段开头停牌时沿用已有的流通股本/市值
+        for field in ('float_shares', 'float_mktcap'):
+            records[field] = ffill(records[field])
+
+    os.makedirs(directory, exist_ok=True)
+    path = kline_path(symbol, directory)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, records)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def load_kline(symbol, mmap=False, directory=None):
+    """
+    读取一只股票的K线结构化数组，不存在时返回 None
+
+    Args:
+        mmap: 是否以只读内存映射方式打开，多次回测共享同一份页缓存
+        directory: 存储目录，默认 KLINE_DIR
+    """
+    path = kline_path(symbol, directory)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def synced_since(symbol, since, directory=None):
+    """本地K线文件是否在 since（datetime）之后写入，即已包含 since 之前的全部K线"""
+    path = kline_path(symbol, directory)
+    return os.path.exists(path) and datetime.fromtimestamp(os.path.getmtime(path)) >= since
+
+
+def load_kline_frame(symbol, start_date=None, end_date=None):
+    """读取一只股票的K线 DataFrame，可按日期截取"""
+    records = load_kline(symbol)
+    if records is None:
+        return None
+    if start_date is not None:
+        records = records[records['date'] >= np.datetime64(pd.Timestamp(start_date).date())]
+    if end_date is not None:
+        records = records[records['date'] <= np.datetime64(pd.Timestamp(end_date).date())]
+    return records_to_frame(records)
+
+
+def list_symbols(directory=None):
+    """本地已存储K线的股票代码"""
+    directory = directory or KLINE_DIR
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f[:-4] for f in os.listdir(directory) if f.endswith('.npy'))
+
+
+def load_frames(symbols=None, start_date=None, end_date=None):
+    """批量读取K线，返回 {股票代码: DataFrame}"""
+    symbols = list_symbols() if symbols is None else symbols
+    frames = {}
+    for symbol in symbols:
+        df = load_kline_frame(symbol, start_date, end_date)
+        if df is not None and len(df) > 0:
+            frames[str(symbol).zfill(6)] = df
+    return frames
+
+
+def save_index_kline(code, data, merge=True):
+    """保存指数日K线（data/kline/index）"""
+    return save_kline(code, data, merge=merge, directory=INDEX_DIR)
+
+
+def load_index_close(code, start_date=None, end_date=None):
+    """
+    读取指数收盘价序列（以日期为索引），本地没有时返回 None
+
+    Args:
+        code: 指数代码，或 BENCHMARK_INDEXES 中的名称（hs300/zz500）
+    """
+    code = BENCHMARK_INDEXES.get(code, code)
+    records = load_kline(code, directory=INDEX_DIR)
+    if records is None or len(records) == 0:
+        return None
+    if start_date is not None:
+        records = records[records['date'] >= np.datetime64(pd.Timestamp(start_date).date())]
+    if end_date is not None:
+        records = records[records['date'] <= np.datetime64(pd.Timestamp(end_date).date())]
+    return pd.Series(records['close'], index=pd.to_datetime(records['date']), name=code)
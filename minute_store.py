@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+本地分钟K线存储
+
+分钟数据量大（每只股票每天 241 根），按 股票/月 分文件、按列压缩保存:
+
+    data/kline/minute/<周期>/<代码>/<YYYY-MM>.npz
+
+每个文件是 np.savez_compressed 写出的若干列:
+- datetime: int64，自 1970-01-01 起的分钟数
+- open/high/low/close: float32
+- volume: int64（手）
+- amount: float64（元）
+
+读取时按月逐个文件流式返回，整段历史不需要一次性放进内存。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+MINUTE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'kline', 'minute')
+
+MINUTE_FIELDS = {
+    'open': np.float32,
+    'high': np.float32,
+    'low': np.float32,
+    'close': np.float32,
+    'volume': np.int64,
+    'amount': np.float64,
+}
+
+# akshare stock_zh_a_hist_min_em 列名 -> 存储字段名
+MINUTE_COLUMNS = {
+    '时间': 'datetime',
+    '开盘': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '收盘': 'close',
+    '成交量': 'volume',
+    '成交额': 'amount',
+}
+
+
+def minute_dir(symbol, period='1'):
+    return os.path.join(MINUTE_DIR, str(period), str(symbol).zfill(6))
+
+
+def minute_path(symbol, month, period='1'):
+    return os.path.join(minute_dir(symbol, period), f"{month}.npz")
+
+
+def minute_to_columns(df):
+    """
+    把 akshare 返回的分钟K线 DataFrame 转成按时间排序的列字典
+
+    Returns:
+        {'datetime': int64 分钟数, 'open': ..., ...}
+    """
+    df = df.rename(columns=MINUTE_COLUMNS)
+    minutes = pd.to_datetime(df['datetime']).to_numpy().astype('datetime64[m]').astype(np.int64)
+    order = np.argsort(minutes, kind='stable')
+
+    columns = {'datetime': minutes[order]}
+    for field, dtype in MINUTE_FIELDS.items():
+        if field in df.columns:
+            values = pd.to_numeric(df[field], errors='coerce').to_numpy()[order]
+        else:
+            values = np.full(len(df), np.nan)
+        if np.issubdtype(dtype, np.integer):
+            values = np.nan_to_num(values, nan=0)
+        columns[field] = values.astype(dtype)
+
+    # 同一分钟重复时保留最后一条
+    keep = np.r_[columns['datetime'][1:] != columns['datetime'][:-1], True] if len(order) else []
+    return {name: values[keep] for name, values in columns.items()}
+
+
+def _month_keys(minutes):
+    """每条记录所属的月份（YYYY-MM）"""
+    return minutes.astype('datetime64[m]').astype('datetime64[M]').astype(str)
+
+
+def _merge_columns(old, new):
+    """合并两段分钟数据，时间重复时以新数据为准"""
+    keep = ~np.isin(old['datetime'], new['datetime'])
+    merged = {name: np.concatenate([old[name][keep], new[name]]) for name in new}
+    order = np.argsort(merged['datetime'], kind='stable')
+    return {name: values[order] for name, values in merged.items()}
+
+
+def load_month(symbol, month, period='1'):
+    """读取一只股票一个月的分钟数据，不存在时返回 None"""
+    path = minute_path(symbol, month, period)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as npz:
+        return {name: npz[name] for name in npz.files}
+
+
+def save_minutes(symbol, data, period='1'):
+    """
+    保存一只股票的分钟K线（与本地已有数据按月合并）
+
+    Args:
+        data: akshare 分钟K线 DataFrame 或 minute_to_columns 返回的列字典
+
+    Returns:
+        写入的月份列表
+    """
+    columns = data if isinstance(data, dict) else minute_to_columns(data)
+    if len(columns['datetime']) == 0:
+        return []
+
+    os.makedirs(minute_dir(symbol, period), exist_ok=True)
+    months = _month_keys(columns['datetime'])
+    written = []
+    for month in np.unique(months):
+        part = {name: values[months == month] for name, values in columns.items()}
+        existing = load_month(symbol, month, period)
+        if existing is not None:
+            part = _merge_columns(existing, part)
+
+        path = minute_path(symbol, month, period)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **part)
+        os.replace(tmp_path, path)
+        written.append(str(month))
+    return written
+
+
+def list_months(symbol, period='1'):
+    """本地已存储的月份（升序）"""
+    directory = minute_dir(symbol, period)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f[:-4] for f in os.listdir(directory) if f.endswith('.npz'))
+
+
+def iter_minutes(symbol, start_date=None, end_date=None, period='1'):
+    """
+    按月流式读取分钟数据
+
+    Yields:
+        每个月一个列字典，已按 start_date/end_date（含当天）截取
+    """
+    start = np.datetime64(pd.Timestamp(start_date).date(), 'm') if start_date is not None else None
+    end = (np.datetime64(pd.Timestamp(end_date).date(), 'm') + np.timedelta64(1, 'D')
+           if end_date is not None else None)
+
+    for month in list_months(symbol, period):
+        month_start = np.datetime64(month, 'M')
+        if start is not None and month_start + np.timedelta64(1, 'M') <= start.astype('datetime64[M]'):
+            continue
+        if end is not None and month_start > end.astype('datetime64[M]'):
+            break
+
+        columns = load_month(symbol, month, period)
+        minutes = columns['datetime']
+        mask = np.ones(len(minutes), dtype=bool)
+        if start is not None:
+            mask &= minutes >= start.astype(np.int64)
+        if end is not None:
+            mask &= minutes < end.astype(np.int64)
+        if mask.any():
+            yield {name: values[mask] for name, values in columns.items()}
+
+
+def load_minutes(symbol, start_date=None, end_date=None, period='1'):
+    """读取一段分钟数据为 DataFrame（datetime 列为 datetime64）"""
+    parts = [pd.DataFrame(columns) for columns in iter_minutes(symbol, start_date, end_date, period)]
+    if not parts:
+        return None
+    df = pd.concat(parts, ignore_index=True)
+    df['datetime'] = df['datetime'].to_numpy().astype('datetime64[m]')
+    return df
+
+
+def _parse_cutoff(cutoff):
+    hour, minute = str(cutoff).split(':')[:2]
+    return int(hour) * 60 + int(minute)
+
+
+def cutoff_snapshots(symbol, cutoff='14:50', start_date=None, end_date=None, period='1'):
+    """
+    每个交易日截至 cutoff（含）的行情快照
+
+    按月流式计算，每次只有一个月的分钟数据在内存中。
+
+    Returns:
+        DataFrame，每天一行:
+        date/open/cutoff_price/cutoff_high/cutoff_low/cutoff_volume/cutoff_amount/close/volume
+        （close/volume 为全天收盘价和成交量，只能用于之后的交易日）
+    """
+    cutoff_minute = _parse_cutoff(cutoff)
+    parts = []
+    for columns in iter_minutes(symbol, start_date, end_date, period):
+        minutes = columns['datetime']
+        days = minutes // 1440
+        day_keys, first = np.unique(days, return_index=True)
+        last = np.r_[first[1:], len(days)] - 1
+
+        # 东八区时间：存储的是北京时间的分钟数，直接取日内分钟
+        before = (minutes - days * 1440) <= cutoff_minute
+        idx = np.where(before, np.arange(len(minutes)), -1)
+        last_before = np.maximum.reduceat(idx, first)
+        has_cutoff = last_before >= 0
+
+        close = columns['close'].astype(float)
+        volume = columns['volume']
+        amount = columns['amount']
+        parts.append(pd.DataFrame({
+            'date': (day_keys * 1440).astype('datetime64[m]').astype('datetime64[ns]'),
+            'open': columns['open'][first].astype(float),
+            'cutoff_price': np.where(has_cutoff, close[np.maximum(last_before, 0)], np.nan),
+            'cutoff_high': np.maximum.reduceat(
+                np.where(before, columns['high'].astype(float), -np.inf), first),
+            'cutoff_low': np.minimum.reduceat(
+                np.where(before, columns['low'].astype(float), np.inf), first),
+            'cutoff_volume': np.add.reduceat(np.where(before, volume, 0), first),
+            'cutoff_amount': np.add.reduceat(np.where(before, amount, 0.0), first),
+            'close': close[last],
+            'volume': np.add.reduceat(volume, first),
+        }))
+
+    if not parts:
+        return pd.DataFrame(columns=[
+            'date', 'open', 'cutoff_price', 'cutoff_high', 'cutoff_low',
+            'cutoff_volume', 'cutoff_amount', 'close', 'volume'])
+    df = pd.concat(parts, ignore_index=True)
+    df.loc[~np.isfinite(df['cutoff_high']), ['cutoff_high', 'cutoff_low']] = np.nan
+    return df
+
+
+def list_symbols(period='1'):
+    """本地已存储分钟K线的股票代码"""
+    directory = os.path.join(MINUTE_DIR, str(period))
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.listdir(directory))
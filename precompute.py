@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+收盘后预计算
+
+每个交易日 15:00 收盘后、次日开盘前运行一次，把白天按需计算的工作提前做完:
+1. 刷新证券主表（symbols）
+2. 获取收盘后的实时行情并按尾盘条件筛选（写 realtime_quotes.pkl/csv、filtered_stocks.csv）
+3. 增量同步日K线到本地存储（已存储的股票 + 当日筛选结果，--market 时为全市场）
+4. 运行默认参数的 MAVolumeStrategy 回测（与 /api/backtest 相同的代码），结果写入缓存
+5. 在固定股票池（universe.json）上运行同样的回测：股票池每天相同，从上次的结束状态延长，
+   只计算新增的交易日。默认回测的股票池是当天的筛选结果，每天不同，只能完整重放
+
+固定股票池取自环境变量 QUANT_BACKTEST_SYMBOLS（逗号分隔的代码），未设置时第一次运行取当天筛选结果的
+前 stock_limit 只写入 data/precomputed/universe.json，之后保持不变（删除该文件重新选取）。
+/api/backtest 请求带同样的 symbols 时命中这个回测的缓存。
+K线是前复权的，股票池中的股票除权除息后本地K线整体重写，之前的K线变化，当天改为完整重放。
+
+API 在上一次收盘之后生成的缓存都视为有效，早上的请求直接命中缓存：
+行情和筛选结果读 realtime_quotes.pkl，回测和选股的历史K线读本地存储中收盘后同步过的股票
+（data_fetcher.load_history），同参数的回测直接返回缓存结果。
+
+运行方式:
+    python precompute.py                 立即运行一次
+    python precompute.py --market        同步全市场K线（耗时较长）
+    python precompute.py --daemon        常驻运行，每个交易日 QUANT_PRECOMPUTE_AT（默认 15:30）执行
+
+只按周末判断交易日，节假日当天会重新运行一次（数据不变，结果相同）。
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from profiling import span, collect_spans
+
+PRECOMPUTE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'precomputed')
+MANIFEST_FILE = os.path.join(PRECOMPUTE_DIR, 'manifest.json')
+UNIVERSE_FILE = os.path.join(PRECOMPUTE_DIR, 'universe.json')
+
+MARKET_CLOSE = (15, 0)
+
+
+def run_at():
+    """每日运行时刻 (时, 分)"""
+    hour, minute = os.getenv('QUANT_PRECOMPUTE_AT', '15:30').split(':')[:2]
+    return int(hour), int(minute)
+
+
+def last_close(now=None):
+    """最近一次收盘时刻（周一至周五 15:00），用于判断缓存是否过期"""
+    now = now or datetime.now()
+    close = now.replace(hour=MARKET_CLOSE[0], minute=MARKET_CLOSE[1], second=0, microsecond=0)
+    if close > now:
+        close -= timedelta(days=1)
+    while close.weekday() >= 5:
+        close -= timedelta(days=1)
+    return close
+
+
+def next_run(now=None):
+    """下一次运行时刻（交易日的 QUANT_PRECOMPUTE_AT）"""
+    now = now or datetime.now()
+    hour, minute = run_at()
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run <= now:
+        run += timedelta(days=1)
+    while run.weekday() >= 5:
+        run += timedelta(days=1)
+    return run
+
+
+def is_fresh(path, now=None):
+    """文件是否在最近一次收盘之后生成"""
+    if not os.path.exists(path):
+        return False
+    return datetime.fromtimestamp(os.path.getmtime(path)) >= last_close(now)
+
+
+def _write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def backtest_key(params):
+    """回测参数 -> 缓存键（不含 force_refresh 等不影响结果的字段）"""
+    params = {k: v for k, v in params.items() if k != 'force_refresh'}
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def backtest_path(params):
+    return os.path.join(PRECOMPUTE_DIR, f"backtest_{backtest_key(params)}.json")
+
+
+def backtest_state_path(params):
+    """回测结束状态（用于第二天增量延长回测）"""
+    return os.path.join(PRECOMPUTE_DIR, f"backtest_{backtest_key(params)}.state")
+
+
+def backtest_checkpoint_path(params):
+    """回测运行中的检查点（中途退出后重新运行时继续）"""
+    return os.path.join(PRECOMPUTE_DIR, f"backtest_{backtest_key(params)}.checkpoint")
+
+
+def load_backtest(params):
+    """读取上一次收盘后缓存的回测结果，没有或已过期时返回 None"""
+    path = backtest_path(params)
+    if not is_fresh(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_backtest(params, result):
+    _write_json(backtest_path(params), result)
+
+
+def fixed_universe(candidates=()):
+    """
+    增量回测使用的固定股票池
+
+    QUANT_BACKTEST_SYMBOLS 优先；否则读取 universe.json，没有时用 candidates（当天筛选结果）创建。
+
+    Returns:
+        代码列表，没有可用的股票池时为空列表
+    """
+    configured = os.getenv('QUANT_BACKTEST_SYMBOLS')
+    if configured:
+        return [code.strip().zfill(6) for code in configured.split(',') if code.strip()]
+    if os.path.exists(UNIVERSE_FILE):
+        with open(UNIVERSE_FILE, encoding='utf-8') as f:
+            return json.load(f)['symbols']
+    symbols = [str(code).zfill(6) for code in candidates]
+    if symbols:
+        _write_json(UNIVERSE_FILE, {'symbols': symbols,
+                                    'created_at': datetime.now().isoformat(timespec='seconds')})
+    return symbols
+
+
+def default_backtest(params=None):
+    """
+    运行一次回测并写入缓存（与 /api/backtest 相同的代码）
+
+    每组参数有各自的检查点，中途退出后重新运行时继续。带固定股票池（symbols）时保存结束状态，
+    下一次运行只计算新增的交易日；按当天筛选结果选股时股票池每天不同，不保存结束状态。
+
+    Returns:
+        BacktestResult
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+    import main
+
+    request = main.BacktestRequest(**(params or {}))
+    key = request.model_dump()
+    state_file = backtest_state_path(key) if request.symbols else None
+    result = main.compute_backtest(request, checkpoint_file=backtest_checkpoint_path(key),
+                                   state_file=state_file)
+    if result.success:
+        save_backtest(key, result.model_dump())
+    return result
+
+
+def _stage(results, name, func):
+    """运行一个阶段，失败时记录错误并继续后面的阶段"""
+    start = time.perf_counter()
+    print(f"\n[{name}] 开始")
+    try:
+        with span(f'precompute.{name}'):
+            detail = func()
+        status = 'ok'
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        detail, status = str(e), 'failed'
+    elapsed = time.perf_counter() - start
+    results[name] = {'status': status, 'seconds': round(elapsed, 3), 'detail': detail}
+    print(f"[{name}] {status}，耗时 {elapsed:.1f} 秒")
+    return detail if status == 'ok' else None
+
+
+def run_precompute(market=False, backtest_params=None):
+    """
+    运行一次全部预计算阶段
+
+    Args:
+        market: 是否同步全市场K线（默认只同步本地已有的股票和当日筛选结果）
+        backtest_params: 默认回测参数，默认使用 /api/backtest 的默认值
+
+    Returns:
+        manifest 字典（同时写入 data/precomputed/manifest.json）
+    """
+    import symbols as symbol_master
+    import kline_store
+    from data_fetcher import fetch_and_save_data, sync_index, sync_kline
+
+    os.makedirs(PRECOMPUTE_DIR, exist_ok=True)
+    started = datetime.now()
+    stages = {}
+
+    with collect_spans('precompute'):
+        _stage(stages, 'symbols', lambda: len(symbol_master.load(refresh=True)))
+
+        screened = _stage(stages, 'screen', lambda: fetch_and_save_data(force_refresh=True))
+        filtered_codes = []
+        if screened is not None and len(screened[1]) > 0:
+            filtered_codes = screened[1]['code'].astype(str).tolist()
+        if screened is not None:
+            stages['screen']['detail'] = {'quotes': len(screened[0]), 'filtered': len(filtered_codes)}
+
+        def sync_klines():
+            if market:
+                codes = symbol_master.load().to_frame()['code'].tolist()
+            else:
+                codes = sorted(set(kline_store.list_symbols()) | set(filtered_codes) |
+                               set(fixed_universe()))
+            failed = []
+            for i, code in enumerate(codes, 1):
+                if sync_kline(code) is None:
+                    failed.append(code)
+                if i % 100 == 0:
+                    print(f"已同步 {i}/{len(codes)} 只股票")
+            # 回测基准指数（沪深300、中证500），/api/backtest 只读取本地存储
+            for code in kline_store.BENCHMARK_INDEXES.values():
+                if sync_index(code) is None:
+                    failed.append(code)
+            return {'symbols': len(codes), 'failed': len(failed)}
+
+        _stage(stages, 'klines', sync_klines)
+
+        def run_backtest(params):
+            result = default_backtest(params)
+            return {'success': result.success, 'message': result.message,
+                    'final_value': result.final_value}
+
+        params = backtest_params or {}
+        _stage(stages, 'backtest', lambda: run_backtest(params))
+
+        limit = params.get('stock_limit', 10)
+        universe = fixed_universe(filtered_codes[:limit])
+        if universe:
+            _stage(stages, 'backtest_fixed', lambda: run_backtest({**params, 'symbols': universe}))
+
+    manifest = {
+        'started_at': started.isoformat(timespec='seconds'),
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'market': market,
+        'stages': stages,
+    }
+    _write_json(MANIFEST_FILE, manifest)
+    return manifest
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return None
+    with open(MANIFEST_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def run_daemon(market=False):
+    """常驻运行：启动时如果还没有本次收盘后的结果则立即运行，之后每个交易日定时运行"""
+    while True:
+        if not is_fresh(MANIFEST_FILE):
+            run_precompute(market=market)
+            continue
+        run = next_run()
+        print(f"下一次预计算: {run:%Y-%m-%d %H:%M}")
+        time.sleep(max((run - datetime.now()).total_seconds(), 0) + 1)
+
+
+if __name__ == "__main__":
+    market = '--market' in sys.argv
+    if '--daemon' in sys.argv:
+        run_daemon(market=market)
+    else:
+        manifest = run_precompute(market=market)
+        print("\n" + "=" * 50)
+        for name, stage in manifest['stages'].items():
+            print(f"{name:<12} {stage['status']:<8} {stage['seconds']:>8.1f} 秒")
+        print("=" * 50)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+分阶段计时与性能剖析
+
+- span(stage): 计时上下文管理器，耗时记入 Prometheus 风格的直方图，
+  并追加到当前请求的 span 列表（collect_spans），便于定位耗时阶段
+- timed(stage): 同上，装饰器形式
+- with_context(func): 把当前上下文带到线程池任务中，工作线程里的 span 也能被 collect_spans 收集
+- render_prometheus(): 输出 /metrics 文本格式
+- Profiler: 单次请求的 cProfile / pyinstrument 剖析（pyinstrument 未安装时使用 cProfile），
+  同一时间只允许一个剖析
+
+环境变量:
+    QUANT_TIMING_LOG=1   每个 collect_spans 结束时打印一行 JSON 格式的阶段耗时
+    QUANT_PROFILING=1    允许请求通过 X-Profile 头开启剖析
+    QUANT_PROFILE_DIR    剖析结果保存目录，默认 data/profiles
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+import contextlib
+import contextvars
+from datetime import datetime
+
+try:
+    import pyinstrument
+    HAS_PYINSTRUMENT = True
+except ImportError:
+    HAS_PYINSTRUMENT = False
+
+PROFILE_DIR = os.getenv('QUANT_PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'data', 'profiles'))
+
+# 秒，覆盖从单次指标计算到分钟级回测
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """带标签的累积直方图（Prometheus histogram 语义）"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'counts': [0] * len(self.buckets),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: {'counts': list(s['counts']), 'sum': s['sum'], 'count': s['count']}
+                    for key, s in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.snapshot().items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            counts = series['counts'] + [series['count']]
+            for bound, count in zip(bounds, counts):
+                bucket_labels = ','.join(labels + ['le="%s"' % bound])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+            label_str = '{%s}' % ','.join(labels) if labels else ''
+            lines.append(f"{self.name}_sum{label_str} {series['sum']:.6f}")
+            lines.append(f"{self.name}_count{label_str} {series['count']}")
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+STAGE_SECONDS = Histogram(
+    'quant_stage_duration_seconds',
+    '各处理阶段耗时（秒）',
+    labelnames=('stage',),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'quant_http_request_duration_seconds',
+    'HTTP 请求耗时（秒）',
+    labelnames=('method', 'path', 'status'),
+)
+
+_REGISTRY = [STAGE_SECONDS, HTTP_REQUEST_SECONDS]
+
+# 当前请求（或任务）收集的 span 列表
+_current_spans = contextvars.ContextVar('quant_spans', default=None)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """记录一个阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _current_spans.get()
+        if spans is not None:
+            spans.append({
+                'stage': stage,
+                'start_ms': round((start - spans.origin) * 1000, 3),
+                'duration_ms': round(elapsed * 1000, 3),
+            })
+
+
+def timed(stage):
+    """span 的装饰器形式"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def with_context(func):
+    """
+    绑定当前上下文的 func，用于提交到线程池
+
+    ThreadPoolExecutor 的工作线程不会继承 contextvars，不绑定时工作线程里的 span
+    只记入直方图，不会出现在请求的 Server-Timing 中。每次提交都要重新调用，
+    同一个 Context 不能同时在多个线程中运行。
+    """
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+class SpanList(list):
+    """一次请求的 span 列表，origin 为请求开始时间"""
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.origin = time.perf_counter()
+
+    def summary(self):
+        """按阶段汇总耗时（毫秒）"""
+        totals = {}
+        for item in self:
+            totals[item['stage']] = totals.get(item['stage'], 0) + item['duration_ms']
+        return totals
+
+
+@contextlib.contextmanager
+def collect_spans(name):
+    """在上下文内收集所有 span，结束时可按 QUANT_TIMING_LOG 打印"""
+    spans = SpanList(name)
+    token = _current_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_spans.reset(token)
+        if os.getenv('QUANT_TIMING_LOG') == '1' and spans:
+            print(json.dumps({
+                'event': 'timing',
+                'name': name,
+                'total_ms': round((time.perf_counter() - spans.origin) * 1000, 3),
+                'stages': spans.summary(),
+            }, ensure_ascii=False))
+
+
+def server_timing_header(spans):
+    """把 span 汇总成 Server-Timing 响应头（浏览器开发者工具可直接查看）"""
+    parts = []
+    for stage, duration in spans.summary().items():
+        metric = ''.join(c if c.isalnum() or c in '_-' else '_' for c in stage)
+        parts.append(f'{metric};dur={duration:.1f}')
+    return ', '.join(parts)
+
+
+def render_prometheus():
+    """Prometheus 文本格式的全部指标"""
+    return '\n'.join(metric.render() for metric in _REGISTRY) + '\n'
+
+
+def profiling_enabled():
+    return os.getenv('QUANT_PROFILING') == '1'
+
+
+# 同一事件循环上的并发请求会互相混入对方的调用栈（cProfile 是进程级的），
+# 所以同一时间只剖析一个请求
+_profile_lock = threading.Lock()
+
+
+class Profiler:
+    """
+    单次调用的性能剖析
+
+    优先使用 pyinstrument（输出 HTML），否则使用 cProfile（输出 .prof，可用 snakeviz 查看）。
+    已有剖析在进行时 start() 返回 None，调用方按未开启剖析处理。
+    """
+
+    def __init__(self, name):
+        self.name = ''.join(c if c.isalnum() or c in '_-' else '_' for c in name).strip('_')
+        self.path = None
+        self._profiler = None
+
+    def start(self):
+        if not _profile_lock.acquire(blocking=False):
+            return None
+        if HAS_PYINSTRUMENT:
+            self._profiler = pyinstrument.Profiler(async_mode='enabled')
+            self._profiler.start()
+        else:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def stop(self):
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            if HAS_PYINSTRUMENT:
+                self._profiler.stop()
+                self.path = os.path.join(PROFILE_DIR, f'{stamp}_{self.name}.html')
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.write(self._profiler.output_html())
+            else:
+                self._profiler.disable()
+                self.path = os.path.join(PROFILE_DIR, f'{stamp}_{self.name}.prof')
+                self._profiler.dump_stats(self.path)
+        finally:
+            _profile_lock.release()
+        return self.path
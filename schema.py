@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+行情 / K线数据规范化
+
+akshare 返回的中文列名、object 类型的数据在入库时统一转换一次:
+- 列名映射为英文规范字段（实时行情 QUOTE_FIELDS，日K线 KLINE_FIELDS）
+- 紧凑类型：价格 float32，日期 int32 (YYYYMMDD)，代码/名称 category
+- 百分号等字符串格式统一解析为数值，市值统一为"亿"
+- 范围校验：超出合理范围的值置为 NaN（整数列置 0），数量记录在 df.attrs['invalid']
+
+下游代码直接使用规范字段，不再重复 pd.to_numeric / str.replace 解析。
+写 CSV 给人看或给旧接口使用时，用 to_source 还原中文列名和原始单位。
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+Field = namedtuple('Field', ['source', 'name', 'dtype', 'scale', 'valid'])
+Field.__new__.__defaults__ = (1.0, None)
+
+# ak.stock_zh_a_spot_em
+QUOTE_FIELDS = (
+    Field('代码', 'code', 'category'),
+    Field('名称', 'name', 'category'),
+    Field('最新价', 'price', 'float32', valid=(0, 1e5)),
+    Field('涨跌幅', 'pct', 'float32', valid=(-100, 1000)),     # 新股上市首日不设涨跌幅限制
+    Field('涨跌额', 'change', 'float32'),
+    Field('成交量', 'volume', 'int64', valid=(0, None)),         # 手
+    Field('成交额', 'amount', 'float64', valid=(0, None)),       # 元
+    Field('振幅', 'amplitude', 'float32', valid=(0, 1000)),
+    Field('最高', 'high', 'float32', valid=(0, 1e5)),
+    Field('最低', 'low', 'float32', valid=(0, 1e5)),
+    Field('今开', 'open', 'float32', valid=(0, 1e5)),
+    Field('昨收', 'prev_close', 'float32', valid=(0, 1e5)),
+    Field('量比', 'vol_ratio', 'float32', valid=(0, None)),
+    Field('换手率', 'turnover', 'float32', valid=(0, 100)),
+    Field('市盈率-动态', 'pe', 'float32'),
+    Field('市净率', 'pb', 'float32'),
+    Field('总市值', 'total_mktcap', 'float32', 1e-8, (0, None)),  # 元 -> 亿
+    Field('流通市值', 'float_mktcap', 'float32', 1e-8, (0, None)),
+    Field('涨速', 'speed', 'float32'),
+    Field('5分钟涨跌', 'pct_5min', 'float32'),
+    Field('60日涨跌幅', 'pct_60d', 'float32'),
+    Field('年初至今涨跌幅', 'pct_ytd', 'float32'),
+)
+
+# ak.stock_zh_a_hist（前复权价格可能为负，价格不做范围校验）
+KLINE_FIELDS = (
+    Field('日期', 'date', 'date'),
+    Field('股票代码', 'symbol', 'category'),
+    Field('开盘', 'open', 'float32'),
+    Field('收盘', 'close', 'float32'),
+    Field('最高', 'high', 'float32'),
+    Field('最低', 'low', 'float32'),
+    Field('成交量', 'volume', 'int64', valid=(0, None)),         # 手
+    Field('成交额', 'amount', 'float64', valid=(0, None)),       # 元
+    Field('振幅', 'amplitude', 'float32', valid=(0, 1000)),
+    Field('涨跌幅', 'pct', 'float32', valid=(-100, 1000)),
+    Field('涨跌额', 'change', 'float32'),
+    Field('换手率', 'turnover', 'float32', valid=(0, 100)),
+)
+
+
+def to_datetime(values):
+    """日期列转 datetime64，支持 int32 (YYYYMMDD)、字符串和 datetime"""
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_datetime(values.astype('int64').astype(str), format='%Y%m%d')
+    return pd.to_datetime(values)
+
+
+def date_to_int(values):
+    """日期列转 int32 (YYYYMMDD)"""
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_integer_dtype(values):
+        return values.astype('int32')
+    dates = pd.to_datetime(values)
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('int32')
+
+
+def _to_number(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype('float64')
+    # '5.12%'、'-' 等字符串
+    text = column.astype(str).str.rstrip('%')
+    return pd.to_numeric(text, errors='coerce').astype('float64')
+
+
+def _convert(column, field, from_source):
+    if field.dtype == 'category':
+        column = column.astype(str)
+        if field.name in ('code', 'symbol'):
+            column = column.str.zfill(6)
+        return column.astype('category'), 0
+    if field.dtype == 'date':
+        return date_to_int(column), 0
+
+    values = _to_number(column)
+    if from_source and field.scale != 1.0:
+        values = values * field.scale
+
+    invalid = 0
+    if field.valid is not None:
+        low, high = field.valid
+        bad = pd.Series(False, index=values.index)
+        if low is not None:
+            bad |= values < low
+        if high is not None:
+            bad |= values > high
+        invalid = int(bad.sum())
+        if invalid:
+            values = values.mask(bad)
+
+    if field.dtype.startswith('int'):
+        values = values.fillna(0)
+    return values.astype(field.dtype), invalid
+
+
+def normalize(df, fields, schema_name, **constants):
+    """
+    按字段表规范化 DataFrame
+
+    源列（中文）和规范列（英文）都能识别，已规范化的 DataFrame 原样返回。
+    不在字段表中的列被丢弃。
+
+    Args:
+        constants: 额外添加的常量列，如 symbol='600000'（存为 category）
+    """
+    if df.attrs.get('schema') == schema_name:
+        return df
+
+    columns = {}
+    invalid = {}
+    for field in fields:
+        if field.source in df.columns:
+            column, from_source = df[field.source], True
+        elif field.name in df.columns:
+            column, from_source = df[field.name], False
+        else:
+            continue
+        columns[field.name], count = _convert(column, field, from_source)
+        if count:
+            invalid[field.name] = count
+
+    for name, value in constants.items():
+        columns[name] = pd.Categorical([value] * len(df))
+
+    result = pd.DataFrame(columns, index=df.index)
+    result.attrs['schema'] = schema_name
+    result.attrs['invalid'] = invalid
+    return result
+
+
+def normalize_quotes(df):
+    """实时行情（ak.stock_zh_a_spot_em）-> 规范字段"""
+    return normalize(df, QUOTE_FIELDS, 'quote')
+
+
+def normalize_kline(df, symbol=None):
+    """日K线（ak.stock_zh_a_hist）-> 规范字段，symbol 非空时添加 symbol 列"""
+    constants = {'symbol': str(symbol).zfill(6)} if symbol is not None else {}
+    return normalize(df, KLINE_FIELDS, 'kline', **constants)
+
+
+def _to_float64(column):
+    # float32 按最短十进制表示还原（20.04 而不是 20.040000915527344），写出的 CSV 与原始数据一致
+    if column.dtype == np.float32:
+        return pd.Series(column.to_numpy().astype(str).astype('float64'), index=column.index)
+    return column.astype('float64')
+
+
+def to_source(df, fields):
+    """规范字段 -> akshare 中文列名和原始单位（写 CSV 时使用），其余列保持不变"""
+    columns = {}
+    for name in df.columns:
+        field = next((f for f in fields if f.name == name), None)
+        if field is None:
+            columns[name] = df[name]
+        elif field.dtype == 'date':
+            columns[field.source] = to_datetime(df[name]).dt.strftime('%Y-%m-%d')
+        elif field.dtype == 'float32':
+            columns[field.source] = _to_float64(df[name]) / field.scale
+        elif field.scale != 1.0:
+            columns[field.source] = df[name].astype('float64') / field.scale
+        else:
+            columns[field.source] = df[name]
+    return pd.DataFrame(columns, index=df.index)
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+截面选股回测 - 按历史每一天重放尾盘选股条件
+
+data_fetcher.fetch_and_save_data 只用"今天"的行情做筛选，用筛选结果回测历史会引入
+未来函数。这里改为在全市场的时点面板上逐日重放筛选条件:
+
+1. 每个交易日 t 用截至 t 的数据计算 涨跌幅/换手率/量比/(流通市值)
+2. 满足条件的股票按排序字段取前 N 只，在 t 日收盘（尾盘）买入
+3. t 之后的第一个交易日开盘卖出（T+1）；停牌的股票顺延到复牌日，期间继续占用资金份额
+
+所有条件在 日期 × 股票 的矩阵上一次性向量化计算，逐笔循环只剩下资金份额的分配。
+
+有分钟数据时可以用 build_cutoff_panel 代替 build_panel：在 t 日的 cutoff 时刻（如 14:50）
+按截至该时刻的价格和成交量判断条件，并以 cutoff 时刻的价格买入，更接近真实的尾盘操作。
+"""
+
+import os
+import sys
+import heapq
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import schema
+from backtest_strategy import returns_metrics
+
+# 与实时选股保持一致的默认条件
+DEFAULT_SCREEN_PARAMS = {
+    'pct_min': 2.0,           # 最小涨幅(%)
+    'pct_max': 5.0,           # 最大涨幅(%)
+    'turnover_min': 4.0,      # 最小换手率(%)
+    'turnover_max': 10.0,     # 最大换手率(%)
+    'vol_ratio_min': 1.0,     # 最小量比
+    'mktcap_min': None,       # 最小流通市值(亿)，None 表示不限制
+    'mktcap_max': None,       # 最大流通市值(亿)
+    'ma_alignment': False,    # 是否额外要求 收盘价 > MA5 > MA10 > MA20
+}
+
+# akshare K线列名 -> 面板列名
+PANEL_COLUMNS = {
+    '日期': 'date',
+    '开盘': 'open',
+    '最高': 'high',
+    '最低': 'low',
+    '收盘': 'close',
+    '成交量': 'volume',
+    '涨跌幅': 'pct',
+    '换手率': 'turnover',
+}
+
+
+def build_panel(frames):
+    """
+    把多只股票的K线合并成时点面板，并计算筛选所需的特征
+
+    Args:
+        frames: {股票代码: K线 DataFrame} 或带 symbol 列的长表
+                （如 data/historical_data.csv）
+
+    Returns:
+        按 (symbol, date) 排序的长表，包含
+        date/symbol/open/close/volume/pct/turnover/vol_ratio/next_open/next_date 等列
+    """
+    if isinstance(frames, dict):
+        parts = []
+        for symbol, df in frames.items():
+            if df is None or len(df) == 0:
+                continue
+            df = df.rename(columns=PANEL_COLUMNS)
+            df['symbol'] = symbol
+            parts.append(df)
+        if not parts:
+            return pd.DataFrame()
+        panel = pd.concat(parts, ignore_index=True)
+    else:
+        panel = frames.rename(columns=PANEL_COLUMNS)
+
+    panel['date'] = schema.to_datetime(panel['date'])
+    panel['symbol'] = panel['symbol'].astype(str).str.zfill(6)
+    panel = panel.sort_values(['symbol', 'date']).reset_index(drop=True)
+
+    by_symbol = panel.groupby('symbol', sort=False)
+
+    # 涨跌幅缺失时用收盘价计算
+    if 'pct' not in panel.columns:
+        panel['pct'] = by_symbol['close'].pct_change() * 100
+    if 'turnover' not in panel.columns:
+        panel['turnover'] = np.nan
+
+    # 量比：当日成交量 / 前5个交易日平均成交量（只使用t日及之前的数据）
+    prev_vol_mean = (
+        by_symbol['volume'].shift(1)
+        .groupby(panel['symbol'], sort=False)
+        .rolling(5, min_periods=5).mean()
+        .reset_index(level=0, drop=True)
+    )
+    panel['vol_ratio'] = panel['volume'] / prev_vol_mean
+
+    for window in (5, 10, 20):
+        panel[f'ma{window}'] = (
+            by_symbol['close'].rolling(window, min_periods=window).mean()
+            .reset_index(level=0, drop=True)
+        )
+
+    # T+1 卖出：该股票下一个交易日的开盘价（停牌则顺延到复牌日）
+    panel['next_open'] = by_symbol['open'].shift(-1)
+    panel['next_date'] = by_symbol['date'].shift(-1)
+
+    return panel
+
+
+def build_cutoff_panel(symbols=None, cutoff='14:50', start_date=None, end_date=None):
+    """
+    用分钟数据构建 cutoff 时刻的时点面板，列与 build_panel 一致，可直接用于 run_screen_backtest
+
+    t 日各字段只使用 cutoff 之前的数据:
+    - close:      cutoff 时刻的价格（买入价）
+    - pct:        相对前一日收盘价的涨幅
+    - vol_ratio:  截至 cutoff 的成交量 / 前5日同一时段成交量均值
+    - turnover:   截至 cutoff 的成交量 / 前一日的流通股本（需要本地日K线存储，
+                  没有时为 NaN，换手率条件不成立，这些股票不会入选；股票列表记在 attrs['no_turnover']）
+    - ma5/10/20:  前 N-1 日收盘价与 cutoff 价格的均值
+    - next_open:  下一交易日开盘价（卖出价）
+
+    Args:
+        symbols: 股票代码列表，默认本地有分钟数据的全部股票
+        cutoff: 日内判断时刻 'HH:MM'
+    """
+    import kline_store
+    import minute_store
+
+    if symbols is None:
+        symbols = minute_store.list_symbols()
+
+    parts = []
+    no_turnover = []
+    for symbol in symbols:
+        symbol = str(symbol).zfill(6)
+        snap = minute_store.cutoff_snapshots(symbol, cutoff, start_date, end_date)
+        if len(snap) == 0:
+            continue
+
+        prev_close = snap['close'].shift(1)
+        df = pd.DataFrame({
+            'date': snap['date'],
+            'symbol': symbol,
+            'open': snap['open'],
+            'close': snap['cutoff_price'],
+            'volume': snap['cutoff_volume'].astype(float),
+            'pct': (snap['cutoff_price'] / prev_close - 1) * 100,
+        })
+        prev_vol_mean = snap['cutoff_volume'].shift(1).rolling(5, min_periods=5).mean()
+        df['vol_ratio'] = snap['cutoff_volume'] / prev_vol_mean
+
+        for window in (5, 10, 20):
+            prev_sum = snap['close'].shift(1).rolling(window - 1, min_periods=window - 1).sum()
+            df[f'ma{window}'] = (prev_sum + snap['cutoff_price']) / window
+
+        # 流通股本取前一交易日的值，当天的值由全天换手率反推，cutoff 时还不知道
+        records = kline_store.load_kline(symbol)
+        if records is not None and len(records) > 0:
+            shares = pd.Series(records['float_shares'], index=pd.to_datetime(records['date']))
+            shares = shares.shift(1).reindex(df['date'], method='ffill').to_numpy()
+            df['turnover'] = df['volume'] * 100 / shares * 100
+            df['float_mktcap'] = shares * df['close'] / 1e8
+        else:
+            df['turnover'] = np.nan
+            df['float_mktcap'] = np.nan
+            no_turnover.append(symbol)
+
+        df['next_open'] = snap['open'].shift(-1)
+        df['next_date'] = snap['date'].shift(-1)
+        parts.append(df)
+
+    if not parts:
+        return pd.DataFrame()
+    panel = pd.concat(parts, ignore_index=True).sort_values(['symbol', 'date']).reset_index(drop=True)
+    panel.attrs['no_turnover'] = no_turnover
+    return panel
+
+
+def _wide(panel, column):
+    """把面板的一列转成 日期 × 股票 的矩阵"""
+    return panel.pivot(index='date', columns='symbol', values=column)
+
+
+def screen_mask(panel, params=None):
+    """
+    向量化计算每个交易日的选股结果
+
+    Returns:
+        (mask, wide) - mask 为 日期 × 股票 的布尔 DataFrame；
+        wide 为计算中用到的各字段矩阵，供排序和成交使用
+    """
+    params = {**DEFAULT_SCREEN_PARAMS, **(params or {})}
+
+    fields = ['close', 'pct', 'turnover', 'vol_ratio', 'next_open']
+    if params['ma_alignment']:
+        fields += ['ma5', 'ma10', 'ma20']
+    if 'float_mktcap' in panel.columns:
+        fields.append('float_mktcap')
+    wide = {field: _wide(panel, field) for field in fields}
+
+    pct = wide['pct'].to_numpy()
+    turnover = wide['turnover'].to_numpy()
+    vol_ratio = wide['vol_ratio'].to_numpy()
+
+    # NaN 参与比较时结果为 False，未上市/停牌的格子自然被排除
+    mask = (
+        (pct >= params['pct_min']) & (pct <= params['pct_max']) &
+        (turnover >= params['turnover_min']) & (turnover <= params['turnover_max']) &
+        (vol_ratio > params['vol_ratio_min'])
+    )
+
+    if params['mktcap_min'] is not None or params['mktcap_max'] is not None:
+        if 'float_mktcap' not in wide:
+            raise ValueError("面板中没有 float_mktcap 列，无法按流通市值筛选")
+        mktcap = wide['float_mktcap'].to_numpy()
+        if params['mktcap_min'] is not None:
+            mask &= mktcap >= params['mktcap_min']
+        if params['mktcap_max'] is not None:
+            mask &= mktcap <= params['mktcap_max']
+
+    if params['ma_alignment']:
+        close = wide['close'].to_numpy()
+        ma5 = wide['ma5'].to_numpy()
+        ma10 = wide['ma10'].to_numpy()
+        ma20 = wide['ma20'].to_numpy()
+        mask &= (close > ma5) & (ma5 > ma10) & (ma10 > ma20)
+
+    # 没有下一个交易日的（最后一天/退市）无法完成 T+1 卖出
+    mask &= ~np.isnan(wide['next_open'].to_numpy())
+
+    mask = pd.DataFrame(mask, index=wide['pct'].index, columns=wide['pct'].columns)
+    return mask, wide
+
+
+def select_top_n(mask, score, top_n=10):
+    """
+    每个交易日在候选股票中按 score 从高到低取前 top_n 只
+
+    Returns:
+        (rows, cols) - 入选格子在矩阵中的行列下标
+    """
+    values = np.where(mask.to_numpy(), score.to_numpy(dtype=float), -np.inf)
+    values[np.isnan(values)] = -np.inf
+    top_n = min(top_n, values.shape[1])
+    if top_n == 0:
+        # 面板中没有股票，argpartition 的 kth=-1 会越界
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty.copy()
+
+    # argpartition 只做部分排序，比整行排序快得多
+    idx = np.argpartition(-values, top_n - 1, axis=1)[:, :top_n]
+    picked = np.take_along_axis(values, idx, axis=1)
+    rows = np.repeat(np.arange(values.shape[0]), top_n).reshape(idx.shape)
+    valid = np.isfinite(picked)
+    return rows[valid], idx[valid]
+
+
+def allocate_slots(rows, exit_rows, score, top_n):
+    """
+    资金分成 top_n 份，每笔交易从买入日收盘占用一份到卖出日开盘，没有空闲份额时放弃买入
+
+    Args:
+        rows / exit_rows: 候选交易的买入日、卖出日在日期序列中的下标
+        score: 候选交易的排序值，同一天份额不够时先取 score 高的
+        top_n: 资金份数
+
+    Returns:
+        布尔数组，标记入选的候选交易
+    """
+    keep = np.zeros(len(rows), dtype=bool)
+    holding = []  # 持仓中交易的卖出日下标（小顶堆）
+    for i in np.lexsort((-score, rows)):
+        # 当天开盘卖出的份额可以在收盘时再次买入
+        while holding and holding[0] <= rows[i]:
+            heapq.heappop(holding)
+        if len(holding) < top_n:
+            heapq.heappush(holding, exit_rows[i])
+            keep[i] = True
+    return keep
+
+
+def run_screen_backtest(panel, params=None, top_n=10, rank_by='pct',
+                        initial_cash=100000, position_pct=0.95, commission=0.001):
+    """
+    运行截面选股回测
+
+    Args:
+        panel: build_panel 返回的时点面板
+        params: 选股条件，默认 DEFAULT_SCREEN_PARAMS
+        top_n: 最多同时持有的股票数，资金平均分成 top_n 份
+        rank_by: 候选股票排序字段（pct/turnover/vol_ratio）
+        initial_cash: 初始资金
+        position_pct: 每日投入资金比例
+        commission: 单边手续费率
+
+    Returns:
+        {'equity': 权益曲线 Series, 'trades': 交易明细 DataFrame, 'metrics': 指标}
+    """
+    if top_n < 1:
+        raise ValueError(f"top_n 必须大于等于 1: {top_n}")
+
+    mask, wide = screen_mask(panel, params)
+    if rank_by not in wide:
+        wide[rank_by] = _wide(panel, rank_by)
+
+    rows, cols = select_top_n(mask, wide[rank_by], top_n)
+
+    dates = mask.index
+    symbols = mask.columns
+    exit_dates = pd.DatetimeIndex(_wide(panel, 'next_date').to_numpy()[rows, cols])
+    exit_rows = dates.searchsorted(exit_dates)
+
+    # 停牌股票卖出前份额一直被占用，之后几天的候选只能用剩余的份额
+    keep = allocate_slots(rows, exit_rows, wide[rank_by].to_numpy(dtype=float)[rows, cols], top_n)
+    rows, cols, exit_rows, exit_dates = rows[keep], cols[keep], exit_rows[keep], exit_dates[keep]
+
+    entry = wide['close'].to_numpy()[rows, cols]
+    exit_ = wide['next_open'].to_numpy()[rows, cols]
+
+    trade_ret = exit_ / entry * (1 - commission) / (1 + commission) - 1
+
+    # 收益计入卖出日（卖出日开盘成交），未用满的份额持有现金
+    daily_ret = np.zeros(len(dates))
+    np.add.at(daily_ret, exit_rows, trade_ret * position_pct / top_n)
+    returns = pd.Series(daily_ret, index=dates)
+
+    equity = initial_cash * (1 + returns).cumprod()
+
+    trades = pd.DataFrame({
+        'date': dates[rows],
+        'symbol': symbols[cols],
+        'entry_price': entry,
+        'exit_date': exit_dates,
+        'exit_price': exit_,
+        'return': trade_ret * 100,
+    }).sort_values(['date', 'symbol']).reset_index(drop=True)
+
+    metrics = returns_metrics(returns)
+    metrics['total_trades'] = int(len(trades))
+    metrics['winning_trades'] = int((trades['return'] > 0).sum())
+    metrics['losing_trades'] = int((trades['return'] <= 0).sum())
+    metrics['final_value'] = float(equity.iloc[-1]) if len(equity) else initial_cash
+
+    return {'equity': equity, 'trades': trades, 'metrics': metrics}
+
+
+def fetch_market_history(symbols=None, start_date=None, end_date=None):
+    """
+    获取全市场（或指定股票）的历史K线
+
+    Args:
+        symbols: 股票代码列表，默认使用 get_all_stocks 返回的全部A股
+    """
+    from data_fetcher import get_all_stocks, iter_history
+
+    if symbols is None:
+        symbols = get_all_stocks()['code'].tolist()
+
+    # 并发获取，每只股票以紧凑类型（float32 价格）保存在内存中
+    frames = {}
+    for i, (symbol, df) in enumerate(iter_history(symbols, start_date, end_date, store=False), 1):
+        if df is not None:
+            frames[symbol] = df
+        if i % 100 == 0:
+            print(f"已获取 {i}/{len(symbols)} 只股票历史数据")
+    return frames
+
+
+if __name__ == "__main__":
+    from data_fetcher import DATA_DIR
+
+    # 参数说明：
+    # python screen_backtest.py               - 使用 data/historical_data.csv
+    # python screen_backtest.py <csv文件>      - 使用指定的长表K线文件（需含 symbol 列）
+    # python screen_backtest.py --market       - 获取全市场历史数据（耗时较长）
+    # python screen_backtest.py --store        - 使用本地K线存储（含流通市值）
+    # python screen_backtest.py --minute [14:50] - 使用本地分钟数据，在 cutoff 时刻判断并买入
+    panel = None
+    if len(sys.argv) > 1 and sys.argv[1] == '--market':
+        source = fetch_market_history()
+    elif len(sys.argv) > 1 and sys.argv[1] == '--store':
+        import kline_store
+        source = kline_store.load_frames()
+    elif len(sys.argv) > 1 and sys.argv[1] == '--minute':
+        cutoff = sys.argv[2] if len(sys.argv) > 2 else '14:50'
+        panel = build_cutoff_panel(cutoff=cutoff)
+        if len(panel) == 0:
+            print("本地没有分钟数据，请先运行 data_fetcher.sync_minutes")
+            sys.exit(1)
+        missing = panel.attrs['no_turnover']
+        if missing:
+            # 换手率为 NaN 时换手率条件不成立，这些股票永远不会入选
+            print(f"警告: {len(missing)} 只股票没有本地日K线存储，无法计算换手率，不参与选股"
+                  f"（{', '.join(missing[:10])}{' 等' if len(missing) > 10 else ''}）。"
+                  f"请先运行 data_fetcher.sync_kline")
+    else:
+        history_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, 'historical_data.csv')
+        if not os.path.exists(history_file):
+            print(f"找不到历史数据文件: {history_file}")
+            sys.exit(1)
+        source = pd.read_csv(history_file, dtype={'symbol': str})
+
+    if panel is None:
+        panel = build_panel(source)
+    result = run_screen_backtest(panel)
+
+    metrics = result['metrics']
+    print("=" * 60)
+    print("截面选股回测结果")
+    print("=" * 60)
+    print(f"最终资金: {metrics['final_value']:.2f}")
+    print(f"总收益率: {metrics['total_return']:.2f}%")
+    print(f"年化收益率: {metrics['annual_return']:.2f}%")
+    if metrics['sharpe_ratio'] is not None:
+        print(f"夏普比率: {metrics['sharpe_ratio']:.2f}")
+    print(f"最大回撤: {metrics['max_drawdown']:.2f}%")
+    print(f"总交易次数: {metrics['total_trades']}")
+    print(f"盈利次数: {metrics['winning_trades']}")
+    print(f"亏损次数: {metrics['losing_trades']}")
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+A股证券主表（代码、名称、交易所、板块、上市日期）
+
+从 akshare 获取全部A股列表，保存为 NumPy 结构化数组 data/symbols/symbols.npy，
+超过有效期（默认 24 小时，QUANT_SYMBOLS_TTL_HOURS）后再次使用时自动刷新，
+刷新失败时继续使用本地旧数据。
+
+交易所和板块按代码号段判断，东方财富接口的 secid 由交易所决定（上交所 1，深交所/北交所 0），
+不再用 code.startswith('6') 猜测市场（北交所 4/8/920 开头的代码会被误判）。
+
+查询:
+- get(code): 按代码 O(1) 查找（字典索引）
+- search(text): 按名称或代码前缀查找（排序数组上二分查找）
+- universe(codes): 选股结果、回测股票池统一经主表过滤（去掉非A股号段和主表中没有的代码）
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_provider import get_provider
+
+SYMBOLS_DIR = os.path.join(os.path.dirname(__file__), 'data', 'symbols')
+SYMBOLS_FILE = os.path.join(SYMBOLS_DIR, 'symbols.npy')
+
+SYMBOL_DTYPE = np.dtype([
+    ('code', 'U6'),
+    ('name', 'U16'),
+    ('exchange', 'U2'),      # SH/SZ/BJ
+    ('board', 'U4'),         # 主板/科创板/创业板/北交所
+    ('list_date', 'i4'),     # 上市日期 YYYYMMDD，未知为 0
+])
+
+# 代码号段 -> (交易所, 板块)，按前缀长度从长到短匹配
+BOARD_PREFIXES = (
+    ('688', 'SH', '科创板'), ('689', 'SH', '科创板'),
+    ('600', 'SH', '主板'), ('601', 'SH', '主板'), ('603', 'SH', '主板'), ('605', 'SH', '主板'),
+    ('300', 'SZ', '创业板'), ('301', 'SZ', '创业板'), ('302', 'SZ', '创业板'),
+    ('000', 'SZ', '主板'), ('001', 'SZ', '主板'), ('002', 'SZ', '主板'),
+    ('003', 'SZ', '主板'), ('004', 'SZ', '主板'),
+    ('920', 'BJ', '北交所'),
+    ('43', 'BJ', '北交所'), ('83', 'BJ', '北交所'), ('87', 'BJ', '北交所'), ('88', 'BJ', '北交所'),
+)
+
+# 东方财富 secid 的市场前缀
+EASTMONEY_MARKET = {'SH': '1', 'SZ': '0', 'BJ': '0'}
+
+
+def classify(code):
+    """
+    按代码号段判断交易所和板块
+
+    Returns:
+        (exchange, board)，无法识别时为 (None, None)
+    """
+    code = str(code).zfill(6)
+    for prefix, exchange, board in BOARD_PREFIXES:
+        if code.startswith(prefix):
+            return exchange, board
+    return None, None
+
+
+def market_code(code):
+    """东方财富接口的市场前缀（上交所 1，深交所/北交所 0）"""
+    exchange, _ = classify(code)
+    if exchange is None:
+        # 未知号段沿用旧规则：6/9 开头为上交所
+        return '1' if str(code).zfill(6)[0] in '69' else '0'
+    return EASTMONEY_MARKET[exchange]
+
+
+def secid(code):
+    """东方财富 secid，如 1.600000、0.000001、0.920001"""
+    code = str(code).zfill(6)
+    return f"{market_code(code)}.{code}"
+
+
+def ttl_seconds():
+    return float(os.getenv('QUANT_SYMBOLS_TTL_HOURS', '24')) * 3600
+
+
+def _pick(df, candidates):
+    for name in candidates:
+        if name in df.columns:
+            return df[name]
+    return None
+
+
+def _exchange_frames(provider):
+    """分交易所获取证券列表（含上市日期）"""
+    frames = []
+    for func, kwargs in (
+        ('stock_info_sh_name_code', {'symbol': '主板A股'}),
+        ('stock_info_sh_name_code', {'symbol': '科创板'}),
+        ('stock_info_sz_name_code', {'symbol': 'A股列表'}),
+        ('stock_info_bj_name_code', {}),
+    ):
+        df = provider.akshare(func, **kwargs)
+        code = _pick(df, ('证券代码', 'A股代码'))
+        name = _pick(df, ('证券简称', 'A股简称'))
+        list_date = _pick(df, ('上市日期', 'A股上市日期'))
+        frames.append(pd.DataFrame({
+            'code': code.astype(str),
+            'name': name.astype(str),
+            'list_date': list_date if list_date is not None else None,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def fetch_symbols():
+    """
+    从 akshare 获取全部A股列表
+
+    优先分交易所获取（带上市日期），失败时退回 stock_info_a_code_name（只有代码和名称）。
+
+    Returns:
+        SYMBOL_DTYPE 结构化数组，按代码排序
+    """
+    provider = get_provider()
+    try:
+        df = _exchange_frames(provider)
+    except Exception as e:
+        print(f"分交易所获取证券列表失败，改用代码名称列表: {e}")
+        df = provider.akshare('stock_info_a_code_name')
+        df = pd.DataFrame({'code': df['code'].astype(str), 'name': df['name'].astype(str),
+                           'list_date': None})
+
+    df['code'] = df['code'].str.strip().str.zfill(6)
+    df = df.drop_duplicates('code', keep='last').sort_values('code')
+
+    records = np.zeros(len(df), dtype=SYMBOL_DTYPE)
+    records['code'] = df['code'].to_numpy()
+    # 名称中的空格（如 "万  科Ａ"）去掉，便于前缀查找
+    records['name'] = df['name'].str.replace(r'\s+', '', regex=True).to_numpy()
+    boards = [classify(code) for code in records['code']]
+    records['exchange'] = [exchange or '' for exchange, _ in boards]
+    records['board'] = [board or '' for _, board in boards]
+    dates = pd.to_datetime(df['list_date'], errors='coerce')
+    records['list_date'] = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).fillna(0).to_numpy()
+    return records
+
+
+def save_symbols(records, path=None):
+    path = path or SYMBOLS_FILE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, records)
+    os.replace(tmp_path, path)
+
+
+class SymbolMaster:
+    """证券主表及其查找索引"""
+
+    def __init__(self, records, loaded_at=None):
+        self.records = records
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self._by_code = {code: i for i, code in enumerate(records['code'])}
+        # 名称排序索引，用于前缀二分查找
+        self._name_order = np.argsort(records['name'], kind='stable')
+        self._sorted_names = records['name'][self._name_order]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, code):
+        return str(code).zfill(6) in self._by_code
+
+    def _row(self, i):
+        row = self.records[i]
+        return {
+            'code': str(row['code']),
+            'name': str(row['name']),
+            'exchange': str(row['exchange']) or None,
+            'board': str(row['board']) or None,
+            'list_date': int(row['list_date']) or None,
+        }
+
+    def get(self, code):
+        """按代码查找，不存在时返回 None"""
+        i = self._by_code.get(str(code).zfill(6))
+        return None if i is None else self._row(i)
+
+    def name(self, code, default=''):
+        i = self._by_code.get(str(code).zfill(6))
+        return default if i is None else str(self.records['name'][i])
+
+    def search(self, text, limit=20):
+        """
+        按前缀查找：全数字时匹配代码，否则匹配名称
+
+        Returns:
+            匹配记录的字典列表（最多 limit 条）
+        """
+        text = str(text).strip()
+        if not text:
+            return []
+        if text.isdigit():
+            codes = self.records['code']
+            lo = np.searchsorted(codes, text, side='left')
+            hi = np.searchsorted(codes, text + '\uffff', side='left')
+            rows = range(lo, min(hi, lo + limit))
+        else:
+            lo = np.searchsorted(self._sorted_names, text, side='left')
+            hi = np.searchsorted(self._sorted_names, text + '\uffff', side='left')
+            rows = self._name_order[lo:min(hi, lo + limit)]
+        return [self._row(i) for i in rows]
+
+    def to_frame(self):
+        """与 ak.stock_info_a_code_name 兼容的 DataFrame（code/name 及其余字段）"""
+        return pd.DataFrame(self.records)
+
+
+_master = None
+_lock = threading.Lock()
+
+
+def load(refresh=False):
+    """
+    当前的证券主表
+
+    依次使用：内存中未过期的主表 -> 本地未过期的文件 -> 重新获取并保存。
+    获取失败时使用本地旧文件（即使已过期）。
+    """
+    global _master
+    with _lock:
+        now = time.time()
+        if not refresh and _master is not None and now - _master.loaded_at < ttl_seconds():
+            return _master
+
+        mtime = os.path.getmtime(SYMBOLS_FILE) if os.path.exists(SYMBOLS_FILE) else None
+        if not refresh and mtime is not None and now - mtime < ttl_seconds():
+            _master = SymbolMaster(np.load(SYMBOLS_FILE), loaded_at=mtime)
+            return _master
+
+        try:
+            records = fetch_symbols()
+            save_symbols(records)
+            _master = SymbolMaster(records)
+            print(f"证券主表已更新: {len(records)} 只股票")
+        except Exception as e:
+            if mtime is None:
+                raise
+            print(f"证券主表刷新失败，使用本地缓存: {e}")
+            # 过一段时间再重试，避免每次调用都访问网络
+            _master = SymbolMaster(np.load(SYMBOLS_FILE), loaded_at=now - ttl_seconds() + 600)
+        return _master
+
+
+def get(code):
+    """按代码查找证券信息"""
+    return load().get(code)
+
+
+def search(text, limit=20):
+    """按名称或代码前缀查找"""
+    return load().search(text, limit)
+
+
+def universe(codes):
+    """
+    把代码列表规范为选股/回测使用的A股股票池
+
+    代码补零到6位、去重并保持原顺序。证券主表可用时只保留主表中的代码
+    （已退市、代码错误的被丢弃）；主表不可用时按号段判断，丢弃非A股号段（如B股）。
+
+    Returns:
+        代码列表
+    """
+    try:
+        master = load()
+    except Exception as e:
+        print(f"证券主表不可用，只按号段判断: {e}")
+        master = None
+    if master is not None and len(master) == 0:
+        master = None
+
+    result, seen = [], set()
+    for code in codes:
+        code = str(code).strip().zfill(6)
+        if master is not None:
+            known = code in master
+        else:
+            known = classify(code)[0] is not None
+        if code in seen or not known:
+            continue
+        seen.add(code)
+        result.append(code)
+    return result
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+基于 SQLite 的持久化任务队列
+
+分布式回测的协调者把任务写入队列，各节点的 worker 领取任务、执行并写回结果。
+SQLite 文件可以放在本机（多进程）或共享存储上，任何能访问该文件的进程都可以作为 worker;
+换成 TCP 服务时只需实现同样的 submit/claim/complete/fail 接口。
+
+- 去重: 同一个作业（job）中 key 相同的任务只保存一份，重复提交直接忽略，
+  已完成的任务在重新提交作业时不会再执行（可用于断点续跑）
+- 租约: worker 领取任务时获得一段租约（lease），执行期间定期续约；
+  worker 进程退出或失联后租约过期，任务被其他 worker 重新领取
+- 重试: 执行出错或租约过期都计为一次尝试，超过 max_attempts 后标记为 failed
+- 结果只接受第一次提交: 失联的 worker 恢复后提交的重复结果被忽略；
+  已标记为 failed 的任务不再接受结果（协调者可能已经按失败汇报），需要先 retry_failed
+
+任务参数、作业共享数据和结果都用 pickle 保存，只应在可信的节点之间使用。
+"""
+
+import os
+import time
+import pickle
+import socket
+import sqlite3
+import contextlib
+
+DEFAULT_QUEUE = os.path.join(os.path.dirname(__file__), 'data', 'queue.db')
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job TEXT PRIMARY KEY,
+    context BLOB,
+    created REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload BLOB,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    lease_until REAL,
+    worker TEXT,
+    result BLOB,
+    error TEXT,
+    created REAL,
+    updated REAL,
+    UNIQUE (job, key)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class TaskQueue:
+    """
+    SQLite 任务队列
+
+    每个操作使用独立的连接，可以在多个线程和进程中同时使用。
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return contextlib.closing(conn)
+
+    # ------------------------------------------------------------------
+    # 协调者
+    # ------------------------------------------------------------------
+
+    def create_job(self, job, context=None):
+        """
+        创建作业并保存各任务共享的数据（如K线），已存在时保留原有数据
+
+        Returns:
+            是否新建
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO jobs (job, context, created) VALUES (?, ?, ?)',
+                (job, pickle.dumps(context, protocol=pickle.HIGHEST_PROTOCOL), time.time()))
+            return cursor.rowcount > 0
+
+    def load_context(self, job):
+        with self._connect() as conn:
+            row = conn.execute('SELECT context FROM jobs WHERE job = ?', (job,)).fetchone()
+        return pickle.loads(row[0]) if row is not None and row[0] is not None else None
+
+    def submit(self, job, key, kind, payload, max_attempts=3):
+        """
+        提交任务，(job, key) 已存在时忽略
+
+        Returns:
+            是否新增
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO tasks (job, key, kind, payload, max_attempts, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job, str(key), kind, pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL),
+                 max_attempts, now, now))
+            return cursor.rowcount > 0
+
+    def counts(self, job=None):
+        """各状态的任务数"""
+        sql = 'SELECT status, COUNT(*) FROM tasks'
+        args = ()
+        if job is not None:
+            sql += ' WHERE job = ?'
+            args = (job,)
+        with self._connect() as conn:
+            rows = conn.execute(sql + ' GROUP BY status', args).fetchall()
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def results(self, job):
+        """已完成任务的结果 {key: result}"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT key, result FROM tasks WHERE job = ? AND status = ?', (job, DONE)).fetchall()
+        return {key: pickle.loads(result) for key, result in rows}
+
+    def failures(self, job):
+        """失败任务的错误信息 {key: error}"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT key, error FROM tasks WHERE job = ? AND status = ?', (job, FAILED)).fetchall()
+        return dict(rows)
+
+    def retry_failed(self, job):
+        """把失败的任务重新放回队列（重新计算尝试次数）"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE tasks SET status = ?, attempts = 0, error = NULL, updated = ? '
+                'WHERE job = ? AND status = ?', (PENDING, time.time(), job, FAILED))
+            return cursor.rowcount
+
+    def wait(self, job, poll=1.0, timeout=None, progress=None):
+        """
+        等待作业的全部任务完成或失败
+
+        Args:
+            progress: 每次轮询时调用 progress(counts)
+
+        Returns:
+            最终的 counts
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            counts = self.counts(job)
+            if progress is not None:
+                progress(counts)
+            if counts[PENDING] == 0 and counts[RUNNING] == 0:
+                return counts
+            if deadline is not None and time.time() >= deadline:
+                return counts
+            time.sleep(poll)
+
+    # ------------------------------------------------------------------
+    # worker
+    # ------------------------------------------------------------------
+
+    def claim(self, worker, lease_seconds=300, job=None):
+        """
+        领取一个任务：待执行的任务，或租约已过期的运行中任务
+
+        Returns:
+            (task_id, job, key, kind, payload)，没有可领取的任务时返回 None
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 租约过期且已用完重试次数的任务标记为失败
+                conn.execute(
+                    'UPDATE tasks SET status = ?, error = COALESCE(error, ?), updated = ? '
+                    'WHERE status = ? AND lease_until < ? AND attempts >= max_attempts',
+                    (FAILED, 'worker 租约过期', now, RUNNING, now))
+
+                sql = ('SELECT id, job, key, kind, payload FROM tasks '
+                       'WHERE (status = ? OR (status = ? AND lease_until < ?))')
+                args = [PENDING, RUNNING, now]
+                if job is not None:
+                    sql += ' AND job = ?'
+                    args.append(job)
+                row = conn.execute(sql + ' ORDER BY id LIMIT 1', args).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+
+                conn.execute(
+                    'UPDATE tasks SET status = ?, attempts = attempts + 1, lease_until = ?, '
+                    'worker = ?, updated = ? WHERE id = ?',
+                    (RUNNING, now + lease_seconds, worker, now, row[0]))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        task_id, job, key, kind, payload = row
+        return task_id, job, key, kind, pickle.loads(payload)
+
+    def heartbeat(self, task_id, worker, lease_seconds=300):
+        """续约，任务已被其他 worker 接管时返回 False"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE tasks SET lease_until = ?, updated = ? '
+                'WHERE id = ? AND worker = ? AND status = ?',
+                (time.time() + lease_seconds, time.time(), task_id, worker, RUNNING))
+            return cursor.rowcount > 0
+
+    def complete(self, task_id, worker, result):
+        """
+        提交结果
+
+        任务仍在待执行或运行中时接受（租约过期后被其他 worker 接管的任务也接受，先到先得）；
+        已完成（重复执行）或已失败的任务忽略结果
+
+        Returns:
+            结果是否被接受
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE tasks SET status = ?, result = ?, worker = ?, error = NULL, '
+                'lease_until = NULL, updated = ? WHERE id = ? AND status IN (?, ?)',
+                (DONE, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), worker,
+                 time.time(), task_id, PENDING, RUNNING))
+            return cursor.rowcount > 0
+
+    def fail(self, task_id, worker, error):
+        """记录一次失败：未用完重试次数时放回队列，否则标记为 failed"""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE tasks SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, '
+                'error = ?, lease_until = NULL, updated = ? '
+                'WHERE id = ? AND worker = ? AND status = ?',
+                (FAILED, PENDING, str(error)[:2000], time.time(), task_id, worker, RUNNING))
+
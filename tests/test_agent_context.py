@@ -0,0 +1,91 @@
+import pytest
+
+import agent_context
+from agent_context import compact, estimate_tokens, extract_findings, format_findings
+
+
+@pytest.mark.parametrize('text, rating', [
+    ('投资评级: 强烈买入', '强烈买入'),
+    ('操作建议：买入', '买入'),
+    # 否定的评级词不算，取同一行中后面没有被否定的评级
+    ('操作建议：不建议买入，短期观望为主', '观望'),
+    ('投资评级：不建议买入，维持观望', '观望'),
+    ('操作建议：避免追高，卖出', '卖出'),
+    ('建议：不宜买入', None),
+    ('建议：不宜买入\n结论：看空', '看空'),
+    # 明确标注的评级优先于前面其他行中的评级词
+    ('操作建议：买入\n投资评级：持有', '持有'),
+    ('投资评级：持有\n投资评级：卖出', '持有'),
+    ('投资评级：不予置评\n结论：看多', '看多'),
+    # 只在评级/建议/结论等行中找评级
+    ('整体看多，目标价 20 元', None),
+    ('', None),
+])
+def test_extract_rating(text, rating):
+    assert extract_findings(text)['rating'] == rating
+
+
+@pytest.mark.parametrize('line, group', [
+    ('综合来看估值偏高', 'conclusion'),
+    ('需警惕业绩下滑风险', 'risks'),
+    ('PE 35 倍，营收增长 12%', 'numbers'),
+    ('公司成立于 1998 年', None),      # 有数字但不是指标
+    ('管理层经验丰富', None),
+])
+def test_extract_groups(line, group):
+    findings = extract_findings(f"## 分析\n- **{line}**\n|---|---|\n- {line}")
+    for name in ('conclusion', 'numbers', 'risks'):
+        # 去掉标记，重复的行只保留一次
+        assert findings[name] == ([line] if name == group else [])
+
+
+def _report(count):
+    lines = ['# 基本面分析', '投资评级：增持']
+    for i in range(count):
+        lines += [f'综合来看第{i}季度经营稳健', f'营收增长 {i}%，毛利率 3{i}%',
+                  f'需注意第{i}项政策风险']
+    return '\n'.join(lines)
+
+
+@pytest.mark.parametrize('budget', [10, 30, 60, 120, 400])
+def test_format_findings_within_budget(budget):
+    text = format_findings(extract_findings(_report(20)), budget)
+
+    assert estimate_tokens(text) <= budget
+    assert text.startswith('评级: 增持')
+
+
+def test_compact_keeps_short_text():
+    text = '投资评级：增持\n营收增长 12%'
+    assert compact(text, budget=100) == text
+
+
+def test_compact_long_text_keeps_priorities():
+    text = compact(_report(50), budget=80)
+
+    assert estimate_tokens(text) <= 80
+    lines = text.splitlines()
+    assert lines[:3] == ['评级: 增持', '结论:', '- 综合来看第0季度经营稳健']
+    assert '关键数据:' in lines and '风险:' in lines
+
+
+@pytest.mark.parametrize('text', [
+    '无法获取数据' * 100,                 # 全部中文，每字 1 个 token
+    'connection timed out; ' * 100,      # 英文每 4 个字符 1 个 token
+    ('接口超时 timeout ' * 60),
+])
+@pytest.mark.parametrize('budget', [1, 7, 50])
+def test_compact_truncates_by_tokens(text, budget):
+    result = compact(text, budget)
+
+    assert text.startswith(result)
+    assert estimate_tokens(result) <= budget
+    # 截断到预算允许的最长前缀，而不是按字符数截断
+    assert estimate_tokens(text[:len(result) + 1]) > budget
+
+
+def test_truncate_tokens_edges():
+    assert agent_context.truncate_tokens('', 5) == ''
+    assert agent_context.truncate_tokens('abcdefgh', 0) == ''
+    assert agent_context.truncate_tokens('abcdefgh', 1) == 'abcd'
+    assert agent_context.truncate_tokens('中文abc', 2) == '中文'
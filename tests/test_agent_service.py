@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('claude_agent_sdk')
+
+from agent_service import AgentSessionPool  # noqa: E402
+
+
+def test_acquire_after_close_raises():
+    async def run():
+        pool = AgentSessionPool(size=1)
+        await pool.close()
+        with pytest.raises(RuntimeError):
+            await pool.acquire('team-leader')
+        # 关闭后不再预启动会话
+        pool.prewarm(['team-leader'])
+        assert pool.stats()['sessions'] == 0
+
+    asyncio.run(run())
+
+
+def test_close_wakes_waiting_acquire():
+    async def run():
+        pool = AgentSessionPool(size=1)
+        # 占满名额（相当于一个使用中的会话）
+        assert await pool._reserve(('team-leader', '.')) is None
+        waiter = asyncio.create_task(pool.acquire('risk-manager'))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        await pool.close()
+        with pytest.raises(RuntimeError):
+            await waiter
+
+    asyncio.run(run())
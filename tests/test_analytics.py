@@ -0,0 +1,101 @@
+import math
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics
+from backtest_strategy import TrackedMAVolumeStrategy, dataframe_to_backtrader
+from benchmark import make_kline
+
+
+@pytest.fixture(scope='module')
+def strategy():
+    # 超过两个自然年，SharpeRatio 才有值
+    cerebro = bt.Cerebro()
+    cerebro.broker.setcash(100000)
+    cerebro.broker.setcommission(commission=0.001)
+    for i in range(5):
+        symbol = f'60000{i}'
+        cerebro.adddata(dataframe_to_backtrader(make_kline(symbol, days=700, seed=i), symbol))
+    cerebro.addstrategy(TrackedMAVolumeStrategy)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+    return cerebro.run()[0]
+
+
+def test_analyze_matches_backtrader_analyzers(strategy):
+    metrics = strategy.analyze()
+    analyzers = strategy.analyzers
+    trades = analyzers.trades.get_analysis()
+
+    assert trades.total.closed > 10
+    assert metrics['sharpe_ratio'] is not None
+    assert metrics['sharpe_ratio'] == pytest.approx(
+        analyzers.sharpe.get_analysis()['sharperatio'], rel=1e-12)
+    assert metrics['max_drawdown'] == pytest.approx(
+        analyzers.drawdown.get_analysis().max.drawdown, rel=1e-12)
+    assert metrics['annual_return'] == pytest.approx(
+        analyzers.returns.get_analysis()['rnorm100'], rel=1e-12)
+    assert metrics['total_trades'] == trades.total.total
+    assert metrics['open_trades'] == trades.total.get('open', 0)
+    assert metrics['winning_trades'] == trades.won.total
+    assert metrics['losing_trades'] == trades.lost.total
+    assert metrics['final_value'] == strategy.broker.getvalue()
+
+
+def test_sortino_ratio():
+    returns = [0.01, -0.02, 0.03, -0.01]
+    # 均值 0.0025，下行标准差 sqrt((0.02^2 + 0.01^2) / 4)
+    assert analytics.sortino_ratio(returns, periods=1) == pytest.approx(
+        0.0025 / math.sqrt(0.0005 / 4))
+    assert analytics.sortino_ratio(returns, periods=4) == pytest.approx(
+        2 * 0.0025 / math.sqrt(0.0005 / 4))
+    assert analytics.sortino_ratio([0.01, 0.02]) is None
+    assert analytics.sortino_ratio([]) is None
+
+
+@pytest.mark.parametrize('annual, max_dd, expected', [
+    (20.0, 10.0, 2.0),
+    (-5.0, 25.0, -0.2),
+    (5.0, 0.0, None),
+    (float('-inf'), 50.0, None),
+    (None, 10.0, None),
+])
+def test_calmar_ratio(annual, max_dd, expected):
+    assert analytics.calmar_ratio(annual, max_dd) == expected
+
+
+def test_rolling_sharpe():
+    result = analytics.rolling_sharpe([0.01, 0.03, 0.02, 0.0, 0.0, 0.0], window=2, periods=4)
+
+    # 每个窗口：均值 / 样本标准差 * sqrt(4)，标准差为 0 的窗口为 NaN
+    expected = [np.nan, 0.02 / math.sqrt(0.0002) * 2, 0.025 / math.sqrt(0.00005) * 2,
+                0.01 / math.sqrt(0.0002) * 2, np.nan, np.nan]
+    np.testing.assert_allclose(result.to_numpy(), expected)
+
+
+def test_turnover_and_exposure():
+    dates = pd.bdate_range('2025-01-02', periods=4)
+    values = [100.0, 110.0, 120.0, 130.0]
+    cash = [100.0, 60.0, 60.0, 130.0]
+    fills = pd.DataFrame({
+        'date': dates[[0, 2]], 'symbol': ['600000', '600000'], 'size': [1.0, -1.0],
+        'price': [50.0, 60.0], 'commission': [0.05, 0.06], 'pnl': [0.0, 10.0],
+    })
+
+    metrics = analytics.analyze(dates, values, 100.0, fills=fills, cash=cash, periods=4)
+
+    # 成交金额 110 / 平均总资产 115 / 1 年
+    assert metrics['turnover'] == pytest.approx(110 / 115)
+    # 每根bar持仓市值占比的平均值
+    assert metrics['exposure'] == pytest.approx((0 + 50 / 110 + 60 / 120 + 0) / 4 * 100)
+    assert metrics['total_trades'] == 1 and metrics['winning_trades'] == 1
+    assert metrics['trades']['pnlcomm'].iloc[0] == pytest.approx(10 - 0.11)
+
+    no_fills = analytics.analyze(dates, values, 100.0)
+    assert no_fills['turnover'] is None and no_fills['exposure'] is None
@@ -0,0 +1,99 @@
+import backtrader as bt
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_strategy import (ArrayData, TrackedMAVolumeStrategy, datetime64_to_num,
+                               frame_columns)
+from benchmark import make_kline
+
+SYMBOLS = ['600000', '600001', '600002']
+LINES = ['datetime', 'open', 'high', 'low', 'close', 'volume', 'turnover', 'float_mktcap']
+
+
+class ExtendedPandasData(bt.feeds.PandasData):
+    """带换手率和流通市值的 PandasData（逐行加载的参照实现）"""
+
+    lines = ('turnover', 'float_mktcap')
+    params = (
+        ('turnover', -1),
+        ('float_mktcap', -1),
+    )
+
+
+@pytest.fixture(scope='module')
+def frames():
+    return [(s, make_kline(s, days=200, seed=i).iloc[i * 15:].reset_index(drop=True))
+            for i, s in enumerate(SYMBOLS)]
+
+
+def _pandas_feed(symbol, df):
+    columns = frame_columns(df)
+    frame = pd.DataFrame({k: v for k, v in columns.items() if k != 'date'},
+                         index=pd.DatetimeIndex(columns['date']))
+    return ExtendedPandasData(dataname=frame, name=symbol)
+
+
+def _array_feed(symbol, df, **kwargs):
+    return ArrayData(dataname=frame_columns(df), name=symbol, **kwargs)
+
+
+def _run(feeds):
+    cerebro = bt.Cerebro()
+    cerebro.broker.setcash(100000)
+    cerebro.broker.setcommission(commission=0.001)
+    for feed in feeds:
+        cerebro.adddata(feed)
+    cerebro.addstrategy(TrackedMAVolumeStrategy)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
+    return cerebro.run()[0]
+
+
+def _arrays(strategy):
+    return [{line: np.asarray(getattr(d.lines, line).array) for line in LINES}
+            for d in strategy.datas]
+
+
+def test_array_data_matches_pandas_data(frames):
+    expected = _run([_pandas_feed(s, df) for s, df in frames])
+    result = _run([_array_feed(s, df) for s, df in frames])
+
+    for got, want in zip(_arrays(result), _arrays(expected)):
+        assert np.isfinite(got['turnover']).all() and np.isfinite(got['float_mktcap']).all()
+        for line in LINES:
+            np.testing.assert_array_equal(got[line], want[line], err_msg=line)
+
+    assert len(result.fills) > 0
+    assert result.broker.getvalue() == expected.broker.getvalue()
+    np.testing.assert_array_equal(result.equity.columns()['value'],
+                                  expected.equity.columns()['value'])
+
+
+def test_resume_from_trims_leading_bars(frames):
+    symbol, df = frames[0]
+    resume = pd.Timestamp(df['日期'].iloc[120])
+
+    full = _run([_array_feed(symbol, df)])
+    trimmed = _run([_array_feed(symbol, df, resume_from=float(
+        datetime64_to_num(np.datetime64(resume))))])
+
+    d_full, d_trimmed = full.datas[0], trimmed.datas[0]
+    assert d_full.bar_offset == 0 and d_trimmed.bar_offset == 120
+    for line in LINES:
+        np.testing.assert_array_equal(np.asarray(getattr(d_trimmed.lines, line).array),
+                                      np.asarray(getattr(d_full.lines, line).array)[120:],
+                                      err_msg=line)
+    # 完整的日期和收盘价保留在 history 中，用于核对检查点
+    for trimmed_history, full_history in zip(d_trimmed.history, d_full.history):
+        np.testing.assert_array_equal(trimmed_history, full_history)
+    np.testing.assert_array_equal(d_full.history[1], df['收盘'].to_numpy())
+
+
+def test_missing_extra_fields_are_nan():
+    df = make_kline('600000', days=30).drop(columns=['换手率'])
+    strategy = _run([_array_feed('600000', df)])
+
+    d = strategy.datas[0]
+    assert np.isnan(np.asarray(d.turnover.array)).all()
+    assert np.isnan(np.asarray(d.float_mktcap.array)).all()
+    np.testing.assert_array_equal(np.asarray(d.close.array), df['收盘'].to_numpy())
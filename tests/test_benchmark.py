@@ -0,0 +1,42 @@
+import json
+
+import benchmark
+
+
+def _result(median, checks=None, **params):
+    result = {'name': 'kernels', 'params': {'symbols': 10, 'days': 500, **params},
+              'repeat': 1, 'min': median, 'median': median, 'mean': median, 'max': median}
+    if checks is not None:
+        result['checks'] = checks
+    return result
+
+
+def test_checks_are_kept_out_of_params(capsys):
+    result = benchmark.summarize('kernels', [0.02, 0.01], symbols=10, days=500,
+                                 checks={'identical': False, 'mean_reversion_identical': True})
+
+    assert result['params'] == {'symbols': 10, 'days': 500}
+    assert result['checks'] == {'identical': False, 'mean_reversion_identical': True}
+    assert '检查未通过: identical' in capsys.readouterr().out
+    assert 'checks' not in benchmark.summarize('feed', [0.01], symbols=10)
+
+
+def test_compare_matches_baseline_when_checks_fail(tmp_path, capsys):
+    baseline = tmp_path / 'old.json'
+    baseline.write_text(json.dumps({'commit': 'abc', 'results': [
+        _result(0.010, checks={'identical': True}),
+        # 旧格式：检查结果写在 params 中
+        {**_result(0.020, identical=True), 'name': 'incremental'},
+    ]}), encoding='utf-8')
+    capsys.readouterr()
+
+    benchmark.compare([
+        _result(0.030, checks={'identical': False}),
+        {**_result(0.020, checks={'identical': True}), 'name': 'incremental'},
+    ], str(baseline))
+
+    lines = capsys.readouterr().out.splitlines()
+    kernels, = [line for line in lines if line.startswith('kernels')]
+    assert '(x3.00)' in kernels and '变慢' in kernels and '检查未通过: identical' in kernels
+    incremental, = [line for line in lines if line.startswith('incremental')]
+    assert '(x1.00)' in incremental and '检查未通过' not in incremental
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import kline_store
+from backtest_strategy import benchmark_equity, equal_weight_close
+
+
+def _series(values):
+    return pd.Series(list(values.values()), index=pd.to_datetime(list(values.keys())))
+
+
+INDEX_CLOSE = _series({
+    '2025-01-02': 100.0, '2025-01-03': 110.0, '2025-01-06': 121.0,
+    # 01-07 指数缺数据，01-09 回测没有这一天
+    '2025-01-08': 133.1, '2025-01-09': 99.0,
+})
+STRATEGY_DATES = pd.to_datetime(['2024-12-31', '2025-01-02', '2025-01-06', '2025-01-07',
+                                 '2025-01-08', '2025-01-10'])
+
+
+def test_benchmark_equity_aligns_on_union():
+    bench = benchmark_equity(INDEX_CLOSE, STRATEGY_DATES, 1000)
+
+    assert bench.index.equals(STRATEGY_DATES)
+    # 早于指数数据的时点和指数第一天净值为初始资金；缺失的日期沿用最近的收盘价；
+    # 回测跳过的 01-03、01-09 的涨跌计入下一个回测时点
+    np.testing.assert_allclose(bench.to_numpy(), [1000, 1000, 1210, 1210, 1331, 990])
+
+
+def test_benchmark_equity_drops_duplicate_and_unsorted_dates():
+    close = pd.concat([INDEX_CLOSE.iloc[::-1], _series({'2025-01-08': 133.1})])
+    np.testing.assert_allclose(benchmark_equity(close, STRATEGY_DATES, 1000).to_numpy(),
+                               [1000, 1000, 1210, 1210, 1331, 990])
+
+
+def test_equal_weight_close():
+    closes = {
+        '600000': _series({'2025-01-02': 10.0, '2025-01-03': 11.0, '2025-01-06': 12.1}),
+        # 晚一天上市：第一天只有 600000 的收益
+        '600001': _series({'2025-01-03': 20.0, '2025-01-06': 21.0}),
+    }
+    np.testing.assert_allclose(equal_weight_close(closes).to_numpy(),
+                               [1.0, 1.1, 1.1 * (1 + (0.1 + 0.05) / 2)])
+
+
+@pytest.fixture
+def main():
+    pytest.importorskip('fastapi')
+    import main
+    return main
+
+
+CLOSES = {
+    '600000': _series({'2025-01-02': 10.0, '2025-01-06': 11.0, '2025-01-08': 12.1}),
+    '600001': _series({'2025-01-02': 20.0, '2025-01-06': 18.0, '2025-01-08': 18.0}),
+}
+STRATEGY = pd.Series([1000.0, 1010.0, 1020.0],
+                     index=pd.to_datetime(['2025-01-02', '2025-01-06', '2025-01-08']))
+
+
+def test_build_equity_curve_uses_index(main, monkeypatch):
+    loaded = []
+
+    def load_index_close(code, start_date=None, end_date=None):
+        loaded.append(code)
+        return INDEX_CLOSE
+
+    monkeypatch.setattr(kline_store, 'load_index_close', load_index_close)
+
+    curve, name = main.build_equity_curve(STRATEGY, CLOSES, 1000, benchmark='hs300')
+
+    assert loaded == ['hs300'] and name == '000300'
+    assert [p.date for p in curve] == ['2025-01-02', '2025-01-06', '2025-01-08']
+    assert [p.strategy for p in curve] == STRATEGY.tolist()
+    np.testing.assert_allclose([p.benchmark for p in curve], [1000, 1210, 1331])
+
+
+def test_build_equity_curve_falls_back_to_equal_weight(main, monkeypatch):
+    monkeypatch.setattr(kline_store, 'load_index_close', lambda *args, **kwargs: None)
+
+    curve, name = main.build_equity_curve(STRATEGY, CLOSES, 1000)
+
+    assert name == 'equal_weight'
+    # 01-06: (+10% - 10%) / 2 = 0；01-08: (+10% + 0) / 2 = 5%
+    np.testing.assert_allclose([p.benchmark for p in curve], [1000, 1000, 1050])
+
+
+def test_build_equity_curve_intraday_labels(main, monkeypatch):
+    monkeypatch.setattr(kline_store, 'load_index_close', lambda *args, **kwargs: None)
+    strategy = pd.Series([1000.0, 1001.0],
+                         index=pd.to_datetime(['2025-01-06 14:50', '2025-01-08 14:50']))
+
+    curve, _ = main.build_equity_curve(strategy, CLOSES, 1000)
+
+    assert [p.date for p in curve] == ['2025-01-06 14:50', '2025-01-08 14:50']
+    assert main.build_equity_curve(strategy.iloc[:0], CLOSES, 1000) == ([], None)
@@ -0,0 +1,97 @@
+import os
+from datetime import date
+
+import backtrader as bt
+import numpy as np
+import pytest
+
+import checkpoint
+from backtest_strategy import TrackedMAVolumeStrategy, dataframe_to_backtrader
+from benchmark import make_kline
+
+SYMBOLS = ['600000', '600001', '600002', '600003']
+ANALYZERS = [
+    ('trades', bt.analyzers.TradeAnalyzer, {}),
+    ('drawdown', bt.analyzers.DrawDown, {}),
+    ('returns', bt.analyzers.TimeReturn, {}),
+    ('sqn', bt.analyzers.SQN, {}),
+]
+
+
+class Interrupted(Exception):
+    pass
+
+
+class KillableStrategy(TrackedMAVolumeStrategy):
+    """运行到 kill_on 这一天时中断（模拟进程退出，stop() 不会执行）
+
+    kill_on 不是策略参数，不进入检查点的任务签名，续跑时清空即可
+    """
+
+    kill_on = None
+
+    def next(self):
+        if self.datetime.date(0) == self.kill_on:
+            raise Interrupted
+        super().next()
+
+
+@pytest.fixture(scope='module')
+def frames():
+    return [(s, make_kline(s, days=300, seed=i)) for i, s in enumerate(SYMBOLS)]
+
+
+def _run(frames, path=None, every=20):
+    cerebro = bt.Cerebro()
+    cerebro.broker.setcash(100000)
+    cerebro.broker.setcommission(commission=0.001)
+    datas = [dataframe_to_backtrader(df, symbol, date_col='日期') for symbol, df in frames]
+    for data in datas:
+        cerebro.adddata(data)
+    if path:
+        checkpoint.trim_feeds(datas, path)
+    cerebro.addstrategy(KillableStrategy, checkpoint=path, checkpoint_every=every)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
+    for name, analyzer, params in ANALYZERS:
+        cerebro.addanalyzer(analyzer, _name=name, **params)
+    return cerebro.run()[0]
+
+
+def _analysis(strategy):
+    return {name: strategy.analyzers.getbyname(name).get_analysis() for name, _, _ in ANALYZERS}
+
+
+def _assert_same_columns(a, b):
+    a, b = a.columns(), b.columns()
+    assert a.keys() == b.keys()
+    for name in a:
+        np.testing.assert_array_equal(a[name], b[name], err_msg=name)
+
+
+def test_resume_after_interrupt_matches_full_run(frames, tmp_path, capsys, monkeypatch):
+    path = str(tmp_path / 'run.ckpt')
+    full = _run(frames)
+
+    monkeypatch.setattr(KillableStrategy, 'kill_on', date(2025, 7, 23))
+    with pytest.raises(Interrupted):
+        # 策略次日开盘卖出，逐bar保存检查点，中断前最后一个检查点上持有仓位
+        _run(frames, path=path, every=1)
+    assert os.path.exists(path)
+    state = checkpoint.load(path)
+    assert state['date'] == '2025-07-22'
+    assert state['trades'] and any(pos['size'] for _, pos in state['positions'])
+
+    monkeypatch.setattr(KillableStrategy, 'kill_on', None)
+    resumed = _run(frames, path=path, every=1)
+
+    assert f"从 {path} 继续回测" in capsys.readouterr().out
+    # 续跑时数据源只载入检查点前的均线窗口
+    assert all(d.bar_offset > 0 for d in resumed.datas)
+    assert not os.path.exists(path)
+
+    assert len(full.fills) > 0
+    assert resumed.broker.getvalue() == full.broker.getvalue()
+    assert resumed.broker.getcash() == full.broker.getcash()
+    _assert_same_columns(resumed.fills, full.fills)
+    _assert_same_columns(resumed.equity, full.equity)
+    assert _analysis(resumed) == _analysis(full)
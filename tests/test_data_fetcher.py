@@ -0,0 +1,68 @@
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import data_fetcher
+import kline_store
+import precompute
+
+
+def _hist(days=30):
+    dates = pd.bdate_range('2024-01-02', periods=days)
+    close = 10 + pd.Series(range(days), dtype=float) * 0.1
+    return pd.DataFrame({
+        '日期': dates.strftime('%Y-%m-%d'),
+        '开盘': close, '收盘': close, '最高': close + 0.1, '最低': close - 0.1,
+        '成交量': 1000.0, '成交额': close * 100000, '涨跌幅': 1.0, '换手率': 2.0,
+    })
+
+
+def _use_store(tmp_path, monkeypatch, last_close):
+    monkeypatch.setattr(kline_store, 'KLINE_DIR', str(tmp_path))
+    monkeypatch.setattr(precompute, 'last_close', lambda now=None: last_close)
+    calls = []
+
+    def live(symbol, **kwargs):
+        calls.append(symbol)
+        return _hist()
+
+    monkeypatch.setattr(data_fetcher, 'get_historical_data', live)
+    return calls
+
+
+def test_load_history_reads_store_synced_after_close(tmp_path, monkeypatch):
+    calls = _use_store(tmp_path, monkeypatch, datetime.now() - timedelta(hours=1))
+    kline_store.save_kline('600000', _hist())
+
+    df, stored = data_fetcher.load_history('600000')
+
+    assert stored and calls == []
+    assert len(df) == 30 and 'float_mktcap' in df.columns
+
+
+def test_load_history_fetches_when_store_is_stale(tmp_path, monkeypatch):
+    calls = _use_store(tmp_path, monkeypatch, datetime.now() + timedelta(hours=1))
+    kline_store.save_kline('600000', _hist())
+
+    df, stored = data_fetcher.load_history('600000')
+    missing, missing_stored = data_fetcher.load_history('000001')
+
+    assert not stored and not missing_stored
+    assert calls == ['600000', '000001']
+    assert '收盘' in df.columns
+
+
+def test_iter_history_does_not_rewrite_fresh_store(tmp_path, monkeypatch):
+    calls = _use_store(tmp_path, monkeypatch, datetime.now() - timedelta(hours=1))
+    kline_store.save_kline('600000', _hist())
+    path = kline_store.kline_path('600000')
+    mtime = os.path.getmtime(path)
+
+    results = dict(data_fetcher.iter_history(['600000', '600001'], store=True))
+
+    assert calls == ['600001']
+    assert os.path.getmtime(path) == mtime
+    assert os.path.exists(kline_store.kline_path('600001'))
+    # 两种来源都转成同样的紧凑字段
+    assert list(results['600000'].columns) == list(results['600001'].columns)
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from data_provider import DataProvider, RecordingProvider, ReplayMissError, ReplayProvider
+
+
+class _FakeLive(DataProvider):
+    mode = 'live'
+
+    def akshare(self, func_name, **kwargs):
+        return pd.DataFrame({'代码': ['000001'], 'func': [func_name]})
+
+    def get_json(self, url, headers=None, timeout=30):
+        return {'url': url}
+
+
+def test_incomplete_provider_fails_on_instantiation():
+    class OnlyAkshare(DataProvider):
+        def akshare(self, func_name, **kwargs):
+            return pd.DataFrame()
+
+    with pytest.raises(TypeError):
+        OnlyAkshare()
+
+
+def test_record_then_replay(tmp_path):
+    recorder = RecordingProvider(str(tmp_path), live=_FakeLive())
+    df = recorder.akshare('stock_zh_a_spot_em')
+    data = recorder.get_json('https://example.com/api/qt/list?fs=m:1')
+
+    replay = ReplayProvider(str(tmp_path))
+    pd.testing.assert_frame_equal(replay.akshare('stock_zh_a_spot_em'), df)
+    assert replay.get_json('https://example.com/api/qt/list?fs=m:1') == data
+
+    with pytest.raises(ReplayMissError):
+        replay.akshare('stock_zh_a_hist', symbol='000001')
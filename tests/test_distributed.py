@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+import distributed
+from task_queue import TaskQueue
+
+
+def test_shard_summary_is_labelled_approximate(tmp_path):
+    queue = TaskQueue(str(tmp_path / 'queue.db'))
+    dates = pd.bdate_range('2025-01-02', periods=3)
+    shard_returns = [pd.Series([0.01, 0.02, -0.01], index=dates),
+                     pd.Series([0.03, 0.0, 0.01], index=dates)]
+    for shard, returns in enumerate(shard_returns):
+        queue.submit('job', shard, 'shard', {})
+        task_id = queue.claim('w1')[0]
+        queue.complete(task_id, 'w1', {'shard': shard, 'symbols': [], 'metrics': {},
+                                       'returns': returns})
+
+    result = distributed.merge_shards(queue, 'job')
+
+    assert [r['shard'] for r in result['shards']] == [0, 1]
+    assert all('returns' not in r for r in result['shards'])
+    summary = result['summary']
+    assert summary['approximate'] and '近似' in summary['note']
+    # 各分片日收益率的等权平均
+    expected = (1.02 * 1.01 * 1.0) - 1
+    assert summary['total_return'] == pytest.approx(expected * 100)
@@ -0,0 +1,104 @@
+import backtrader as bt
+import numpy as np
+import pandas as pd
+import pytest
+
+import kernels
+from backtest_strategy import (MeanReversionStrategy, TrackedMAVolumeStrategy,
+                               dataframe_to_backtrader)
+from benchmark import make_kline
+
+SYMBOLS = [f'60000{i}' for i in range(6)]
+
+
+@pytest.fixture(scope='module')
+def frames():
+    # 上市日期错开：第 i 只股票去掉前 i*23 根K线，最晚的一只晚上市 115 根
+    return [(s, make_kline(s, days=400, seed=i).iloc[i * 23:].reset_index(drop=True))
+            for i, s in enumerate(SYMBOLS)]
+
+
+class RecordingMeanReversion(MeanReversionStrategy):
+    """记录成交的 MeanReversionStrategy"""
+
+    def __init__(self):
+        super().__init__()
+        self.fills = []
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.fills.append((order.data._name, order.executed.size, order.executed.price,
+                               order.executed.comm))
+
+
+def _cerebro(frames, strategy):
+    cerebro = bt.Cerebro()
+    cerebro.broker.setcash(100000)
+    cerebro.broker.setcommission(commission=0.001)
+    for symbol, df in frames:
+        cerebro.adddata(dataframe_to_backtrader(df, symbol))
+    cerebro.addstrategy(strategy)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
+    return cerebro.run()[0]
+
+
+def _positions(strategy):
+    return {d._name: float(strategy.getposition(d).size) for d in strategy.datas
+            if strategy.getposition(d).size}
+
+
+def test_ma_volume_matches_cerebro(frames):
+    strategy = _cerebro(frames, TrackedMAVolumeStrategy)
+    result = kernels.run_ma_volume(frames)
+
+    equity = strategy.equity_frame()
+    assert len(strategy.fills_frame()) > 10
+    assert result['final_value'] == strategy.broker.getvalue()
+    np.testing.assert_array_equal(result['equity'].to_numpy(), equity['value'].to_numpy())
+    np.testing.assert_array_equal(result['cash'].to_numpy(), equity['cash'].to_numpy())
+    pd.testing.assert_frame_equal(result['fills'], strategy.fills_frame(), check_exact=True,
+                                  check_dtype=False)
+    assert result['positions'] == _positions(strategy)
+
+
+def test_mean_reversion_matches_cerebro(frames):
+    strategy = _cerebro(frames, RecordingMeanReversion)
+    result = kernels.run_mean_reversion(frames)
+
+    fills = result['fills']
+    assert len(strategy.fills) > 10
+    assert result['final_value'] == strategy.broker.getvalue()
+    assert float(result['cash'].iloc[-1]) == strategy.broker.getcash()
+    assert list(zip(fills['symbol'], fills['size'], fills['price'], fills['commission'])) == \
+        strategy.fills
+    assert result['positions'] == _positions(strategy)
+
+
+def test_mean_reversion_waits_for_every_feed(frames):
+    # backtrader 在所有股票的布林带窗口形成之前不调用 next，内核同样不交易
+    result = kernels.run_mean_reversion(frames)
+    last_listed = pd.Timestamp(frames[-1][1]['日期'].iloc[0])
+    window_ready = pd.bdate_range(last_listed, periods=20)[-1]
+
+    assert len(result['fills']) > 0
+    assert result['orders']['created'].min() >= window_ready
+
+
+@pytest.mark.parametrize('period', [1, 5, 20])
+def test_rolling_mean_and_std_match_pandas(period):
+    rng = np.random.default_rng(period)
+    values = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, 300))), 2)
+    series = pd.Series(values)
+
+    np.testing.assert_allclose(kernels.rolling_mean(values, period),
+                               series.rolling(period).mean().to_numpy(), rtol=1e-12)
+    # 总体标准差（ddof=0），与 bt.indicators.StandardDeviation 相同
+    np.testing.assert_allclose(kernels.rolling_std(values, period),
+                               series.rolling(period).std(ddof=0).to_numpy(),
+                               rtol=1e-6, atol=1e-9)
+
+
+def test_rolling_short_input():
+    assert np.isnan(kernels.rolling_mean([1.0, 2.0], 3)).all()
+    assert np.isnan(kernels.rolling_std([1.0, 2.0], 3)).all()
+    np.testing.assert_array_equal(kernels.rolling_mean([1.0, 2.0, 3.0], 3), [np.nan, np.nan, 2.0])
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import kline_store
+import minute_store
+import screen_backtest
+
+DAYS = ['2025-01-27', '2025-01-28', '2025-01-31', '2025-02-05', '2025-02-06']
+TIMES = ['09:30', '09:31', '10:15', '13:01', '14:49', '14:50', '14:51', '14:57', '15:00']
+
+
+def _minutes(days, seed):
+    """ak.stock_zh_a_hist_min_em 格式的分钟K线"""
+    rng = np.random.default_rng(seed)
+    times = pd.to_datetime([f'{day} {t}' for day in days for t in TIMES])
+    close = np.round(10 + rng.normal(0, 0.1, len(times)).cumsum(), 2)
+    return pd.DataFrame({
+        '时间': times.strftime('%Y-%m-%d %H:%M:%S'),
+        '开盘': np.round(close + rng.normal(0, 0.02, len(times)), 2),
+        '收盘': close,
+        '最高': np.round(close + 0.05, 2),
+        '最低': np.round(close - 0.05, 2),
+        '成交量': rng.integers(100, 5000, len(times)),
+        '成交额': np.round(close * 100 * rng.integers(100, 5000, len(times)), 2),
+    })
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(minute_store, 'MINUTE_DIR', str(tmp_path / 'minute'))
+    monkeypatch.setattr(kline_store, 'KLINE_DIR', str(tmp_path / 'kline'))
+    return tmp_path
+
+
+def _save_with_merge(symbol):
+    """先保存前三天，再保存后三天（与已保存的一天重叠，新数据为准），返回最终应有的数据"""
+    first = _minutes(DAYS[:3], seed=1)
+    second = _minutes(DAYS[2:], seed=2)
+    assert minute_store.save_minutes(symbol, first) == ['2025-01']
+    assert minute_store.save_minutes(symbol, second) == ['2025-01', '2025-02']
+    return pd.concat([first[~first['时间'].str.startswith(DAYS[2])], second], ignore_index=True)
+
+
+def _expected(source, cutoff):
+    df = source.rename(columns=minute_store.MINUTE_COLUMNS)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    for field in ('open', 'high', 'low', 'close'):
+        # 存储为 float32
+        df[field] = df[field].astype('float32').astype(float)
+    df['date'] = df['datetime'].dt.normalize()
+    hour, minute = map(int, cutoff.split(':'))
+    before = df[df['datetime'].dt.hour * 60 + df['datetime'].dt.minute <= hour * 60 + minute]
+
+    day = df.groupby('date')
+    cut = before.groupby('date')
+    return pd.DataFrame({
+        'open': day['open'].first(),
+        'cutoff_price': cut['close'].last(),
+        'cutoff_high': cut['high'].max(),
+        'cutoff_low': cut['low'].min(),
+        'cutoff_volume': cut['volume'].sum(),
+        'cutoff_amount': cut['amount'].sum(),
+        'close': day['close'].last(),
+        'volume': day['volume'].sum(),
+    })
+
+
+def test_save_merges_months(stores):
+    source = _save_with_merge('600000')
+
+    assert minute_store.list_months('600000') == ['2025-01', '2025-02']
+    loaded = minute_store.load_minutes('600000')
+    assert len(loaded) == len(DAYS) * len(TIMES)
+    assert loaded['datetime'].is_monotonic_increasing
+    np.testing.assert_array_equal(loaded['close'], source['收盘'].astype('float32'))
+    np.testing.assert_array_equal(loaded['volume'], source['成交量'])
+
+
+@pytest.mark.parametrize('cutoff', ['14:50', '10:00', '15:00'])
+def test_cutoff_snapshots_match_groupby(stores, cutoff):
+    source = _save_with_merge('600000')
+
+    snap = minute_store.cutoff_snapshots('600000', cutoff)
+    expected = _expected(source, cutoff)
+
+    assert snap['date'].tolist() == list(expected.index)
+    for column in expected.columns:
+        np.testing.assert_allclose(snap[column].to_numpy(dtype=float),
+                                   expected[column].to_numpy(dtype=float), rtol=0, atol=0,
+                                   err_msg=column)
+
+
+def test_cutoff_before_open_and_date_range(stores):
+    _save_with_merge('600000')
+
+    snap = minute_store.cutoff_snapshots('600000', '09:00', start_date='2025-01-31',
+                                         end_date='2025-02-05')
+
+    assert snap['date'].dt.strftime('%Y-%m-%d').tolist() == ['2025-01-31', '2025-02-05']
+    assert snap[['cutoff_price', 'cutoff_high', 'cutoff_low']].isna().all().all()
+    assert (snap['cutoff_volume'] == 0).all()
+
+
+def _daily(days):
+    close = np.linspace(10, 11, len(days))
+    return pd.DataFrame({
+        '日期': days, '开盘': close, '收盘': close, '最高': close, '最低': close,
+        '成交量': 10000.0, '成交额': close * 1e6, '涨跌幅': 1.0, '换手率': 2.0,
+    })
+
+
+def test_cutoff_panel_turnover_needs_daily_store(stores):
+    _save_with_merge('600000')
+    _save_with_merge('600001')
+    kline_store.save_kline('600001', _daily(DAYS))
+
+    panel = screen_backtest.build_cutoff_panel()
+
+    assert panel.attrs['no_turnover'] == ['600000']
+    by_symbol = dict(tuple(panel.groupby('symbol')))
+    assert by_symbol['600000']['turnover'].isna().all()
+    # 流通股本取前一交易日：第一天没有，之后按截至 cutoff 的成交量计算
+    turnover = by_symbol['600001']['turnover']
+    assert np.isnan(turnover.iloc[0]) and np.isfinite(turnover.iloc[1:]).all()
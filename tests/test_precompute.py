@@ -0,0 +1,67 @@
+import glob
+import json
+import os
+import shutil
+from datetime import datetime
+
+import pytest
+
+import kline_store
+import precompute
+from benchmark import make_kline, symbol_master
+
+SYMBOLS = ['600000', '600001', '600002']
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(kline_store, 'KLINE_DIR', str(tmp_path / 'kline'))
+    monkeypatch.setattr(precompute, 'PRECOMPUTE_DIR', str(tmp_path / 'precomputed'))
+    monkeypatch.setattr(precompute, 'UNIVERSE_FILE', str(tmp_path / 'precomputed' / 'universe.json'))
+    monkeypatch.setattr(precompute, 'last_close', lambda now=None: datetime(2000, 1, 1))
+    monkeypatch.delenv('QUANT_BACKTEST_SYMBOLS', raising=False)
+    return tmp_path
+
+
+def test_fixed_universe_is_pinned(dirs, monkeypatch):
+    assert precompute.fixed_universe() == []
+    assert precompute.fixed_universe(['600519', '858']) == ['600519', '000858']
+    # 之后的筛选结果不再改变股票池
+    assert precompute.fixed_universe(['000001']) == ['600519', '000858']
+    with open(precompute.UNIVERSE_FILE, encoding='utf-8') as f:
+        assert json.load(f)['symbols'] == ['600519', '000858']
+
+    monkeypatch.setenv('QUANT_BACKTEST_SYMBOLS', '1, 600036')
+    assert precompute.fixed_universe(['000002']) == ['000001', '600036']
+
+
+def test_default_backtest_resumes_fixed_universe(dirs, capsys):
+    pytest.importorskip('fastapi')
+    import main
+
+    frames = {symbol: make_kline(symbol, days=160, seed=int(symbol)) for symbol in SYMBOLS}
+    params = {'symbols': SYMBOLS}
+
+    with symbol_master(SYMBOLS):
+        for symbol, df in frames.items():
+            kline_store.save_kline(symbol, df.iloc[:-1], merge=False)
+        precompute.default_backtest(params)
+        state_file, = glob.glob(os.path.join(precompute.PRECOMPUTE_DIR, '*.state'))
+        base_state = str(dirs / 'base.state')
+        shutil.copyfile(state_file, base_state)
+
+        # 收盘后同步一根新K线，从前一天的结束状态延长
+        for symbol, df in frames.items():
+            kline_store.save_kline(symbol, df.iloc[-1:])
+        capsys.readouterr()
+        resumed = precompute.default_backtest(params)
+        assert f"从 {state_file} 继续回测" in capsys.readouterr().out
+
+        os.remove(state_file)
+        full = precompute.default_backtest(params)
+
+    assert resumed.success and resumed.total_trades > 0
+    assert resumed.model_dump() == full.model_dump()
+    # 结果写入 /api/backtest 读取的缓存
+    key = main.BacktestRequest(**params).model_dump()
+    assert precompute.load_backtest(key)['final_value'] == full.final_value
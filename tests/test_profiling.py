@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+from profiling import Profiler, collect_spans, span, with_context
+
+
+def _work(stage):
+    with span(stage):
+        return stage
+
+
+def test_spans_from_thread_pool_are_collected():
+    with collect_spans('test') as spans:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(with_context(_work), f'worker.{i}') for i in range(3)]
+            unbound = pool.submit(_work, 'unbound')
+            for future in futures + [unbound]:
+                future.result()
+
+    stages = sorted(item['stage'] for item in spans)
+    assert stages == ['worker.0', 'worker.1', 'worker.2']
+
+
+def test_only_one_profile_at_a_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+
+    first = Profiler('first').start()
+    assert first is not None
+    try:
+        assert Profiler('second').start() is None
+    finally:
+        path = first.stop()
+
+    assert path.startswith(str(tmp_path))
+    # 前一个剖析结束后可以再次开启
+    again = Profiler('again').start()
+    assert again is not None
+    again.stop()
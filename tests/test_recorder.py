@@ -0,0 +1,115 @@
+import backtrader as bt
+import numpy as np
+import pytest
+
+from backtest_strategy import ColumnRecorder, TrackedMAVolumeStrategy, dataframe_to_backtrader
+from benchmark import make_kline
+
+
+class BrokerLog(bt.Analyzer):
+    """独立于策略记录每根bar的总资产和已成交订单"""
+
+    def start(self):
+        self.values = []
+        self.orders = []
+
+    def prenext(self):
+        self.next()
+
+    def next(self):
+        self.values.append((self.strategy.datetime[0], self.strategy.broker.getvalue(),
+                            self.strategy.broker.getcash()))
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.orders.append((order.executed.dt, order.data._name, order.executed.size,
+                                order.executed.price, order.executed.comm, order.executed.pnl))
+
+
+class SmallRecorders(TrackedMAVolumeStrategy):
+    """初始容量很小的记录器，回测中多次扩容"""
+
+    def start(self):
+        super().start()
+        self.equity = ColumnRecorder(self.EQUITY_COLUMNS, capacity=3)
+        self.fills = ColumnRecorder(self.FILL_COLUMNS, capacity=1)
+
+
+@pytest.fixture(scope='module')
+def strategy():
+    cerebro = bt.Cerebro()
+    cerebro.broker.setcash(100000)
+    cerebro.broker.setcommission(commission=0.001)
+    for i in range(3):
+        symbol = f'60000{i}'
+        cerebro.adddata(dataframe_to_backtrader(make_kline(symbol, days=250, seed=i), symbol))
+    cerebro.addstrategy(SmallRecorders)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
+    cerebro.addanalyzer(BrokerLog, _name='log')
+    return cerebro.run()[0]
+
+
+def test_column_recorder_grows_by_doubling():
+    recorder = ColumnRecorder([('a', 'f8'), ('b', 'i4')], capacity=2)
+    capacities = []
+    for i in range(9):
+        recorder.append(i * 0.5, i)
+        capacities.append(recorder.capacity)
+
+    assert capacities == [2, 2, 4, 4, 8, 8, 8, 8, 16]
+    assert len(recorder) == 9
+    columns = recorder.columns()
+    np.testing.assert_array_equal(columns['a'], np.arange(9) * 0.5)
+    assert columns['b'].dtype == np.int32 and columns['b'].tolist() == list(range(9))
+
+    recorder.reserve(4)  # 不缩容
+    assert recorder.capacity == 16
+
+
+def test_columns_are_views():
+    recorder = ColumnRecorder([('a', 'f8')], capacity=4)
+    recorder.append(1.0)
+    recorder.append(2.0)
+
+    view = recorder.columns()['a']
+    assert np.shares_memory(view, recorder._columns[0])
+    # get_state 是副本，之后写入不影响
+    state = recorder.get_state()
+    view[0] = 9.0
+    assert state['a'].tolist() == [1.0, 2.0]
+
+    restored = ColumnRecorder([('a', 'f8')], capacity=1)
+    restored.set_state(state)
+    assert restored.columns()['a'].tolist() == [1.0, 2.0] and restored.capacity >= 2
+
+
+def test_equity_matches_broker_every_bar(strategy):
+    log = strategy.analyzers.log
+
+    assert strategy.equity.capacity > 3
+    columns = strategy.equity.columns()
+    expected = np.array(log.values)
+    assert len(columns['value']) == len(expected) == len(strategy)
+    np.testing.assert_array_equal(columns['datetime'], expected[:, 0])
+    np.testing.assert_array_equal(columns['value'], expected[:, 1])
+    np.testing.assert_array_equal(columns['cash'], expected[:, 2])
+
+    frame = strategy.equity_frame()
+    assert np.shares_memory(frame['value'].to_numpy(), columns['value'])
+
+
+def test_fills_match_executed_orders(strategy):
+    orders = strategy.analyzers.log.orders
+    fills = strategy.fills_frame()
+
+    assert len(orders) > 4 and strategy.fills.capacity > 1
+    columns = strategy.fills.columns()
+    assert columns['datetime'].tolist() == [dt for dt, *_ in orders]
+    assert list(zip(fills['symbol'], fills['size'], fills['price'], fills['commission'],
+                    fills['pnl'])) == [tuple(order[1:]) for order in orders]
+    # 买入为正、卖出为负
+    assert (fills['size'] > 0).any() and (fills['size'] < 0).any()
+    # 成交价是成交当天的开盘价，而不是下单时的收盘价
+    opens = {d._name: dict(zip(d.datetime.array, d.open.array)) for d in strategy.datas}
+    for dt, symbol, price in zip(columns['datetime'], fills['symbol'], fills['price']):
+        assert price == pytest.approx(opens[symbol][dt], rel=1e-15)
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import schema
+
+
+def _spot_em():
+    """ak.stock_zh_a_spot_em 的返回格式（数值列，市值单位为元）"""
+    return pd.DataFrame({
+        '代码': ['000001', '600519', '830799'],
+        '名称': ['平安银行', '贵州茅台', '艾融软件'],
+        '最新价': [10.52, 1688.88, 31.2],
+        '涨跌幅': [2.34, -0.51, 12.5],
+        '涨跌额': [0.24, -8.66, 3.47],
+        '成交量': [1234567, 23456, 98765],
+        '成交额': [1298765432.5, 3961234567.0, 301234567.0],
+        '振幅': [3.1, 1.2, 15.6],
+        '最高': [10.6, 1699.0, 32.0],
+        '最低': [10.28, 1679.5, 27.5],
+        '今开': [10.3, 1697.0, 28.0],
+        '昨收': [10.28, 1697.54, 27.73],
+        '量比': [1.35, 0.87, 2.4],
+        '换手率': [0.64, 0.19, 8.88],
+        '市盈率-动态': [4.5, 25.3, -120.1],
+        '市净率': [0.55, 8.9, 4.2],
+        '总市值': [204150000000.0, 2121600000000.0, 6500000000.0],
+        '流通市值': [204140000000.0, 2121600000000.0, 3200000000.0],
+        '涨速': [0.1, 0.0, -0.3],
+        '5分钟涨跌': [0.2, -0.05, 1.1],
+        '60日涨跌幅': [5.6, -3.2, 40.0],
+        '年初至今涨跌幅': [10.1, -8.8, 66.6],
+    })
+
+
+def _hist(with_symbol):
+    """ak.stock_zh_a_hist 的返回格式，新版本多一列 股票代码"""
+    df = pd.DataFrame({
+        '日期': ['2024-01-02', '2024-01-03', '2024-01-04'],
+        '开盘': [9.39, 9.19, 9.11],
+        '收盘': [9.21, 9.20, 9.11],
+        '最高': [9.42, 9.22, 9.19],
+        '最低': [9.21, 9.15, 9.08],
+        '成交量': [1158366, 733610, 864420],
+        '成交额': [1075742252.48, 673673613.43, 790371480.6],
+        '振幅': [2.36, 0.76, 1.2],
+        '涨跌幅': [-1.92, -0.11, -0.98],
+        '涨跌额': [-0.18, -0.01, -0.09],
+        '换手率': [0.6, 0.38, 0.45],
+    })
+    if with_symbol:
+        df.insert(1, '股票代码', '000001')
+    return df
+
+
+def _assert_source_equal(result, expected):
+    assert list(result.columns) == list(expected.columns)
+    for column in expected.columns:
+        if not pd.api.types.is_numeric_dtype(expected[column]):
+            assert result[column].astype(str).tolist() == expected[column].tolist(), column
+        else:
+            # 整数列和 float32 价格都应还原为原始值
+            np.testing.assert_array_equal(
+                result[column].to_numpy(dtype='float64'),
+                expected[column].to_numpy(dtype='float64'), err_msg=column)
+
+
+def test_quote_round_trip():
+    source = _spot_em()
+    normalized = schema.normalize_quotes(source)
+
+    assert normalized['price'].dtype == np.float32
+    assert normalized['code'].dtype == 'category'
+    # 市值统一为亿
+    assert normalized['total_mktcap'].iloc[0] == pytest.approx(2041.5)
+
+    _assert_source_equal(schema.to_source(normalized, schema.QUOTE_FIELDS), source)
+
+
+def test_quote_percent_strings():
+    source = _spot_em()
+    source['涨跌幅'] = ['2.34%', '-0.51%', '-']
+    source['代码'] = [1, 600519, 830799]
+
+    normalized = schema.normalize_quotes(source)
+
+    assert normalized['pct'].iloc[0] == pytest.approx(2.34)
+    assert np.isnan(normalized['pct'].iloc[2])
+    assert normalized['code'].tolist() == ['000001', '600519', '830799']
+
+
+@pytest.mark.parametrize('with_symbol', [False, True])
+def test_kline_round_trip(with_symbol):
+    source = _hist(with_symbol)
+    normalized = schema.normalize_kline(source)
+
+    assert normalized['date'].dtype == np.int32
+    assert normalized['date'].tolist() == [20240102, 20240103, 20240104]
+    assert normalized['close'].dtype == np.float32
+    assert normalized['volume'].dtype == np.int64
+
+    _assert_source_equal(schema.to_source(normalized, schema.KLINE_FIELDS), source)
+
+
+def test_kline_datetime_dates_and_symbol_constant():
+    source = _hist(False)
+    source['日期'] = pd.to_datetime(source['日期'])
+
+    normalized = schema.normalize_kline(source, symbol='1')
+
+    assert normalized['date'].tolist() == [20240102, 20240103, 20240104]
+    assert normalized['symbol'].astype(str).unique().tolist() == ['000001']
+
+
+def test_normalize_canonical_columns_from_csv(tmp_path):
+    # historical_data.csv 保存的是规范字段，读回后（没有 attrs）再次规范化结果不变
+    normalized = schema.normalize_kline(_hist(False), symbol='000001')
+    path = tmp_path / 'historical_data.csv'
+    normalized.to_csv(path, index=False)
+
+    again = schema.normalize_kline(pd.read_csv(path, dtype={'symbol': str}))
+
+    for column in normalized.columns:
+        assert again[column].dtype == normalized[column].dtype, column
+        assert again[column].astype(str).tolist() == normalized[column].astype(str).tolist()
+    assert schema.normalize_kline(normalized) is normalized
+
+
+def test_out_of_range_values_are_cleared():
+    source = _spot_em()
+    source['换手率'] = [0.64, 150.0, 8.88]
+    source['成交量'] = [1234567, -1, 98765]
+
+    normalized = schema.normalize_quotes(source)
+
+    assert np.isnan(normalized['turnover'].iloc[1])
+    assert normalized['volume'].iloc[1] == 0
+    assert normalized.attrs['invalid'] == {'turnover': 1, 'volume': 1}
+
+
+def test_float32_prices_restore_every_tick():
+    # 0.01 ~ 9999.99 的每个两位小数价格，以及 1 万 ~ 10 万之间的随机价格，存为 float32 后都能精确还原
+    rng = np.random.default_rng(0)
+    prices = np.round(np.concatenate([
+        np.arange(1, 1_000_000), rng.integers(1_000_000, 10_000_000, 200_000)]) / 100, 2)
+    stored = pd.Series(prices.astype('float32'))
+
+    restored = schema.to_source(pd.DataFrame({'close': stored}), schema.KLINE_FIELDS)['收盘']
+
+    np.testing.assert_array_equal(restored.to_numpy(), prices)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from screen_backtest import allocate_slots, run_screen_backtest, select_top_n
+
+DATES = pd.to_datetime(['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'])
+
+
+def _row(date, symbol, close, next_open, next_date, qualified=True):
+    return {
+        'date': date, 'symbol': symbol,
+        'open': close, 'close': close, 'volume': 1000.0,
+        'pct': 3.0 if qualified else 0.0,
+        'turnover': 5.0, 'vol_ratio': 2.0,
+        'next_open': next_open, 'next_date': next_date,
+    }
+
+
+def test_select_top_n_picks_highest_scores_per_row():
+    mask = pd.DataFrame([[True, True, True], [True, False, False], [False, False, False]])
+    score = pd.DataFrame([[1.0, 3.0, 2.0], [5.0, 9.0, np.nan], [1.0, 1.0, 1.0]])
+
+    rows, cols = select_top_n(mask, score, top_n=2)
+
+    picked = sorted(zip(rows.tolist(), cols.tolist()))
+    # 第 0 行取 score 最高的两只，第 1 行只有一只候选，第 2 行没有候选
+    assert picked == [(0, 1), (0, 2), (1, 0)]
+
+
+def test_select_top_n_empty_panel():
+    mask = pd.DataFrame(np.zeros((3, 0), dtype=bool))
+    score = pd.DataFrame(np.zeros((3, 0)))
+
+    rows, cols = select_top_n(mask, score, top_n=10)
+
+    assert len(rows) == 0 and len(cols) == 0
+
+
+def test_allocate_slots_holds_slot_until_exit():
+    rows = np.array([0, 0, 0, 1, 2, 2])
+    exit_rows = np.array([1, 3, 2, 2, 3, 3])
+    score = np.array([3.0, 2.0, 1.0, 1.0, 2.0, 1.0])
+
+    keep = allocate_slots(rows, exit_rows, score, top_n=2)
+
+    # 第 0 天只有两份资金，score 最低的放弃；
+    # 第 1 天开盘卖出的份额当天收盘可再买入；第 2 天只空出一份，给 score 高的
+    assert keep.tolist() == [True, True, False, True, True, False]
+
+
+def test_allocate_slots_suspended_trade_blocks_later_entries():
+    # 第 0 天买入后停牌到第 3 天，期间的候选都没有空闲份额
+    rows = np.array([0, 1, 2, 3])
+    exit_rows = np.array([3, 2, 3, 4])
+    score = np.ones(4)
+
+    keep = allocate_slots(rows, exit_rows, score, top_n=1)
+
+    assert keep.tolist() == [True, False, False, True]
+
+
+def test_run_screen_backtest_books_return_on_exit_date():
+    d0, d1, d2, d3 = DATES
+    panel = pd.DataFrame([
+        # A 在 d0 入选，d1 停牌，d2 复牌开盘卖出
+        _row(d0, '000001', 10.0, 11.0, d2),
+        _row(d2, '000001', 11.0, 11.0, d3, qualified=False),
+        _row(d3, '000001', 11.0, np.nan, pd.NaT, qualified=False),
+        # B 在 d1 入选，但唯一的份额被停牌中的 A 占用
+        _row(d0, '000002', 20.0, 20.0, d1, qualified=False),
+        _row(d1, '000002', 20.0, 21.0, d2),
+        _row(d2, '000002', 21.0, 21.0, d3, qualified=False),
+        _row(d3, '000002', 21.0, np.nan, pd.NaT, qualified=False),
+    ])
+
+    result = run_screen_backtest(panel, top_n=1, initial_cash=100000,
+                                 position_pct=1.0, commission=0.0)
+
+    trades = result['trades']
+    assert trades['symbol'].tolist() == ['000001']
+    assert trades['exit_date'].tolist() == [d2]
+
+    equity = result['equity']
+    # 收益只记在卖出日 d2，之前的权益不变
+    assert equity.loc[d0] == 100000
+    assert equity.loc[d1] == 100000
+    assert np.isclose(equity.loc[d2], 110000)
+    assert np.isclose(equity.loc[d3], 110000)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+import symbols
+
+
+@pytest.mark.parametrize('code, exchange, board, secid', [
+    ('600000', 'SH', '主板', '1.600000'),
+    ('605499', 'SH', '主板', '1.605499'),
+    ('688981', 'SH', '科创板', '1.688981'),
+    ('689009', 'SH', '科创板', '1.689009'),
+    ('000001', 'SZ', '主板', '0.000001'),
+    ('002594', 'SZ', '主板', '0.002594'),
+    ('300750', 'SZ', '创业板', '0.300750'),
+    ('301236', 'SZ', '创业板', '0.301236'),
+    # 北交所：920 新号段和 43/83/87/88 老号段都是 secid 0，不能按 9/8 开头猜成上交所
+    ('920001', 'BJ', '北交所', '0.920001'),
+    ('430047', 'BJ', '北交所', '0.430047'),
+    ('830799', 'BJ', '北交所', '0.830799'),
+    ('871981', 'BJ', '北交所', '0.871981'),
+    ('889999', 'BJ', '北交所', '0.889999'),
+])
+def test_classify_and_secid(code, exchange, board, secid):
+    assert symbols.classify(code) == (exchange, board)
+    assert symbols.secid(code) == secid
+
+
+def test_classify_pads_codes_and_rejects_unknown_prefixes():
+    assert symbols.classify(1) == ('SZ', '主板')
+    assert symbols.classify('900901') == (None, None)  # 沪市B股
+    assert symbols.classify('200002') == (None, None)  # 深市B股
+    # 未知号段沿用旧规则
+    assert symbols.market_code('900901') == '1'
+    assert symbols.market_code('200002') == '0'
+
+
+def _master(rows):
+    records = np.zeros(len(rows), dtype=symbols.SYMBOL_DTYPE)
+    records['code'] = [code for code, _ in rows]
+    records['name'] = [name for _, name in rows]
+    boards = [symbols.classify(code) for code, _ in rows]
+    records['exchange'] = [exchange or '' for exchange, _ in boards]
+    records['board'] = [board or '' for _, board in boards]
+    records['list_date'] = 20100101
+    return symbols.SymbolMaster(records)
+
+
+MASTER_ROWS = [
+    ('000001', '平安银行'),
+    ('000002', '万科Ａ'),
+    ('300750', '宁德时代'),
+    ('600000', '浦发银行'),
+    ('600036', '招商银行'),
+    ('600519', '贵州茅台'),
+    ('920001', '纬达光电'),
+]
+
+
+def test_get_and_name():
+    master = _master(MASTER_ROWS)
+
+    assert master.get(1) == {'code': '000001', 'name': '平安银行', 'exchange': 'SZ',
+                             'board': '主板', 'list_date': 20100101}
+    assert master.get('999999') is None
+    assert master.name('600519') == '贵州茅台'
+    assert '920001' in master and '430001' not in master
+
+
+def test_search_by_code_prefix():
+    master = _master(MASTER_ROWS)
+
+    assert [r['code'] for r in master.search('6000')] == ['600000', '600036']
+    assert [r['code'] for r in master.search('60', limit=2)] == ['600000', '600036']
+    assert master.search('601') == []
+    assert master.search('  ') == []
+
+
+def test_search_by_name_prefix():
+    master = _master(MASTER_ROWS)
+
+    assert [r['code'] for r in master.search('平安')] == ['000001']
+    assert sorted(r['code'] for r in master.search('招商')) == ['600036']
+    assert master.search('不存在') == []
+
+
+def test_universe_uses_master(monkeypatch):
+    monkeypatch.setattr(symbols, '_master', _master(MASTER_ROWS))
+
+    # 主表中没有的代码（已退市、B股）被丢弃，重复代码只保留一次
+    assert symbols.universe(['600519', '1', '900901', '600000', '600519', '601999']) == \
+        ['600519', '000001', '600000']
+
+
+def test_universe_falls_back_to_prefixes(monkeypatch):
+    def unavailable(refresh=False):
+        raise OSError('offline')
+
+    monkeypatch.setattr(symbols, 'load', unavailable)
+
+    assert symbols.universe(['600519', '900901', '830799', '200002']) == ['600519', '830799']
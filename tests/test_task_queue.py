@@ -0,0 +1,93 @@
+import pytest
+
+from task_queue import TaskQueue, PENDING, RUNNING, DONE, FAILED
+
+# 租约为负数时领取后立即过期，模拟 worker 失联
+EXPIRED = -1
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return TaskQueue(str(tmp_path / 'queue.db'))
+
+
+def _submit(queue, max_attempts=3):
+    assert queue.submit('job', 'k1', 'sweep', {'n': 1}, max_attempts=max_attempts)
+    assert not queue.submit('job', 'k1', 'sweep', {'n': 2})
+
+
+def test_expired_lease_is_reclaimed(queue):
+    _submit(queue)
+
+    task_id, job, key, kind, payload = queue.claim('w1', lease_seconds=EXPIRED)
+    assert (job, key, kind, payload) == ('job', 'k1', 'sweep', {'n': 1})
+
+    # 租约过期后被其他 worker 接管，原 worker 不能再续约
+    assert queue.claim('w2')[0] == task_id
+    assert not queue.heartbeat(task_id, 'w1')
+    assert queue.heartbeat(task_id, 'w2')
+    # 租约有效时不会被重复领取
+    assert queue.claim('w3') is None
+    assert queue.counts('job')[RUNNING] == 1
+
+
+def test_max_attempts_marks_failed(queue):
+    _submit(queue, max_attempts=2)
+
+    task_id = queue.claim('w1')[0]
+    queue.fail(task_id, 'w1', ValueError('bad data'))
+    assert queue.counts('job')[PENDING] == 1
+
+    # 第二次尝试租约过期，重试次数用完，下一次领取时标记为失败
+    assert queue.claim('w2', lease_seconds=EXPIRED)[0] == task_id
+    assert queue.claim('w3') is None
+    assert queue.counts('job')[FAILED] == 1
+    assert queue.failures('job') == {'k1': 'bad data'}
+
+    assert queue.retry_failed('job') == 1
+    assert queue.claim('w3')[0] == task_id
+
+
+def test_fail_after_max_attempts(queue):
+    _submit(queue, max_attempts=1)
+
+    task_id = queue.claim('w1')[0]
+    queue.fail(task_id, 'w1', 'boom')
+
+    assert queue.counts('job')[FAILED] == 1
+    assert queue.claim('w2') is None
+
+
+def test_first_result_wins(queue):
+    _submit(queue)
+
+    task_id = queue.claim('w1', lease_seconds=EXPIRED)[0]
+    assert queue.claim('w2')[0] == task_id
+
+    # 失联的 w1 先提交，w2 的结果被忽略
+    assert queue.complete(task_id, 'w1', 'first')
+    assert not queue.complete(task_id, 'w2', 'second')
+    # 已完成的任务，执行中的 worker 报错也不会改变状态
+    queue.fail(task_id, 'w2', 'late error')
+
+    assert queue.results('job') == {'k1': 'first'}
+    assert queue.counts('job')[DONE] == 1
+
+
+def test_late_result_for_failed_task_is_rejected(queue):
+    _submit(queue, max_attempts=1)
+
+    task_id = queue.claim('w1', lease_seconds=EXPIRED)[0]
+    assert queue.claim('w2') is None
+    assert queue.counts('job')[FAILED] == 1
+
+    # 失败已汇报给协调者，之后到达的结果不改变状态
+    assert not queue.complete(task_id, 'w1', 'late')
+    assert queue.results('job') == {}
+    assert queue.failures('job') == {'k1': 'worker 租约过期'}
+
+    # 重新放回队列后才接受结果
+    queue.retry_failed('job')
+    assert queue.claim('w2')[0] == task_id
+    assert queue.complete(task_id, 'w2', 'retried')
+    assert queue.results('job') == {'k1': 'retried'}
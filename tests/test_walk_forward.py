@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+import walk_forward
+from benchmark import make_kline
+
+SYMBOLS = ['600000', '600001', '600002', '600003']
+GRID = {'pct_min': [1.0, 2.0], 'turnover_max': [10.0, 12.0]}
+
+
+@pytest.fixture(scope='module')
+def frames():
+    raw = {}
+    for i, symbol in enumerate(SYMBOLS):
+        df = make_kline(symbol, days=300, seed=i)
+        # 上市日期错开，覆盖窗口中途才有K线的股票
+        raw[symbol] = df.iloc[i * 30:].reset_index(drop=True)
+    return walk_forward.prepare_frames(raw)
+
+
+@pytest.fixture(scope='module')
+def window(frames):
+    dates = walk_forward.trading_dates(frames)
+    return dates[0], dates[100], dates[-1]
+
+
+@pytest.mark.parametrize('params', [{}, {'pct_min': 1.0, 'turnover_max': 12.0}])
+def test_evaluate_window_engines_agree(frames, window, params):
+    kernel_returns, kernel_metrics = walk_forward.evaluate_window(
+        frames, params, *window, engine='kernel')
+    cerebro_returns, cerebro_metrics = walk_forward.evaluate_window(
+        frames, params, *window, engine='cerebro')
+
+    assert cerebro_metrics['days'] > 0 and cerebro_metrics['total_return'] != 0
+    assert kernel_metrics == cerebro_metrics
+    pd.testing.assert_series_equal(kernel_returns, cerebro_returns, check_names=False,
+                                   check_exact=True)
+
+
+def test_optimize_window_engines_agree(frames, window):
+    kernel = walk_forward.optimize_window(frames, GRID, *window, engine='kernel')
+    cerebro = walk_forward.optimize_window(frames, GRID, *window, engine='cerebro')
+
+    assert kernel == cerebro
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+滚动窗口（Walk-Forward）回测
+
+把历史数据切分成连续的 训练窗口 + 测试窗口:
+1. 在训练窗口上对 MAVolumeStrategy 做参数网格寻优
+2. 用最优参数在紧随其后的测试窗口上做样本外回测
+3. 窗口向前滚动 test_days 个交易日，重复以上步骤
+
+各窗口之间互不依赖，使用多进程并行执行，最后汇总所有测试窗口的样本外指标。
+"""
+
+import os
+import sys
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import backtrader as bt
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import kernels
+from backtest_strategy import MAVolumeStrategy, dataframe_to_backtrader, returns_metrics
+
+# 默认参数网格
+DEFAULT_PARAM_GRID = {
+    'ma_short': [3, 5],
+    'ma_mid': [10, 15],
+    'ma_long': [20, 30],
+    'pct_min': [1.0, 2.0],
+}
+
+# 子进程中共享的K线数据（由 _init_worker 设置，避免每个任务重复传输）
+_WORKER_FRAMES = None
+
+
+def split_windows(dates, train_days=250, test_days=60, step_days=None):
+    """
+    按交易日切分滚动窗口
+
+    Args:
+        dates: 升序排列的交易日列表
+        train_days: 训练窗口长度（交易日）
+        test_days: 测试窗口长度（交易日）
+        step_days: 滚动步长，默认等于 test_days
+
+    Returns:
+        [(train_start_idx, test_start_idx, test_end_idx), ...]，均为 dates 中的下标，
+        test_end_idx 为闭区间
+    """
+    step_days = step_days or test_days
+    windows = []
+    start = 0
+    while start + train_days + test_days <= len(dates):
+        test_start = start + train_days
+        windows.append((start, test_start, test_start + test_days - 1))
+        start += step_days
+    return windows
+
+
+def _param_combinations(param_grid):
+    """展开参数网格，剔除均线周期不递增的组合"""
+    keys = list(param_grid.keys())
+    combos = []
+    for values in itertools.product(*(param_grid[k] for k in keys)):
+        params = dict(zip(keys, values))
+        ma_short = params.get('ma_short', MAVolumeStrategy.params.ma_short)
+        ma_mid = params.get('ma_mid', MAVolumeStrategy.params.ma_mid)
+        ma_long = params.get('ma_long', MAVolumeStrategy.params.ma_long)
+        if ma_short < ma_mid < ma_long:
+            combos.append(params)
+    return combos
+
+
+def _window_frames(frames, start, end):
+    """[start, end] 区间内K线足够（多于20根）的股票 [(symbol, df_slice)]"""
+    window = []
+    for symbol, df in frames.items():
+        df_slice = df[(df['日期'] >= start) & (df['日期'] <= end)]
+        if len(df_slice) > 20:
+            window.append((symbol, df_slice))
+    return window
+
+
+def _build_cerebro(frames, start, end, initial_cash):
+    """用 [start, end] 区间内的数据构建 Cerebro"""
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.setcash(initial_cash)
+    cerebro.broker.setcommission(commission=0.001)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=95)
+
+    for symbol, df_slice in _window_frames(frames, start, end):
+        data = dataframe_to_backtrader(df_slice, symbol, date_col='日期')
+        if data is not None:
+            cerebro.adddata(data)
+
+    cerebro.addanalyzer(bt.analyzers.TimeReturn, _name='timereturn',
+                        timeframe=bt.TimeFrame.Days)
+    return cerebro
+
+
+def _window_returns(strat, trade_start):
+    """取出交易开始日之后的日收益率序列"""
+    returns = pd.Series(strat.analyzers.timereturn.get_analysis(), dtype=float)
+    if returns.empty:
+        return returns
+    returns.index = pd.to_datetime(returns.index)
+    return returns[returns.index >= pd.Timestamp(trade_start)]
+
+
+def _kernel_returns(result, initial_cash, trade_start):
+    """内核权益曲线 -> 与 TimeReturn 相同的日收益率序列"""
+    equity = result['equity']
+    returns = equity / equity.shift(1, fill_value=initial_cash) - 1.0
+    return returns[returns.index >= pd.Timestamp(trade_start)]
+
+
+def _score(metrics, objective):
+    """参数寻优目标函数"""
+    if objective == 'sharpe':
+        sharpe = metrics['sharpe_ratio']
+        return sharpe if sharpe is not None else float('-inf')
+    return metrics['total_return']
+
+
+def optimize_window(frames, param_grid, warmup_start, train_start, train_end,
+                    initial_cash=100000, objective='sharpe', engine='auto'):
+    """
+    在训练窗口上寻找最优参数
+
+    engine:
+    - cerebro: 使用 optstrategy 让同一份数据只加载一次，顺序运行所有参数组合
+    - kernel:  使用 kernels 的数组内核（结果与 cerebro 一致），K线面板只构建一次
+    - auto:    安装了 numba 时使用 kernel，否则使用 cerebro
+
+    Returns:
+        (best_params, best_metrics)
+    """
+    combos = _param_combinations(param_grid)
+    if not combos:
+        return {}, returns_metrics(None)
+
+    if engine == 'auto':
+        engine = 'kernel' if kernels.HAS_NUMBA else 'cerebro'
+
+    if engine == 'kernel':
+        window = _window_frames(frames, warmup_start, train_end)
+        if not window:
+            return {}, returns_metrics(None)
+        panel = kernels.panel_from_frames(window)
+        runs = []
+        for params in combos:
+            result = kernels.run_ma_volume(None, initial_cash, panel=panel,
+                                           trade_start=train_start.date(), **params)
+            runs.append((params, _kernel_returns(result, initial_cash, train_start)))
+    else:
+        cerebro = _build_cerebro(frames, warmup_start, train_end, initial_cash)
+        if not cerebro.datas:
+            return {}, returns_metrics(None)
+
+        # optstrategy 需要每个参数传一个可迭代对象，这里用组合下标展开
+        cerebro.optstrategy(
+            _GridStrategy,
+            combo=range(len(combos)),
+            combos=[combos],
+            trade_start=[train_start.date()],
+            printlog=[False],
+        )
+        runs = [(combos[run[0].params.combo], _window_returns(run[0], train_start))
+                for run in cerebro.run(maxcpus=1, optreturn=True)]
+
+    best_params, best_metrics, best_score = {}, returns_metrics(None), None
+    for params, returns in runs:
+        metrics = returns_metrics(returns)
+        score = _score(metrics, objective)
+        if best_score is None or score > best_score:
+            best_score = score
+            best_params = params
+            best_metrics = metrics
+    return best_params, best_metrics
+
+
+class _GridStrategy(MAVolumeStrategy):
+    """按组合下标取参数的 MAVolumeStrategy，供 optstrategy 使用"""
+
+    params = (
+        ('combo', 0),
+        ('combos', None),
+    )
+
+    def __init__(self):
+        if self.params.combos is not None:
+            for key, value in self.params.combos[self.params.combo].items():
+                setattr(self.params, key, value)
+        super().__init__()
+
+
+def evaluate_window(frames, params, warmup_start, test_start, test_end,
+                    initial_cash=100000, engine='auto'):
+    """用给定参数在测试窗口上做样本外回测，返回 (日收益率序列, 指标)，engine 同 optimize_window"""
+    if engine == 'auto':
+        engine = 'kernel' if kernels.HAS_NUMBA else 'cerebro'
+
+    if engine == 'kernel':
+        window = _window_frames(frames, warmup_start, test_end)
+        if not window:
+            return pd.Series(dtype=float), returns_metrics(None)
+        result = kernels.run_ma_volume(window, initial_cash, trade_start=test_start.date(),
+                                       **params)
+        returns = _kernel_returns(result, initial_cash, test_start)
+        return returns, returns_metrics(returns)
+
+    cerebro = _build_cerebro(frames, warmup_start, test_end, initial_cash)
+    if not cerebro.datas:
+        return pd.Series(dtype=float), returns_metrics(None)
+
+    cerebro.addstrategy(MAVolumeStrategy, trade_start=test_start.date(),
+                        printlog=False, **params)
+    strat = cerebro.run()[0]
+    returns = _window_returns(strat, test_start)
+    return returns, returns_metrics(returns)
+
+
+def _init_worker(frames):
+    global _WORKER_FRAMES
+    _WORKER_FRAMES = frames
+
+
+def _run_window(task):
+    """单个窗口任务：训练窗口寻优 + 测试窗口样本外回测"""
+    frames = _WORKER_FRAMES if task.get('frames') is None else task['frames']
+
+    best_params, train_metrics = optimize_window(
+        frames,
+        task['param_grid'],
+        task['train_warmup_start'],
+        task['train_start'],
+        task['train_end'],
+        initial_cash=task['initial_cash'],
+        objective=task['objective'],
+    )
+    returns, test_metrics = evaluate_window(
+        frames,
+        best_params,
+        task['test_warmup_start'],
+        task['test_start'],
+        task['test_end'],
+        initial_cash=task['initial_cash'],
+    )
+
+    return {
+        'window': task['window'],
+        'train_start': task['train_start'].date().isoformat(),
+        'train_end': task['train_end'].date().isoformat(),
+        'test_start': task['test_start'].date().isoformat(),
+        'test_end': task['test_end'].date().isoformat(),
+        'best_params': best_params,
+        'train': train_metrics,
+        'test': test_metrics,
+        'test_returns': returns,
+    }
+
+
+def prepare_frames(frames):
+    """日期列转 datetime 并排序，剔除空数据"""
+    prepared = {}
+    for symbol, df in frames.items():
+        if df is None or len(df) == 0:
+            continue
+        df = df.copy()
+        df['日期'] = pd.to_datetime(df['日期'])
+        prepared[symbol] = df.sort_values('日期').reset_index(drop=True)
+    return prepared
+
+
+def trading_dates(prepared):
+    """所有股票交易日的并集（升序）"""
+    return sorted(set().union(*(df['日期'] for df in prepared.values())))
+
+
+def build_window_tasks(prepared, param_grid=None, train_days=250, test_days=60,
+                       step_days=None, initial_cash=100000, objective='sharpe'):
+    """
+    切分滚动窗口并生成窗口任务（不含K线数据，由执行方另行提供）
+
+    Returns:
+        (任务列表, 交易日列表)
+    """
+    param_grid = param_grid or DEFAULT_PARAM_GRID
+    dates = trading_dates(prepared) if prepared else []
+    windows = split_windows(dates, train_days, test_days, step_days)
+
+    # 预热期：保证窗口第一天均线已经形成
+    warmup = max(param_grid.get('ma_long', [MAVolumeStrategy.params.ma_long])) + 1
+
+    tasks = []
+    for i, (train_idx, test_idx, end_idx) in enumerate(windows):
+        tasks.append({
+            'window': i,
+            'param_grid': param_grid,
+            'train_warmup_start': dates[max(0, train_idx - warmup)],
+            'train_start': dates[train_idx],
+            'train_end': dates[test_idx - 1],
+            'test_warmup_start': dates[max(0, test_idx - warmup)],
+            'test_start': dates[test_idx],
+            'test_end': dates[end_idx],
+            'initial_cash': initial_cash,
+            'objective': objective,
+            'frames': None,
+        })
+    return tasks, dates
+
+
+def merge_window_results(results):
+    """合并各窗口结果：按窗口排序，拼接样本外收益并计算汇总指标"""
+    results = sorted(results, key=lambda r: r['window'])
+
+    # 拼接所有测试窗口的日收益率，得到完整的样本外收益曲线
+    oos_returns = [r.pop('test_returns') for r in results]
+    oos_returns = [r for r in oos_returns if len(r) > 0]
+    oos = pd.concat(oos_returns).sort_index() if oos_returns else None
+
+    summary = returns_metrics(oos)
+    test_returns = [r['test']['total_return'] for r in results]
+    summary['windows'] = len(results)
+    summary['winning_windows'] = sum(1 for r in test_returns if r > 0)
+    summary['avg_window_return'] = float(sum(test_returns) / len(test_returns)) if test_returns else 0.0
+
+    return {'windows': results, 'summary': summary}
+
+
+def run_walk_forward(frames, param_grid=None, train_days=250, test_days=60,
+                     step_days=None, initial_cash=100000, objective='sharpe',
+                     workers=None):
+    """
+    运行滚动窗口回测
+
+    Args:
+        frames: {股票代码: 历史K线 DataFrame}，需包含 日期/开盘/最高/最低/收盘/成交量 列
+        param_grid: 参数网格，默认 DEFAULT_PARAM_GRID
+        train_days: 训练窗口长度（交易日）
+        test_days: 测试窗口长度（交易日）
+        step_days: 滚动步长，默认等于 test_days
+        initial_cash: 每个窗口的初始资金
+        objective: 寻优目标，'sharpe' 或 'return'
+        workers: 并行进程数，默认使用全部CPU核心；1 表示在当前进程顺序执行
+
+    Returns:
+        {'windows': [...每个窗口的结果], 'summary': 样本外汇总指标}
+    """
+    prepared = prepare_frames(frames)
+    if not prepared:
+        print("没有可用的历史数据，无法进行滚动窗口回测")
+        return {'windows': [], 'summary': returns_metrics(None)}
+
+    tasks, dates = build_window_tasks(prepared, param_grid, train_days, test_days,
+                                      step_days, initial_cash, objective)
+    if not tasks:
+        print(f"历史数据只有 {len(dates)} 个交易日，不足一个训练+测试窗口")
+        return {'windows': [], 'summary': returns_metrics(None)}
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    print(f"共 {len(tasks)} 个滚动窗口，使用 {workers} 个进程并行回测...")
+
+    if workers == 1:
+        for task in tasks:
+            task['frames'] = prepared
+        results = [_run_window(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(prepared,)) as executor:
+            results = list(executor.map(_run_window, tasks))
+
+    return merge_window_results(results)
+
+
+def load_frames(symbols):
+    """使用 data_fetcher 获取多只股票的历史数据"""
+    from data_fetcher import get_historical_data
+
+    frames = {}
+    for symbol in symbols:
+        print(f"获取 {symbol} 历史数据...")
+        df = get_historical_data(symbol, period='daily')
+        if df is not None and len(df) > 0:
+            frames[symbol] = df
+    return frames
+
+
+def print_report(result):
+    """打印滚动窗口回测报告"""
+    print("\n" + "=" * 60)
+    print("滚动窗口回测结果")
+    print("=" * 60)
+
+    for w in result['windows']:
+        test = w['test']
+        sharpe = f"{test['sharpe_ratio']:.2f}" if test['sharpe_ratio'] is not None else '-'
+        print(f"[{w['window']:>2}] 测试 {w['test_start']} ~ {w['test_end']} "
+              f"收益 {test['total_return']:>7.2f}% 夏普 {sharpe:>6} "
+              f"回撤 {test['max_drawdown']:.2f}%  参数 {w['best_params']}")
+
+    summary = result['summary']
+    print("\n样本外汇总:")
+    print(f"窗口数: {summary.get('windows', 0)}，盈利窗口: {summary.get('winning_windows', 0)}")
+    print(f"总收益率: {summary['total_return']:.2f}%")
+    print(f"年化收益率: {summary['annual_return']:.2f}%")
+    if summary['sharpe_ratio'] is not None:
+        print(f"夏普比率: {summary['sharpe_ratio']:.2f}")
+    print(f"最大回撤: {summary['max_drawdown']:.2f}%")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='尾盘选股策略滚动窗口回测')
+    parser.add_argument('symbols', nargs='*', help='股票代码，默认使用本地筛选结果')
+    parser.add_argument('--train', type=int, default=250, help='训练窗口交易日数')
+    parser.add_argument('--test', type=int, default=60, help='测试窗口交易日数')
+    parser.add_argument('--step', type=int, default=None, help='滚动步长，默认等于测试窗口')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数')
+    parser.add_argument('--objective', choices=['sharpe', 'return'], default='sharpe')
+    parser.add_argument('--cash', type=float, default=100000)
+    args = parser.parse_args()
+
+    symbols = args.symbols
+    if not symbols:
+        from data_fetcher import load_data_from_csv
+        data = load_data_from_csv()
+        if 'filtered' in data:
+            symbols = data['filtered']['代码'].head(10).tolist()
+    if not symbols:
+        print("请指定股票代码，或先运行 data_fetcher.py 生成筛选结果")
+        sys.exit(1)
+
+    start = datetime.now()
+    result = run_walk_forward(
+        load_frames(symbols),
+        train_days=args.train,
+        test_days=args.test,
+        step_days=args.step,
+        initial_cash=args.cash,
+        objective=args.objective,
+        workers=args.workers,
+    )
+    print_report(result)
+    print(f"\n耗时: {(datetime.now() - start).total_seconds():.1f} 秒")